@@ -1,17 +1,122 @@
 #!/usr/bin/env python
 
-from blogtool import header, options, filelist, emptyheader_text
+"""
+    The entry module for the blogtool command line utility.
+
+    Program initialization, option and file processing are all started from
+    here.
+"""
 
-from headerparse import Header
+from options import OptionProcessor
+from headerparse import Header, HeaderParseError
 from fileprocessor import FileProcessor, FileProcessorError, FileProcessorRetry
+from batch import publishBatch, publishAll
+from xmlproxy.proxybase import ProxyError
+
+import codecs
+import daemon
+import script
+import sys
+import utils
+
+################################################################################
+"""saveTmpFile
+
+    Saves the content of a temporary post file that couldn't be published to
+    ``hdr``'s blog, so it isn't lost when the temporary file is removed.
+"""
+def saveTmpFile(fp, filename, header, hdr, post_text):
+    if fp.comment:
+        filename += '.' + hdr.postid
+    else:
+        filename += '.' + hdr.title
+    print "Saving tmp content file %s" % filename
+    f = codecs.open(filename, 'w', 'utf-8')
+    f.write(u'%s' % header + u'\n' + post_text)
+    f.close()
+
+################################################################################
+"""main
+
+    Runs blogtool with the command line arguments ``argv``.  If they aren't
+    given, the command is from sys.argv[1:] and is handed to the daemon if
+    one is running.
+"""
+def main(argv = None):
+    if argv is None:
+        argv = sys.argv[1:]
+        # running bt on its own always means running the editor, which the
+        # daemon can't do
+        if len(argv) > 0 and '--daemon' not in argv:
+            status = daemon.forward(argv)
+            if status is not None:
+                sys.exit(status)
+
+    options = OptionProcessor()
+    filelist = options.parse(argv)
+    if options.opts.daemon:
+        try:
+            daemon.serve(main)
+        except daemon.DaemonError, err:
+            print err
+            sys.exit(1)
+        return
+    if options.opts.script:
+        sys.exit(script.runScript(main, options.opts.script))
+
+    '''
+    Make sure that this loop always executes, regardless of whether there 
+    are actually options.  The config file is processed through this loop
+    and the program will break if that code does not run
+    '''
+    header = Header()
+    try:
+        runeditor = options.check(header)
+        emptyheader_text = header.buildPostHeader(options)
+        '''
+        Unfortunately, determining when to run the editor for creating a
+        blogpost is a bit tricky.  If `blogtool` is invoked by itself do so.
+        If no files are supplied and certain options are specified that
+        logically mean we want to create a post (see options.py for which ones
+        return `runeditor`) BUT we haven't editted a comment, then do so.
+        Finally, if only 2 arguments are supplied on the command line and the
+        blogname is set, meaning the following command was run:
+
+            > blogtool.py -b 'blogname'
+
+        then run the editor.  Publishing a batch of files never runs the
+        editor.
+        '''
+        if options.opts.batch is None and \
+           (len(argv) == 0 or \
+            (len(filelist) == 0 and runeditor and not options.opts.commentid) or \
+            (len(argv) == 2 and options.opts.blogname is not None)):
+            fd = utils.edit(emptyheader_text)
+            if fd == None:
+                print "Nothing to do, exiting."
+                sys.exit()
+            filelist.append(fd.name)      
+
+        status = run(options, header, filelist, emptyheader_text)
+    except ProxyError, err:
+        print err
+        sys.exit(1)
+
+    if status:
+        sys.exit(status)
 
 ################################################################################
 """run
 
-    If importing ``blogtool``, this is the function that runs it.
+    Publishes the files in ``filelist`` with the settings from ``options``
+    and the defaults in ``header``.  Returns the exit status, 1 if any post
+    couldn't be read or failed to publish anywhere.
 """
-def run():
+def run(options, header, filelist, emptyheader_text):
+    status = 0
     fp = FileProcessor(**options.flags())
+    if fp.batch and publishBatch(fp, header, fp.batch):
+        status = 1
     tmp_fn = None
     for filename in filelist:
         if tmp_fn != filename:
@@ -26,27 +131,49 @@ def run():
             continue
         except FileProcessorError, err_msg:
             print err_msg
+            status = 1
+            continue
+
+        try:
+            header.addParms(header_text, fp.allblogs)
+        except HeaderParseError, err:
+            print err
+            status = 1
+            continue
+
+        # rendering doesn't depend on the blog, so it is done once here no
+        # matter how many blogs the post goes to
+        try:
+            rendered = fp.renderContent(post_text)
+        except FileProcessorError, err:
+            print err
+            status = 1
+            if filename.startswith("/tmp"):
+                saveTmpFile(fp, filename, header, header.perBlog()[0],
+                            post_text)
+            continue
+
+        if fp.parallel:
+            errors = publishAll(fp, filename, header, post_text, rendered)
+            for hdr, err in errors:
+                print err
+                status = 1
+            if errors and filename.startswith("/tmp"):
+                saveTmpFile(fp, filename, header, errors[0][0], post_text)
             continue
 
-        header.addParms(header_text, fp.allblogs)
         for hdr in header:
             try:
-                rval = fp.pushContent(post_text, hdr)
+                rval = fp.pushContent(post_text, hdr, rendered)
                 if rval and not fp.comment:
                     header.postid = rval
                     print 'Updating post file...'
-                    fp.updateFile(filename, '%s' % header, post_text) 
+                    fp.updateFile(filename, u'%s' % header, post_text)
             except FileProcessorError, err:
                 print err
+                status = 1
                 if filename.startswith("/tmp"):
-                    if fp.comment:
-                        filename += '.' + hdr.postid
-                    else:
-                        filename += '.' + hdr.title
-                    print "Saving tmp content file %s" % filename
-                    f = open(filename, 'w')
-                    f.write('%s' % header + '\n' + post_text)
-                    f.close()
+                    saveTmpFile(fp, filename, header, hdr, post_text)
                 # It's possible there are other files to process so rather than 
                 # bailing entirely we'll break out of this loop and move on to
                 # the next file if there is one.  In most cases, this will be
@@ -54,6 +181,8 @@ def run():
                 # multiple files to process.
                 break
 
+    return status
+
 ################################################################################
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,245 @@
+"""batch.py
+
+    Publishing of a whole directory, or glob, of post files at once.  Rather
+    than handling one file at a time, the files are run through a pipeline:
+    every file is read and its header parsed up front, the markdown is
+    rendered in a pool of worker processes, and as each post finishes
+    rendering it is handed to a pool of threads that push it to its blogs.
+    The `.posted` file for a post is written as soon as its push completes.
+
+    A post going to several blogs can also be pushed to all of them at once
+    with `pushAll`, rather than to one blog after another.
+"""
+from fileprocessor import FileProcessorError, renderContent
+from headerparse import HeaderParseError
+
+import utils
+
+import glob
+import os
+import threading
+import urlparse
+
+# limits how many pushes go to each host at the same time
+_hostlimits = {}
+_hostlock = threading.Lock()
+
+def _hostLimit(xmlrpc, limit):
+    host = urlparse.urlsplit(xmlrpc).netloc.lower()
+    with _hostlock:
+        if host not in _hostlimits:
+            _hostlimits[host] = threading.BoundedSemaphore(max(1, limit or 1))
+        return _hostlimits[host]
+
+################################################################################
+"""pushAll
+
+    Pushes a post to every blog in ``header`` at the same time, with at most
+    ``fp.jobs`` pushes going to any one host at once.  Each blog is pushed
+    with its own copy of the header, so ``header`` itself isn't changed.
+    Returns a list with a (header, result, error) tuple for each blog, in the
+    order the blogs are in the header, where ``result`` is what
+    FileProcessor.pushContent returned and ``error`` is what the push failed
+    with, if it did.  A push that fails, however it fails, doesn't stop the
+    pushes to the other blogs.
+"""
+def pushAll(fp, header, post_text, rendered = None):
+    hdrs = header.perBlog()
+    results = [ None ] * len(hdrs)
+
+    def _push(i):
+        hdr = hdrs[i]
+        with _hostLimit(hdr.xmlrpc, fp.jobs):
+            try:
+                results[i] = (hdr, fp.pushContent(post_text, hdr, rendered),
+                              None)
+            except Exception, err:
+                # errors from the connection itself, like a refused
+                # connection, aren't wrapped by the proxies
+                results[i] = (hdr, None, err)
+
+    if len(hdrs) == 1:
+        _push(0)
+        return results
+
+    threads = [ threading.Thread(target = _push, args = (i, ))
+                    for i in range(len(hdrs)) ]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+
+    return results
+
+################################################################################
+"""publishAll
+
+    Pushes the post from ``filename`` to all of the blogs in ``header`` at
+    the same time using `pushAll`.  The post IDs the blogs return are merged
+    into ``header`` and the `.posted` file is written once, after every blog
+    is done.  Returns a list of (header, error) tuples for the blogs the post
+    couldn't be pushed to.
+"""
+def publishAll(fp, filename, header, post_text, rendered = None):
+    results = pushAll(fp, header, post_text, rendered)
+    errors = [ (r[0], r[2]) for r in results if r and r[2] ]
+    if not fp.comment and mergePostIDs(header, results):
+        fp.updateFile(filename, u'%s' % header, post_text)
+
+    return errors
+
+################################################################################
+"""mergePostIDs
+
+    Sets the post ID of each blog in ``header`` to the one its push in
+    ``results``, as returned by `pushAll`, came back with.  Blogs without a
+    result are left alone.  Returns whether there were any post IDs.
+"""
+def mergePostIDs(header, results):
+    merged = False
+    for i, h in enumerate(header):
+        if i < len(results) and results[i] and results[i][1]:
+            h.postid = results[i][1]
+            merged = True
+
+    return merged
+
+################################################################################
+"""expandBatch
+
+    Returns the post files named by ``pattern``, which is either a directory,
+    in which case all of the files in it are used, or a glob.  Files that are
+    the result of a previous publish are skipped.
+"""
+def expandBatch(pattern):
+    if os.path.isdir(pattern):
+        filenames = [ os.path.join(pattern, f) for f in os.listdir(pattern)
+                                                if not f.startswith('.') ]
+    else:
+        filenames = glob.glob(os.path.expanduser(pattern))
+
+    return sorted([ f for f in filenames if os.path.isfile(f) and
+                                            not f.endswith('.posted') ])
+
+################################################################################
+"""addBatchCategories
+
+    Adds the categories used by any of ``posts`` that aren't on their blogs
+    yet.  The categories are collected across all of the posts first, so each
+    blog gets all of its new categories at once, a level at a time, rather
+    than a few at a time as each post is pushed.
+"""
+def addBatchCategories(posts):
+    blogs = {}
+    for filename, hdr, post_text in posts:
+        for h in hdr:
+            proxy, paths = blogs.setdefault((h.xmlrpc, h.name), (h.proxy, []))
+            paths.extend([ c for c in h.categories if c not in paths ])
+
+    for (xmlrpc, blogname), (proxy, paths) in blogs.iteritems():
+        if not paths:
+            continue
+        print "Checking categories for '%s'..." % blogname
+        try:
+            utils.addCategories(proxy, paths)
+        except utils.UtilsError, err:
+            print err
+
+################################################################################
+"""publishBatch
+
+    Publishes every post file named by ``pattern`` using the FileProcessor
+    ``fp``.  ``header`` holds the defaults from the config file and the
+    command line, each file gets its own copy of it.  Up to ``fp.jobs`` posts
+    are pushed at the same time.  Returns the number of files that failed.
+"""
+def publishBatch(fp, header, pattern):
+    filenames = expandBatch(pattern)
+    if not filenames:
+        print "No post files found for '%s'." % pattern
+        return 0
+
+    print "Reading %d post files..." % len(filenames)
+    posts = []
+    failed = []
+    for filename in filenames:
+        try:
+            header_text, post_text = fp.parsePostFile(filename, '')
+        except FileProcessorError, err:
+            print "%s: %s" % (filename, err)
+            failed.append(filename)
+            continue
+        hdr = header.clone()
+        try:
+            hdr.addParms(header_text, fp.allblogs)
+        except HeaderParseError, err:
+            print "%s: %s" % (filename, err)
+            failed.append(filename)
+            continue
+        posts.append((filename, hdr, post_text))
+
+    if fp.addpostcats and not fp.comment:
+        addBatchCategories(posts)
+
+    lock = threading.Lock()
+    def _push(i, rendered):
+        filename, hdr, post_text = posts[i]
+        if fp.parallel:
+            _pushParallel(filename, hdr, post_text, rendered)
+            return
+        try:
+            for h in hdr:
+                rval = fp.pushContent(post_text, h, rendered)
+                if rval and not fp.comment:
+                    h.postid = rval
+                    fp.updateFile(filename, u'%s' % hdr, post_text)
+        except (Exception, SystemExit), err:
+            # anything left to escape would be lost in the pool, and a
+            # SystemExit would take the pool's thread with it
+            with lock:
+                print "%s: %s" % (filename, str(err) or err.__class__.__name__)
+                failed.append(filename)
+
+    def _pushParallel(filename, hdr, post_text, rendered):
+        errors = publishAll(fp, filename, hdr, post_text, rendered)
+        if errors:
+            with lock:
+                for h, err in errors:
+                    print "%s: %s" % (filename, err)
+                failed.append(filename)
+
+    # only batches render in other processes, so only they pay for importing
+    # multiprocessing
+    import multiprocessing
+    from multiprocessing.pool import ThreadPool
+
+    renderpool = multiprocessing.Pool()
+    pushpool = ThreadPool(max(1, fp.jobs or 1))
+    pushes = []
+    try:
+        jobs = [ (i, post[2]) for i, post in enumerate(posts) ]
+        for i, rendered, err in renderpool.imap_unordered(renderContent, jobs):
+            if err:
+                with lock:
+                    print "%s: %s" % (posts[i][0], err)
+                    failed.append(posts[i][0])
+                continue
+            pushes.append((i, pushpool.apply_async(_push, (i, rendered))))
+        renderpool.close()
+        pushpool.close()
+        for i, result in pushes:
+            try:
+                result.get()
+            except Exception, err:
+                with lock:
+                    print "%s: %s" % (posts[i][0], err)
+                    failed.append(posts[i][0])
+        pushpool.join()
+    finally:
+        renderpool.terminate()
+        pushpool.terminate()
+
+    print "Published %d of %d post files." % (len(filenames) - len(failed),
+                                              len(filenames))
+    return len(failed)
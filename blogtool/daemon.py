@@ -0,0 +1,344 @@
+"""daemon.py
+
+    Lets one long running blogtool process run the commands of any number of
+    `bt` invocations.  ``bt --daemon`` listens on a Unix socket in the cache
+    directory, and while it is running `bt` hands its command line, working
+    directory and, for posts read from STDIN, standard input over to it and
+    prints what comes back instead of running the command itself.  The
+    daemon keeps its imports, Markdown converters, proxies, blog metadata and
+    connections from one command to the next, so a command costs a round
+    trip to the daemon plus whatever has to be asked of the blog.
+
+    Commands are run one at a time in the order they arrive.  A command that
+    needs an editor can't run in the daemon, so it is handed back to `bt` to
+    run itself.  Since any command might turn out to need one, what a command
+    prints is held back until it has finished, and dropped if it is handed
+    back, so `bt` doesn't print it twice.
+
+    Messages are JSON, one to a line.  The client sends
+
+        {"argv": [...], "cwd": "...", "stdin": "<base64>" or null}
+
+    and gets back any number of {"out": text} and {"err": text} messages
+    followed by {"exit": status}, or {"local": true} if it should run the
+    command itself.
+"""
+import base64
+import json
+import os
+import signal
+import socket
+import SocketServer
+import sys
+import traceback
+
+from StringIO import StringIO
+
+from xmlproxy import dropProxies
+from xmlproxy.proxybase import BlogProxy
+
+import utils
+
+SOCKET_NAME = 'daemon.sock'
+
+################################################################################
+"""DaemonError
+
+    Raised when the daemon can't be started.
+"""
+class DaemonError(Exception):
+    def __init__(self, msg):
+        self.message = 'Error in daemon: %s' % msg
+
+    def __str__(self):
+        return self.message
+
+################################################################################
+"""socketPath
+
+    Returns the path of the socket the daemon listens on.
+"""
+def socketPath():
+    return os.path.join(utils.getCacheDir(), SOCKET_NAME)
+
+################################################################################
+"""Connection
+
+    The daemon's end of a client connection.  If the client goes away part
+    way through a command, the rest of the command's output is dropped rather
+    than the command being cut short.
+"""
+class Connection(object):
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._closed = False
+        self._held = None
+
+    def send(self, msg):
+        if self._held is not None:
+            self._held.append(msg)
+            return
+        if self._closed:
+            return
+        try:
+            self._wfile.write(json.dumps(msg) + '\n')
+            self._wfile.flush()
+        except socket.error:
+            self._closed = True
+
+    # Keeps the messages sent from now on instead of sending them, until
+    # `release` is called.
+    def hold(self):
+        self._held = []
+
+    # Sends the messages kept since `hold`, or drops them if not ``send``.
+    def release(self, send = True):
+        held, self._held = self._held or [], None
+        if send:
+            for msg in held:
+                self.send(msg)
+
+################################################################################
+"""Output
+
+    A file-like object standing in for sys.stdout or sys.stderr while a
+    command runs, sending what is written to the client as ``stream``
+    messages.
+"""
+class Output(object):
+
+    def __init__(self, conn, stream):
+        self._conn = conn
+        self._stream = stream
+        self.softspace = 0
+
+    def write(self, text):
+        if isinstance(text, str):
+            text = text.decode('utf-8', 'replace')
+        self._conn.send({ self._stream : text })
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+class _Handler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+
+        conn = Connection(self.wfile)
+        conn.hold()
+        status = self.server.runCommand(request, conn)
+        conn.release(status is not None)
+        if status is None:
+            conn.send({ 'local' : True })
+        else:
+            conn.send({ 'exit' : status })
+
+################################################################################
+"""Daemon
+
+    The server behind ``bt --daemon``.  ``command`` is called with the
+    argument list of each command sent to it, and runs it the way `bt` would.
+    Once `stop` has been called, `serve` returns after the command running,
+    if any, is done.
+"""
+class Daemon(SocketServer.UnixStreamServer):
+
+    # seconds between checks for having been stopped while idle
+    timeout = 0.5
+
+    def __init__(self, command, path):
+        self.command = command
+        self.stopping = False
+        # the options of one command mustn't change how the next one runs
+        self._ttl = BlogProxy.metadata.ttl
+
+        # only the user running the daemon gets to use its logins
+        umask = os.umask(077)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path, _Handler)
+        finally:
+            os.umask(umask)
+
+    ############################################################################
+    """runCommand
+
+        Runs the command in ``request`` with its output going to ``conn``.
+        Returns its exit status, or None if it has to be run by the client.
+    """
+    def runCommand(self, request, conn):
+        argv = [ arg.encode('utf-8') for arg in request['argv'] ]
+        stdin = base64.b64decode(request.get('stdin') or '')
+
+        BlogProxy.setMetadataTTL(self._ttl)
+        # what the proxies fetched is kept no longer than the cache would
+        # have kept it
+        dropProxies(self._ttl)
+
+        saved = sys.stdin, sys.stdout, sys.stderr
+        cwd = os.getcwd()
+        sys.stdin = StringIO(stdin)
+        sys.stdout = Output(conn, 'out')
+        sys.stderr = Output(conn, 'err')
+        status = 0
+        try:
+            os.chdir(request['cwd'].encode('utf-8'))
+            self.command(argv)
+        except SystemExit, err:
+            if err.code is None:
+                status = 0
+            elif isinstance(err.code, int):
+                status = err.code
+            else:
+                print >> sys.stderr, err.code
+                status = 1
+        except utils.EditorUnavailable:
+            status = None
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved
+            os.chdir(cwd)
+
+        return status
+
+    def stop(self):
+        self.stopping = True
+
+    ############################################################################
+    """serve
+
+        Handles commands until the daemon is stopped.
+    """
+    def serve(self):
+        while not self.stopping:
+            self.handle_request()
+
+################################################################################
+"""serve
+
+    Runs the daemon, running each command sent to it with ``command``, until
+    it is interrupted or killed.  Raises DaemonError if another daemon is
+    already running or the socket can't be set up.
+"""
+def serve(command, path = None):
+    if path is None:
+        path = socketPath()
+    if os.path.exists(path):
+        sock = _connect(path)
+        if sock is not None:
+            sock.close()
+            raise DaemonError("a daemon is already running on %s" % path)
+        # left behind by a daemon that didn't shut down cleanly
+        os.unlink(path)
+
+    try:
+        server = Daemon(command, path)
+    except socket.error, err:
+        raise DaemonError("can't listen on %s: %s" % (path, err))
+
+    utils.interactive = False
+    _warmUp()
+
+    # shut down cleanly on kill, so the socket is removed, but not in the
+    # middle of a command
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    print "blogtool daemon (pid %d) listening on %s" % (os.getpid(), path)
+    sys.stdout.flush()
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+################################################################################
+"""forward
+
+    Hands the command ``argv`` to a running daemon and copies its output to
+    stdout and stderr.  Returns the command's exit status, or
+    None if there is no daemon or the command has to be run locally.
+"""
+def forward(argv, path = None):
+    if path is None:
+        path = socketPath()
+    sock = _connect(path)
+    if sock is None:
+        return None
+
+    # a post or a script read from standard input goes along with the command
+    stdin = None
+    if 'STDIN' in argv or '-' in argv:
+        stdin = base64.b64encode(sys.stdin.read())
+    request = { 'argv'  : [ arg.decode('utf-8') for arg in argv ],
+                'cwd'   : os.getcwd().decode('utf-8'),
+                'stdin' : stdin, }
+
+    try:
+        sock.sendall(json.dumps(request) + '\n')
+        for line in sock.makefile('rb'):
+            msg = json.loads(line)
+            if 'out' in msg:
+                _write(sys.stdout, msg['out'])
+            elif 'err' in msg:
+                _write(sys.stderr, msg['err'])
+            elif 'exit' in msg:
+                return msg['exit']
+            elif 'local' in msg:
+                return None
+    finally:
+        sock.close()
+
+    print >> sys.stderr, "The blogtool daemon stopped before the command " \
+                         "finished."
+    return 1
+
+# Returns a socket connected to the daemon at ``path``, or None if there
+# isn't one listening.
+def _connect(path):
+    if not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+
+    return sock
+
+def _write(stream, text):
+    stream.write(text.encode(getattr(stream, 'encoding', None) or 'utf-8',
+                             'replace'))
+
+# Imports and builds what publishing needs up front, so the first command
+# doesn't pay for it.
+def _warmUp():
+    from fileprocessor import FileProcessor
+    from mdpool import markdownPresent
+    from xhtml import parseFragment
+    import html2md
+
+    parseFragment(u'')
+    if markdownPresent():
+        extensions = FileProcessor.MD_EXTENSIONS
+        try:
+            md = FileProcessor.mdpool.acquire(extensions)
+        except ImportError:
+            # a missing extension is reported when a post is rendered
+            return
+        FileProcessor.mdpool.release(md, extensions)
@@ -1,38 +1,17 @@
 from xmlproxy.proxybase import ProxyError
 from xmlproxy import data
+from rendercache import RenderCache
+from mdpool import MarkdownPool, markdownPresent
+from mediamanifest import MediaManifest
+from xhtml import XHTMLSerializer, parseFragment
 import utils
+import codecs
+import httplib
 import re
+import socket
 import sys
-
-try:
-    from lxml import etree
-except ImportError:
-    print """
-ATTENTION:
-You need to install lxml to take full advantage of blogtool capabilities.
-Without it, downloading posts is disallowed.  If all you need it to publish
-posts to a blog, then this should be fine.
-
-Unfortunately, this annoying warning message will pop-up everytime you run
-blogtool.
-"""
-    raw_input('Press <ENTER> to continue...')
-    import xml.etree.cElementTree as etree
-
-try:
-    import markdown
-    MARKDOWN_PRESENT = True
-except ImportError:
-    print """
-ATTENTION:
-In order to publish posts with blogtool, python-markdown is required.  Without
-it, all blogtool is capable of is some basic blog interaction for listing posts
-or listing/ modifying categories.
-
-Also, this annoying message will be displayed everytime you run blogtool.
-"""
-    raw_input('Press <ENTER> to continue...')
-    MARKDOWN_PRESENT = False
+import threading
+import urlparse
 
 ######################### Error classes for blogtool ###########################
 ################################################################################
@@ -66,8 +45,27 @@ class FileProcessorRetry(Exception):
 """
 class FileProcessor(object):
 
-    if MARKDOWN_PRESENT:
-        md = markdown.Markdown(extensions=['typed_list'])
+    MD_EXTENSIONS = ['typed_list']
+
+    mdpool = MarkdownPool()
+    rendercache = RenderCache()
+    mediamanifest = MediaManifest()
+
+    # byte order marks and the encodings they identify- the UTF-32 marks
+    # must be checked before the UTF-16 ones since they share a prefix
+    BOMS = [ (codecs.BOM_UTF32_LE, 'utf-32'),
+             (codecs.BOM_UTF32_BE, 'utf-32'),
+             (codecs.BOM_UTF8, 'utf-8-sig'),
+             (codecs.BOM_UTF16_LE, 'utf-16'),
+             (codecs.BOM_UTF16_BE, 'utf-16'), ]
+    # encodings to try if there's no byte order mark, ASCII is covered by
+    # UTF-8
+    ENCODINGS = ['utf-8', 'iso-8859-1']
+    DECODE_CHUNK = 64 * 1024
+    # most images uploaded at the same time
+    MAX_UPLOADS = 4
+    # when set, progress isn't reported, only errors are raised
+    quiet = False
 
     EXTENDED_ENTRY_RE = re.compile(r'\n\n(?:(?:### MORE ###\s*)|(?:(?:\+\ *){3,}(.*?)(?:\+\ *)*))\n\n')
 
@@ -106,15 +104,18 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
         return ''.join(linelist[0:i]), ''.join(linelist[i + 1:])
 
     ############################################################################ 
-    """_procContent
+    """renderContent
 
-        Processes the content portion of the file, running any plaintext markup
-        converters.
+        Runs the content portion of the file through the plaintext markup
+        converters.  Returns a tuple of the rendered description, the text for
+        the "MORE" link and the rendered extended entry.  None of this depends
+        on the blog the content is going to, so it only needs doing once no
+        matter how many blogs the content is pushed to.
     """
-    def _procContent(self, posttext, header):
-        if not MARKDOWN_PRESENT:
-            print "Unable to publish post without python-markdown.  Sorry..."
-            sys.exit()
+    def renderContent(self, posttext):
+        if not markdownPresent():
+            raise FileProcessorError(
+                "Unable to publish post without python-markdown.  Sorry...")
 
         extended = ''
         more_text = ''
@@ -131,12 +132,30 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
         else:
             description = posttext
 
-        html_desc = self._procHTML(description, header)
+        html_desc = self._render(description)
         if extended:
-            html_ext = self._procHTML(extended, header)
+            html_ext = self._render(extended)
         else:
             html_ext = ''
 
+        return html_desc, more_text, html_ext
+
+    ############################################################################ 
+    """_procContent
+
+        Processes the content portion of the file for a blog.  ``rendered`` is
+        the result of `renderContent` if it has already been called for the
+        content.
+    """
+    def _procContent(self, posttext, header, rendered = None):
+        if rendered is None:
+            rendered = self.renderContent(posttext)
+        html_desc, more_text, html_ext = rendered
+
+        html_desc = self._procImages(html_desc, header)
+        if html_ext:
+            html_ext = self._procImages(html_ext, header)
+
         if more_text:
             return "%s<!--more %s-->%s" % (html_desc, more_text, html_ext)
         elif html_ext:
@@ -145,172 +164,195 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
             return html_desc
 
     ############################################################################ 
-    """_procHTML
+    """_render
 
-       Handles extra processing after markdown processing is complete.  For now,
-       this consists of uploading image files and fixing up links to the
-       uploaded image. 
+        Runs the decoded post text through Markdown and then reserializes it as
+        XHTML.  None of this depends on the blog the text is going to, so
+        the result is stored in the render cache and a text that has already
+        been rendered is just read back from there.
     """
-    def _procHTML(self, text, header):
+    def _render(self, text):
+        key = self.rendercache.key(text, self.MD_EXTENSIONS)
+        xhtml = self.rendercache.get(key)
+        if xhtml is not None:
+            return xhtml
 
-        ######################################################################## 
-        """_ptFixElement
+        try:
+            xhtml = self.mdpool.convert(text, self.MD_EXTENSIONS)
+        except:
+            raise FileProcessorError("In FileProcessor._render: %s\n" %
+                                                         sys.exc_info()[0])
+
+        # The text is marked up at this stage, but we need to clean it up prior
+        # to shipping it out, so we parse it using lxml and then rebuild it as
+        # a string as we fix each tag
+        xhtml = self._ptFixUp(parseFragment(xhtml), self._ptFixWhitespace)
+        self.rendercache.put(key, xhtml)
+        return xhtml
 
-            Fixes some whitespace issues and also takes care of uploading
-            JPG files and then setting the link based on the result of the
-            upload.
-        """
-        def _ptFixElement(e):
-            if e.text and e.tag not in ['pre', 'code', 'comment']:
-                e.text = e.text.replace('\n', u' ')
-            if e.tail:
-                e.tail = e.tail.replace('\n', u' ')
-            if e.tag == 'img':
-                ifile = e.attrib['src']
-                if ifile.find("http://") != -1:
-                    # web resource defined, nothing to do
-                    return
-
-                try:
-                    ifile = utils.chkFile(ifile)
-                    print "Attempting to upload '%s'..." % ifile
-                    res = header.proxy.upload(ifile)
-                except utils.UtilsError, err:
-                    raise FileProcessorError("File not found: %s\n" % err)
-                except ProxyError, err:
-                    raise FileProcessorError("In FileProcessor._procHTML: %s\n" % err)
-
-                # FIX ME- don't know if this is necessary
-                if res == None:
-                    print "Upload failed, proceeding...\n"
-                    return
-
-                e.attrib['src'] = res['url']
-                if 'alt' not in e.keys():
-                    e.set('alt', res['file'])
-                # the 'res' attr is bogus- I've added it so that I can 
-                # specify the appropriate resolution file I want in the url.  
-                if 'res' in e.keys():
-                    res_str = '-' + e.attrib['res'] + '.'
-                    e.attrib['src'] = re.sub("\.(\w*)$", 
-                                             r'%s\1' % res_str,
-                                             e.attrib['src'])
-                    del(e.attrib['res'])
-            return
-
-        def _ptEscapeCData(text, attrib=False):
-            c_replace = dict([( "&", "&amp;"),
-                              ( "<", "&lt;"),
-                              ( ">", "&gt;"),
-                              ( u'\u2019', "&#8217;"), #apostrophe
-                              ( u'\u201c', "&#8220;"), #left double quote
-                              ( u'\u201d', "&#8221;"), #right double quote
-                            ])
-            for c in c_replace.keys():
-                if c in text:
-                    text = text.replace(c, c_replace[c])
-
-            if attrib:
-                attrib_replace = dict([("\"", "&quot;"),
-                                       ("\n", "&#10;"),
-                                     ])
-                for c in attrib_replace.keys():
-                    if c in text:
-                        text = text.replace(c, attrib_replace[c])
-            return text
-
-        #######################################################################
-        """_ptSerialize
-
-            Serializes an individual element as well as its child elements.
-        """
-        def _ptSerialize(e):
-            _ptFixElement(e)
-            e_str = '<%s' % (e.tag)
-            for a in e.attrib.keys():
-                e_str += ' %s=\"%s\"' %(a, _ptEscapeCData(e.attrib[a], True))
-
-            # There are 2 different paths here, self-closing tags or create
-            # an end tag
-            if e.tag in ("area", "base", "basefont", "br", "col", "frame", "hr",
-                         "img", "input", "isindex", "link", "meta", "param",
-                         "embed"):
-                e_str += "/>"  # self-closing
-            else:
-                e_str += '>'
-                if e.text:
-                    e_str += _ptEscapeCData(e.text)
-                if len(e) != 0:
-                    for child in e:
-                        e_str += _ptSerialize(child)
-                e_str += "</%s>" % (e.tag)
-                               
-            # finally, check the tail
-            if e.tail:
-                e_str += _ptEscapeCData(e.tail)
-
-            return e_str
-
-        #######################################################################
-        """_ptFixUp
-
-            Facilitates adjustments to the markup.  Accepts a parsed tree
-            which is then reserialized with all adjustments.  I tried to use
-            the etree.tostring function, but there were certain tags that
-            couldn't be rendered properly in xhtml, like the iframe tag.
-            Thus, I have to serialize it myself.
-        """ 
-        def _ptFixUp(tree):
-            xhtml = ''
-            for element in tree:
-                if element.tag != 'post':
-                    xhtml += _ptSerialize(element)
-
-#            teststr = etree.tostring(tree, pretty_print=True).replace('<post>', '').replace('</post>', '')
-#            if teststr.rstrip().lstrip() == xhtml.rstrip():
-#                print "Match!/n"
-#            else:
-#                print xhtml + '\n'
-#                print teststr
-#            sys.exit()
+    ############################################################################ 
+    """_procImages
 
+        Uploads any local image files referenced in rendered text and points
+        the image tags at the uploaded files.  This is kept out of `_render`
+        because the result depends on the blog the image is uploaded to.
+    """
+    def _procImages(self, xhtml, header):
+        # most posts don't have any images, so don't bother reparsing them
+        if '<img' not in xhtml:
             return xhtml
 
-        # _procHTML function code starts here- basically, decode the post text
-        # then run it through Markdown, then parse it with lxml so we can
-        # process certain tags(ptHelper above), finally return the final
-        # product as a string
-        # check if charset was defined on command line
-        if self.charset:
-            encodings = [ self.charset ]
+        tree = parseFragment(xhtml)
+        images = [ e for e in tree.iter('img')
+                             if not self._isWebResource(e.attrib['src']) ]
+        if len(images) == 0:
+            # web resources only, nothing to do
+            return xhtml
+
+        uploads = self._uploadImages(set([ e.attrib['src'] for e in images ]),
+                                     header)
+        for e in images:
+            res = uploads.get(e.attrib['src'])
+            if res == None:
+                continue
+
+            e.attrib['src'] = res['url']
+            if 'alt' not in e.keys():
+                e.set('alt', res['file'])
+            # the 'res' attr is bogus- I've added it so that I can 
+            # specify the appropriate resolution file I want in the url.  
+            if 'res' in e.keys():
+                res_str = '-' + e.attrib['res'] + '.'
+                e.attrib['src'] = re.sub("\.(\w*)$", 
+                                         r'%s\1' % res_str,
+                                         e.attrib['src'])
+                del(e.attrib['res'])
+
+        return self._ptFixUp(tree, None)
+
+    ############################################################################ 
+    """_uploadImages
+
+        Uploads the local image files ``srcs`` to the blog, several at a time.
+        Returns a dict mapping each src to the result of its upload.  Every
+        file is attempted before any errors are reported, and then they are
+        all reported together.
+    """
+    def _uploadImages(self, srcs, header):
+
+        ########################################################################
+        """_upload
+
+            Uploads a single file unless the media manifest shows it is
+            already on the blog.  Proxies can't be shared between threads, so
+            each thread uploads through its own copy of the header's proxy.
+        """
+        def _upload(src, proxy = None):
+            try:
+                ifile = utils.chkFile(src)
+                digest = self.mediamanifest.hashFile(ifile)
+            except utils.UtilsError, err:
+                return src, None, "File not found: %s" % err
+            except IOError, err:
+                return src, None, err
+
+            res = self.mediamanifest.lookup(xmlrpc, blogname, digest)
+            if res != None:
+                self._say("Using previous upload of '%s'..." % ifile)
+                return src, res, None
+
+            if proxy is None:
+                if not hasattr(local, 'proxy'):
+                    local.proxy = header.proxy.clone()
+                proxy = local.proxy
+            self._say("Attempting to upload '%s'..." % ifile)
+            try:
+                res = proxy.upload(ifile)
+            except (ProxyError, socket.error, httplib.HTTPException), err:
+                # a failed connection fails this file, not the others
+                return src, None, err
+
+            if res != None:
+                self.mediamanifest.record(xmlrpc, blogname, digest, res)
+            return src, res, None
+
+        xmlrpc, blogname = header.xmlrpc, header.name
+        srcs = sorted(srcs)
+        if len(srcs) == 1:
+            results = [ _upload(srcs[0], header.proxy) ]
         else:
-            encodings = ['ascii', 'utf-8', 'utf-16', 'iso-8859-1']
+            from multiprocessing.pool import ThreadPool
 
-        last_error = ''
-        for encoding in encodings:
+            local = threading.local()
+            pool = ThreadPool(min(self.MAX_UPLOADS, len(srcs)))
             try:
-                xhtml = self.md.convert(text.decode(encoding))
-            except (UnicodeError, UnicodeDecodeError), err:
-                last_error = err
-                continue
-            except:
-                raise FileProcessorError("In FileProcessor._procHTML: %s\n" %
-                                                             sys.exc_info()[0])
+                results = pool.map(_upload, srcs)
+            finally:
+                pool.close()
+                pool.join()
+
+        errors = [ "%s: %s" % (src, err) for src, res, err in results if err ]
+        if errors:
+            raise FileProcessorError("In FileProcessor._uploadImages: %s\n" %
+                                                             '\n'.join(errors))
+
+        uploads = {}
+        for src, res, err in results:
+            # FIX ME- don't know if this is necessary
+            if res == None:
+                self._say("Upload of '%s' failed, proceeding...\n" % src)
             else:
-                # The text is marked up at this stage, but we need to clean it
-                # up prior to shipping it out, so we parse it using lxml and
-                # then rebuild it as a string as we fix each tag
-                # Start by escaping any stray '&' characters- just make sure
-                # they aren't already part of an escape sequence
-                i = 0
-                for m in re.finditer(u'&(?!amp|gt|lt|#\d+;)', xhtml):
-                    if m:
-                        xhtml = xhtml[:m.start()+(i*4)] + u'&amp;' + xhtml[m.end()+(i*4):]
-                        i = i + 1
-                return _ptFixUp(etree.XML('<post>%s</post>' % xhtml))
-        else:
-            raise FileProcessorError("In FileProcessor._procHTML: %s\n" %
-                                                                     last_error)
+                uploads[src] = res
+
+        return uploads
+
+    ############################################################################
+    """_isWebResource
+
+        Returns True if an image ``src`` refers to a file on the web rather
+        than a local file.
+    """
+    @staticmethod
+    def _isWebResource(src):
+        parts = urlparse.urlsplit(src)
+        if parts.scheme:
+            return parts.scheme in ('http', 'https')
+        # a protocol relative url, like '//example.com/image.jpg'
+        return parts.netloc != ''
+
+    ############################################################################
+    """_ptFixWhitespace
+
+        Fixes some whitespace issues.
+    """
+    @staticmethod
+    def _ptFixWhitespace(e):
+        if e.text and e.tag not in ['pre', 'code', 'comment']:
+            e.text = e.text.replace('\n', u' ')
+        if e.tail:
+            e.tail = e.tail.replace('\n', u' ')
+
+    ############################################################################
+    """_ptFixUp
+
+        Facilitates adjustments to the markup.  Accepts a parsed tree
+        which is then reserialized with all adjustments.  I tried to use
+        the etree.tostring function, but there were certain tags that
+        couldn't be rendered properly in xhtml, like the iframe tag.
+        Thus, I have to serialize it myself.
+    """ 
+    def _ptFixUp(self, tree, fixup):
+        xhtml = XHTMLSerializer(fixup).serialize(tree)
+
+#        teststr = etree.tostring(tree, pretty_print=True).replace('<post>', '').replace('</post>', '')
+#        if teststr.rstrip().lstrip() == xhtml.rstrip():
+#            print "Match!/n"
+#        else:
+#            print xhtml + '\n'
+#            print teststr
+#        sys.exit()
+
+        return xhtml
 
     ############################################################################ 
     """_procCategories
@@ -334,29 +376,32 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
     def _procCategories(self, header):
         # first, build a list of catgories that aren't on the blog from the
         # post's category list
-        nonCats = []
         try:
-            cat_list = header.proxy.getCategories()
+            nonCats = self._findNonCats(header)
+            # categories cached before some were added on the blog itself
+            # would have them missing, so look again at what's on the blog
+            if nonCats and header.proxy.reloadCategories():
+                nonCats = self._findNonCats(header)
         except ProxyError, err:
             raise FileProcessorError("In FileProcessor._procCategories:  %s\n" % err)
-        for c in header.categories:
-            t = utils.isBlogCategory(cat_list, c)
-            if t != None:
-                nonCats.append((c,) + t)
 
         # see if there were any unrecognized categories
         if len(nonCats) == 0:
-            print "Post categories OK"
+            self._say("Post categories OK")
         elif self.addpostcats:
-            [ utils.addCategory(header.proxy, *ct) for ct in nonCats ]
+            try:
+                utils.addCategories(header.proxy, [ ct[0] for ct in nonCats ],
+                                    self.quiet)
+            except utils.UtilsError, err:
+                raise FileProcessorError("In FileProcessor._procCategories:  %s\n" % err)
         else:
             rcats = [ ct[0] for ct in nonCats ]
-            print "Category '%s' is not a valid category for %s so it is being\n\
+            self._say("Category '%s' is not a valid category for %s so it is being\n\
                    \r removed from the category list for this post.\n\
                    \rUse the -a option if you wish to override this behavior or\n\
                    \rthe -n option to add it from the command line.\n" %\
                                                          (', '.join(rcats),
-                                                          header.name)
+                                                          header.name))
             [ header.categories.remove(c) for c in rcats ]
 
         # last bit of category processing- if there are any categories 
@@ -364,12 +409,23 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
         # up so that the post is categorized properly
         # the 'list(set(...)) removes all duplicates 
         if len(header.categories) == 0:
-            print "This post has no valid categories, the default blog category\n\
-                   \rwill be used.\n"
+            self._say("This post has no valid categories, the default blog category\n\
+                   \rwill be used.\n")
         else:
             return list(set(reduce(lambda l1, l2: l1 + l2, 
                                       [c.split('.') for c in header.categories])))
 
+    # Returns the (category, ...) tuples utils.isBlogCategory gives for the
+    # categories in ``header`` that aren't on its blog.
+    def _findNonCats(self, header):
+        cat_list = header.proxy.getCategoryIndex()
+        nonCats = []
+        for c in header.categories:
+            t = utils.isBlogCategory(cat_list, c)
+            if t != None:
+                nonCats.append((c,) + t)
+        return nonCats
+
     ############################################################################ 
     """parsePostFile
 
@@ -382,21 +438,79 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
             if filename == 'STDIN':
                 f = sys.stdin
             else:
-                f = open(filename, 'r')
-            lines = f.readlines()
+                f = open(filename, 'rb')
+            raw = f.read()
         except IOError:
+            # checked before the file is created, so a command handed back
+            # by the daemon doesn't find an empty post there
+            if not utils.interactive:
+                raise utils.EditorUnavailable("No terminal to run the "
+                                              "editor on.")
             try:
                 f = open(filename, 'w')
             except IOError, err:
                 print err
-                sys.exit()
+                sys.exit(1)
 
             utils.edit(hdrtext, f)
             raise FileProcessorRetry()
         else:
             f.close()
 
-        return self._getHeaderandContent(lines)
+        return self.parsePostText(raw)
+
+    ############################################################################ 
+    """parsePostText
+
+        Splits the text of a post, as it would be in a post file, into its
+        header and text portions.  ``raw`` is decoded first if it is a byte
+        string.
+    """
+    def parsePostText(self, raw):
+        if isinstance(raw, unicode):
+            text = raw
+        else:
+            text = self._decode(raw)
+        return self._getHeaderandContent(text.splitlines(True))
+
+    # Reports progress unless the processor is quiet.
+    def _say(self, msg):
+        if not self.quiet:
+            print msg
+
+    ############################################################################ 
+    """_decode
+
+        Decodes the raw text of a post file.  The encoding is the one specified
+        on the command line if there is one, otherwise it is determined from
+        the byte order mark, if present, or by trying the ``ENCODINGS`` in
+        order.  Each attempt decodes the text incrementally so an encoding that
+        doesn't fit is abandoned as soon as an invalid sequence turns up.
+    """
+    def _decode(self, raw):
+        if self.charset:
+            encodings = [ self.charset ]
+        else:
+            for bom, encoding in self.BOMS:
+                if raw.startswith(bom):
+                    encodings = [ encoding ]
+                    break
+            else:
+                encodings = self.ENCODINGS
+
+        last_error = ''
+        for encoding in encodings:
+            try:
+                decoder = codecs.getincrementaldecoder(encoding)()
+                chunks = [ decoder.decode(raw[i:i + self.DECODE_CHUNK])
+                           for i in xrange(0, len(raw), self.DECODE_CHUNK) ]
+                chunks.append(decoder.decode('', True))
+            except (LookupError, UnicodeError), err:
+                last_error = err
+                continue
+            return u''.join(chunks)
+
+        raise FileProcessorError("In FileProcessor._decode: %s\n" % last_error)
 
     ############################################################################ 
     """pushContent
@@ -408,20 +522,22 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
         updated with the post ID assigned at the blog.
         Added: Also can be used to write a comment for the blog- thus the name
                change from pushPost to pushContent
+        ``rendered`` is the result of `renderContent` for ``post_text`` if it
+        has already been rendered.
     """
-    def pushContent(self, post_text, header):
+    def pushContent(self, post_text, header, rendered = None):
         rval = None
-        content = self._procContent(post_text, header)
+        content = self._procContent(post_text, header, rendered)
         if self.comment:
             comment = utils.buildComment(header, content)
             try:
                 if header.commentid:
-                    print "Updating comment %s on %s" % (header.commentid, 
-                                                         header.name)
+                    self._say("Updating comment %s on %s" % (header.commentid, 
+                                                             header.name))
                     rval = header.proxy.editComment(header.commentid,
                                                     comment)
                 else:
-                    print "Publishing comment to post %s..." % header.postid
+                    self._say("Publishing comment to post %s..." % header.postid)
                     commentid = header.proxy.newComment(header.postid,
                                                         comment)
                     rval = commentid
@@ -430,7 +546,7 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
         else:
             post = data.Post()
 
-            print "Checking post categories..."
+            self._say("Checking post categories...")
             post.categories = self._procCategories(header)
             post.posttype = self.posttype or 'post'
             post.content = content
@@ -452,16 +568,16 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
 
             try:
                 if header.postid:
-                    print "Updating '%s' on %s..." % (header.title, header.name)
+                    self._say("Updating '%s' on %s..." % (header.title, header.name))
                     header.proxy.editPost(header.postid, post)
                 else:
                     if self.publish:
                         msg_text = "Publishing '%s' to '%s'" 
                     else:
                         msg_text = "Publishing '%s' to '%s' as a draft" 
-                    print msg_text % (header.title, header.name)
+                    self._say(msg_text % (header.title, header.name))
                     postid = header.proxy.publishPost(post)
-                    print "Content published with ID %s." % postid
+                    self._say("Content published with ID %s." % postid)
                     rval = postid
             except utils.UtilsError, timestr:
                 raise FileProcessorError("In FileProcessor.pushContent: %s\n" %
@@ -483,7 +599,7 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
         # alter the file name so we don't overwrite
         filename += '.posted'
         try:
-            f = open(filename, 'w')
+            f = codecs.open(filename, 'w', 'utf-8')
             f.write(hdr_text)
             f.write('\n')
             f.write(post_text)
@@ -491,3 +607,19 @@ FileProcessor._getHeaderandContent: No text for post, aborting.
             print "Error writing updated post file %s" % file
         else:
             f.close()
+
+################################################################################
+"""renderContent
+
+    Module level wrapper for `FileProcessor.renderContent` so it can be run in
+    a worker process.  ``job`` is a tuple of a key identifying the content and
+    the content itself.  Returns a tuple of the key and either the rendered
+    content and None or None and the error message.  Exceptions aren't raised
+    since they don't survive the trip back from the worker.
+"""
+def renderContent(job):
+    key, posttext = job
+    try:
+        return key, FileProcessor().renderContent(posttext), None
+    except FileProcessorError, err:
+        return key, None, str(err)
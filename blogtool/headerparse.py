@@ -564,6 +564,7 @@ class Header(object):
         self._parm_index = None
         self._named_parmlist = None
         self._parms = None
+        self._proxy_parms = None
 
     def __setattr__(self, name, value):
         if hasattr(self, '_parms') and (hasattr(self, '_parm_index') or
@@ -614,7 +615,7 @@ class Header(object):
             self._parm_index += 1
         else:
             self._parm_index = None
-            self._proxy = None
+            self._proxy_parms = None
             raise StopIteration
 
         self._setProxy(self._parms[self._parm_index])
@@ -655,13 +656,50 @@ class Header(object):
             del self._parms[:]
         self._parms = newparms
 
+    ############################################################################
+    """clone
+
+        Returns a new header with the same defaults and parameters as this one,
+        which can then be used for a different post file.
+    """
+    def clone(self):
+        hdr = Header()
+        # copied together so the named parameter list is still one of the
+        # copied parameter lists
+        parms, named = copy.deepcopy((self._parms, self._named_parmlist))
+        hdr._default_parms = self._default_parms
+        hdr._named_parmlist = named
+        hdr._parms = parms
+        return hdr
+
+    ############################################################################
+    """perBlog
+
+        Returns a copy of the header for each blog, set to that blog the same
+        way iterating over the header would be.  The copies can be used at
+        the same time, and changing them doesn't change this header.
+    """
+    def perBlog(self):
+        hdrs = []
+        for i in range(len(self._parms or [])):
+            hdr = self.clone()
+            hdr._parm_index = i
+            hdr._setProxy(hdr._parms[i])
+            hdrs.append(hdr)
+
+        return hdrs
+
+    # The proxy isn't looked up until it's used, since plenty of headers are
+    # iterated without ever talking to the blog.
     def _setProxy(self, pl):
-        self._proxy = getProxy(*pl.XMLrpc)
-        self._proxy.setBlogname(pl.name)
+        self._proxy_parms = pl
 
     @property
     def proxy(self):
-        return self._proxy
+        pl = self._proxy_parms
+        if pl is None:
+            return None
+        return getProxy(*(pl.XMLrpc + (pl.name, )))
 
     def debug(self):
         if self._named_parmlist:
@@ -683,20 +721,13 @@ class Header(object):
         else:
             raise HeaderError(HeaderError.NAMENOTFOUND)
 
+    # Both of these raise HeaderParseError if ``hdrstr`` can't be parsed.
     def setDefaults(self, hdrstr):
-        try:
-            self._default_parms = self._parser.parse(hdrstr)
-        except HeaderParseError, err:
-            print err
-            sys.exit()
+        self._default_parms = self._parser.parse(hdrstr)
         self._parms = copy.deepcopy(self._default_parms)
 
     def addParms(self, hdrstr, allblogs):
-        try:
-            newparms = self._parser.parse(hdrstr)
-        except HeaderParseError, err:
-            print err
-            sys.exit()
+        newparms = self._parser.parse(hdrstr)
 
         if self._default_parms:
             if allblogs:
@@ -6,6 +6,8 @@ import unicodedata
 
 from StringIO import StringIO
 
+from xhtml import parseFragment
+
 try:
     from lxml import etree
     LXML_PRESENT = True
@@ -471,17 +473,9 @@ class Html2Markdown(object):
             nhtml = html
         except UnicodeEncodeError:
             print repr(html)
-            sys.exit()
-
-        # this is a negative-lookahead re- we're looking for '&' that are
-        # unescaped in the data, the lxml parser chokes on those
-        i = 0
-        for m in re.finditer(u'&(?!amp;|gt;|lt;|quot;|#\d+;)', nhtml):
-            if m:
-                nhtml = nhtml[:m.start()+(i*4)] + u'&amp;' + nhtml[m.end()+(i*4):]
-                i = i + 1
-#        print nhtml
-        root = etree.fromstring("<post>%s</post>" % nhtml)
+            sys.exit(1)
+
+        root = parseFragment(nhtml)
 
         # if the 'post' tag has text, then grab it and add it as the first
         # block before proceeding to process the children
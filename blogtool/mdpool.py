@@ -0,0 +1,92 @@
+"""mdpool.py
+
+    A pool of reusable Markdown converters.  A Markdown instance keeps state
+    like reference links and footnotes between conversions unless it is reset
+    and can't be shared between threads, but building one is expensive.  The
+    pool keeps warm instances around, hands each thread its own, and resets an
+    instance before it is handed out again.
+
+    Markdown itself is only imported when the first converter is built, so
+    commands that never render don't pay for importing it.
+"""
+import threading
+
+# whether python-markdown can be imported, found out the first time it's asked
+_present = None
+
+################################################################################
+"""markdownPresent
+
+    Returns True if python-markdown is installed.
+"""
+def markdownPresent():
+    global _present
+    if _present is None:
+        try:
+            import markdown
+            _present = True
+        except ImportError:
+            _present = False
+
+    return _present
+
+################################################################################
+"""MarkdownPool
+
+    Hands out Markdown converters configured with a given set of extensions.
+    Idle converters are kept per thread and per extension set, so a converter
+    is never used by two threads and conversions with different extensions
+    never share one.
+"""
+class MarkdownPool(object):
+
+    # most idle converters kept for each thread and extension set
+    MAX_IDLE = 4
+
+    def __init__(self):
+        self._local = threading.local()
+
+    ############################################################################
+    """acquire
+
+        Returns a converter for ``extensions``, reusing an idle one if there is
+        one.  It should be given back with `release` when done.
+    """
+    def acquire(self, extensions):
+        idle = self._idle(extensions)
+        if idle:
+            return idle.pop()
+
+        import markdown
+        return markdown.Markdown(extensions = list(extensions))
+
+    ############################################################################
+    """release
+
+        Resets ``md`` and returns it to the pool.
+    """
+    def release(self, md, extensions):
+        md.reset()
+        idle = self._idle(extensions)
+        if len(idle) < self.MAX_IDLE:
+            idle.append(md)
+
+    ############################################################################
+    """convert
+
+        Converts ``text`` with a pooled converter for ``extensions``.
+    """
+    def convert(self, text, extensions):
+        md = self.acquire(extensions)
+        try:
+            return md.convert(text)
+        finally:
+            self.release(md, extensions)
+
+    def _idle(self, extensions):
+        try:
+            idle = self._local.idle
+        except AttributeError:
+            idle = self._local.idle = {}
+
+        return idle.setdefault(tuple(sorted(extensions)), [])
@@ -0,0 +1,158 @@
+"""mediamanifest.py
+
+    Keeps a local record of the media files that have been uploaded to each
+    blog, so a file that is already in a blog's media library isn't uploaded
+    again every time a post that references it is updated.
+
+    Files are identified by a hash of their content rather than by name, so a
+    file that is edited gets uploaded again while a file that is merely moved
+    or renamed doesn't.  The manifest is a file of JSON records, one per line,
+    that is appended to as files are uploaded.
+"""
+import utils
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+################################################################################
+"""MediaManifest
+
+    Maps (blog, content hash) to the result of uploading the file to that
+    blog.  The blog is identified by its XMLRPC url and its name.  Safe to use
+    from several threads at once.
+"""
+class MediaManifest(object):
+
+    FILENAME = 'media.jsonl'
+
+    def __init__(self, filename = None):
+        self._filename = filename
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @property
+    def filename(self):
+        if self._filename is None:
+            self._filename = os.path.join(utils.getCacheDir(), self.FILENAME)
+        return self._filename
+
+    ############################################################################
+    """hashFile
+
+        Returns the content hash used to identify ``filename``.
+    """
+    @staticmethod
+    def hashFile(filename):
+        h = hashlib.sha1()
+        f = open(filename, 'rb')
+        try:
+            for chunk in iter(lambda: f.read(64 * 1024), ''):
+                h.update(chunk)
+        finally:
+            f.close()
+        return h.hexdigest()
+
+    ############################################################################
+    """lookup
+
+        Returns the recorded upload result for the file with content hash
+        ``digest`` on the blog, or None if it hasn't been uploaded there.
+    """
+    def lookup(self, xmlrpc, blogname, digest):
+        with self._lock:
+            entry = self._load().get((xmlrpc, blogname, digest))
+        if entry is None:
+            return None
+        return { 'url' : entry['url'], 'file' : entry['file'] }
+
+    ############################################################################
+    """record
+
+        Records ``res``, the result of uploading the file with content hash
+        ``digest`` to the blog.
+    """
+    def record(self, xmlrpc, blogname, digest, res):
+        entry = { 'xmlrpc' : xmlrpc,
+                  'blog'   : blogname,
+                  'sha1'   : digest,
+                  'url'    : res['url'],
+                  'file'   : res['file'], }
+        with self._lock:
+            self._load()[(xmlrpc, blogname, digest)] = entry
+            try:
+                f = open(self.filename, 'a')
+                try:
+                    f.write(json.dumps(entry) + '\n')
+                finally:
+                    f.close()
+            except IOError:
+                # not being able to record the upload just means it will be
+                # uploaded again next time
+                pass
+
+    ############################################################################
+    """entries
+
+        Returns the entries recorded for the blog.
+    """
+    def entries(self, xmlrpc, blogname):
+        with self._lock:
+            return [ e for e in self._load().values()
+                           if e['xmlrpc'] == xmlrpc and e['blog'] == blogname ]
+
+    ############################################################################
+    """prune
+
+        Removes the blog's entries whose url isn't in ``urls``, the urls of the
+        files actually in the blog's media library.  Returns the removed
+        entries.
+    """
+    def prune(self, xmlrpc, blogname, urls):
+        urls = set(urls)
+        with self._lock:
+            entries = self._load()
+            removed = [ k for k, e in entries.iteritems()
+                              if e['xmlrpc'] == xmlrpc and
+                                 e['blog'] == blogname and
+                                 e['url'] not in urls ]
+            removed = [ entries.pop(k) for k in removed ]
+            if removed:
+                self._save(entries)
+
+        return removed
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            try:
+                f = open(self.filename, 'r')
+            except IOError:
+                return self._entries
+            try:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                        self._entries[(e['xmlrpc'], e['blog'], e['sha1'])] = e
+                    except (ValueError, KeyError, TypeError):
+                        # a partially written line, skip it
+                        continue
+            finally:
+                f.close()
+
+        return self._entries
+
+    def _save(self, entries):
+        try:
+            fd, tmpname = tempfile.mkstemp(dir = os.path.dirname(self.filename))
+            f = os.fdopen(fd, 'w')
+            try:
+                for e in entries.itervalues():
+                    f.write(json.dumps(e) + '\n')
+            finally:
+                f.close()
+            os.rename(tmpname, self.filename)
+        except (IOError, OSError):
+            pass
@@ -1,12 +1,11 @@
-from blogtool import __version__
+from __version__ import __version__
 
-from headerparse import HeaderError
-from xmlproxy.proxybase import ProxyError
-from fileprocessor import FileProcessor, FileProcessorError
+from headerparse import HeaderError, HeaderParseError
+from xmlproxy.proxybase import BlogProxy, ProxyError
+from xmlproxy import dropProxies
 
 import argparse
 
-import html2md
 import utils
 
 import sys
@@ -61,29 +60,48 @@ class DeletePost(CommandLineOption):
               'action' : 'store',
               'dest' : "del_postid", 
               'metavar' : 'POSTID',
-              'help' : "Delete post POSTID from a blog." 
+              'help' : '''
+Delete post POSTID from a blog.  Several posts can be deleted at once by giving
+a comma separated list of post IDs.
+'''
              }
 
     def check(self, opts):
         if opts.del_postid:
-            self.postid = opts.del_postid
+            self.postids = [ p.strip() for p in opts.del_postid.split(',')
+                                       if p.strip() ]
             return True
 
         return False
 
     def run(self, header, opts):
-        print "Attempting to delete post %s from %s..." % (self.postid, header.name)
+        if len(self.postids) == 1:
+            print "Attempting to delete post %s from %s..." % (self.postids[0],
+                                                               header.name)
+        else:
+            print "Attempting to delete %d posts from %s..." % (len(self.postids),
+                                                                header.name)
         try:
-            postid = header.proxy.deletePost(self.postid)
+            results = header.proxy.deletePosts(self.postids)
         except ProxyError, err:
             print "Caught in options.DeletePost.run:"
             print err
-            sys.exit()
+            sys.exit(1)
 
-        if postid:
-            print "Post %s deleted." % self.postid
-        else:
-            print "Could not delete post %s." % self.postid
+        failed = False
+        for postid, result in zip(self.postids, results):
+            if isinstance(result, ProxyError):
+                print "Could not delete post %s:" % postid
+                print result
+                failed = True
+            elif result:
+                print "Post %s deleted." % postid
+            else:
+                print "Could not delete post %s." % postid
+                failed = True
+
+        if failed:
+            sys.exit(1)
 
         return None
 
@@ -115,7 +133,7 @@ class DeleteComment(CommandLineOption):
         except ProxyError, err:
             print "Caught in options.DeleteComment.run:"
             print err
-            sys.exit
+            sys.exit(1)
 
         return None
 
@@ -153,21 +171,21 @@ class GetRecentTitles(CommandLineOption):
         print "\nRetrieving %s most recent posts from blog '%s'.\n" % (self.count,
                                                                      blogname)
         try:
-            recent = header.proxy.getRecentTitles(self.count)
+            print "POSTID\tTITLE                               \tDATE CREATED"
+            print "%s\t%s\t%s" % ('='*6, '='*35, '='*21)
+            # each post is printed as it arrives, so even a huge number of
+            # posts is never all in memory at once
+            for post in header.proxy.iterRecentTitles(self.count):
+                t_converted = datetime.datetime.strptime(post['dateCreated'].value,
+                                                         "%Y%m%dT%H:%M:%S")
+                padding = ' '*(35 - len(post['title']))
+                print "%s\t%s\t%s" % (post['postid'],
+                                      post['title'] + padding,
+                                      t_converted.strftime("%b %d, %Y at %H:%M"))
         except ProxyError, err:
             print "Caught in options.GetRecentTitles.run:"
             print err
-            sys.exit()
-
-        print "POSTID\tTITLE                               \tDATE CREATED"
-        print "%s\t%s\t%s" % ('='*6, '='*35, '='*21)
-        for post in recent:
-            t_converted = datetime.datetime.strptime(post['dateCreated'].value,
-                                                     "%Y%m%dT%H:%M:%S")
-            padding = ' '*(35 - len(post['title']))
-            print "%s\t%s\t%s" % (post['postid'],
-                                  post['title'] + padding,
-                                  t_converted.strftime("%b %d, %Y at %H:%M"))
+            sys.exit(1)
 
         return None
 
@@ -191,22 +209,23 @@ class GetCategories(CommandLineOption):
     def run(self, header, opts):
         print "Retrieving category list for '%s'." % header.name
         try:
-            cat_list = header.proxy.getCategories()
+            catindex = header.proxy.getCategoryIndex()
         except ProxyError, err:
             print "Caught in options.GetCategories.run:"
             print err
-            sys.exit()
+            sys.exit(1)
 
         print "Category       \tParent        \tDescription"
         print "%s\t%s\t%s" % ('='*14, '='*14, '='*35)
-        for cat in cat_list:
-           parent = [ c['categoryName'] for c in cat_list 
-                                        if cat['parentId'] == c['categoryId'] ]
+        # walking the index lists each category right after its parent
+        for depth, cat in catindex.walk():
+           parent = catindex.get(cat['parentId'])
            str = cat['categoryName'] + ' '*(16 - len(cat['categoryName']))
-           if len(parent) == 0:
+           if parent is None:
                str += ' '*16
            else:
-               str += parent[0] + ' '*(16 - len(parent[0]))
+               str += parent['categoryName'] + \
+                      ' '*(16 - len(parent['categoryName']))
 
            str += cat['categoryDescription']
            print str
@@ -245,22 +264,32 @@ categories using a dot notation to separate subcategories, eg
         blogname = header.name
         try:
             print "Checking if category already exists on '%s'..." % (blogname)
-            blogcats = header.proxy.getCategories()
+            blogcats = header.proxy.getCategoryIndex()
+            t = utils.isBlogCategory(blogcats, self.catname)
+            # it may have been added on the blog since the categories were
+            # cached
+            if t != None and header.proxy.reloadCategories():
+                blogcats = header.proxy.getCategoryIndex()
+                t = utils.isBlogCategory(blogcats, self.catname)
         except ProxyError, err:
             print "Caught in options.AddCategory.run:"
             print err
-            sys.exit()
+            sys.exit(1)
 
-        t = utils.isBlogCategory(blogcats, self.catname)
         if t == None:
             print "The category specified alread exists on the blog."
         else:
             # t is a tuple with the first NEW category from the category string
-            # specified and it's parentId.  Start adding categories from here
+            # specified and it's parentId.  addCategories works out the same
+            # thing for itself and adds everything from there down
             print "Attempting to add '%s' category to blog '%s'" % (self.catname,
                                                                    blogname)
-            # the '*' is the unpacking operator
-            utils.addCategory(header.proxy, self.catname, *t)
+            try:
+                utils.addCategories(header.proxy, [ self.catname ])
+            except utils.UtilsError, err:
+                print "Caught in options.AddCategory.run:"
+                print err
+                sys.exit(1)
 
         return None
 
@@ -292,9 +321,97 @@ class UploadMediaFile(CommandLineOption):
             res = header.proxy.upload(uf)
         except utils.UtilsError, err:
             print "File not found: %s" % err
+            sys.exit(1)
         except ProxyError, err:
             print "Caught in options.UploadMediaFile"
             print err
+            sys.exit(1)
+
+        return None
+
+################################################################################
+"""PruneMediaManifest
+
+    Option to check the local record of uploaded media files against a blog's
+    media library, dropping entries for files that are no longer there.
+"""
+class PruneMediaManifest(CommandLineOption):
+    args = ('--prunemedia', )
+    kwargs = {
+              'action' : 'store_true',
+              'dest' : 'prunemedia',
+              'help' : '''
+Verify the record of media files already uploaded to a blog against the blog's
+media library and remove any entries for files that are no longer on the blog,
+so they will be uploaded again when needed.
+'''
+             }
+
+    def check(self, opts):
+        return bool(opts.prunemedia)
+
+    def run(self, header, opts):
+        from mediamanifest import MediaManifest
+
+        manifest = MediaManifest()
+        entries = manifest.entries(header.xmlrpc, header.name)
+        print "Verifying %d uploaded media files against '%s'..." % (len(entries),
+                                                                     header.name)
+        try:
+            library = header.proxy.getMediaLibrary()
+        except ProxyError, err:
+            print "Caught in options.PruneMediaManifest.run:"
+            print err
+            sys.exit(1)
+
+        removed = manifest.prune(header.xmlrpc, header.name,
+                                 [ item['link'] for item in library ])
+        for entry in removed:
+            print "Removed %s" % entry['url']
+        print "%d of %d entries verified." % (len(entries) - len(removed),
+                                              len(entries))
+
+        return None
+
+################################################################################
+"""ProbeBlog
+
+    Option to find out which XMLRPC API the blog supports for each operation
+    and how long calls to it take.
+"""
+class ProbeBlog(CommandLineOption):
+    args = ('--probe', )
+    kwargs = {
+              'action' : 'store_true',
+              'dest' : 'probe',
+              'help' : '''
+Find out which XMLRPC API a blog supports for each operation, remember it so
+the other APIs aren't tried first, and report how long some calls take.
+'''
+             }
+
+    def check(self, opts):
+        return bool(opts.probe)
+
+    def run(self, header, opts):
+        print "Probing '%s'..." % header.name
+        try:
+            results = header.proxy.probe()
+        except ProxyError, err:
+            print "Caught in options.ProbeBlog.run:"
+            print err
+            sys.exit(1)
+
+        print "%-20s%-14s%s" % ('Method', 'API', 'Time')
+        print "%s  %s  %s" % ('='*18, '='*12, '='*10)
+        for r in results:
+            if r['error']:
+                time_str = 'failed: %s' % r['error'].strip().splitlines()[-1].strip()
+            elif r['seconds'] is None:
+                time_str = '-'
+            else:
+                time_str = '%.3fs' % r['seconds']
+            print "%-20s%-14s%s" % (r['method'], r['family'] or '-', time_str)
 
         return None
 
@@ -317,9 +434,6 @@ updating with blogtool.
 '''            
              }
 
-    CATID = 0
-    CATPARENTID = 1
-
     def check(self, opts):
         if opts.get_postid:
             self.postid = opts.get_postid
@@ -328,17 +442,19 @@ updating with blogtool.
         return False
 
     def run(self, header, opts):
+        import html2md
+
         if not html2md.LXML_PRESENT:
             print "Option not supported without python-lxml library."
-            return
+            sys.exit(1)
 
         try:
             post = header.proxy.getPost(self.postid)
-            self.blogcats = header.proxy.getCategories()
+            self.blogcats = header.proxy.getCategoryIndex()
         except ProxyError, err:
             print "Caught in options.GetPost.run:"
             print err
-            sys.exit()
+            sys.exit(1)
 
         text = html2md.convert(post.content)
         header_str = 'BLOG: %s\nPOSTID: %s\nTITLE: %s\n' % (header.name, 
@@ -357,76 +473,50 @@ updating with blogtool.
         print (header_str + '\n' + text).encode("utf8")
         return None
 
-    def _buildCatStr(self, catlist):
-        blogcats_d = {cat['categoryName']:(cat['categoryId'], cat['parentId'])
-                                                       for cat in self.blogcats}
-        catlist = self._sortCats(catlist, blogcats_d)
-        cat_s = ''
-        # We need to convert the category list into a dot-delimited category
-        # string if there are subcategories, or not depending on the categories
-        # in the list- luckliy, the category list is sorted appropriately for us
-        if len(catlist) == 1:
-            cat_s = catlist[0]
-        else:
-            for cat in catlist:
-               if blogcats_d[cat][self.CATPARENTID] == '0':
-                   if cat_s == '':
-                      cat_s += "%s" % cat
-                   else:
-                      cat_s += ", %s" % cat
-               else:
-                   cat_s += ".%s" % cat
-        return cat_s
-
     ############################################################################
-    """_sortCats
-   
-        Sorts catlist from category to lowest subcategory.  If multiple
-        subcategories have a common parent, then the category hierarchy is
-        duplicated and added to the list with the new subcategory.
+    """_buildCatStr
+
+        Converts the post's category list into a header category string.  The
+        list is just names, with a subcategory and its parents all listed
+        separately, so it is turned back into dotted notation by writing out
+        the full path of each category that isn't the parent of another one in
+        the list.
     """
-    def _sortCats(self, catlist, bcats_d):
-        sortedcats = []
-        while len(catlist) != 0:
-            for cat in catlist[:]:
-                cat_parent_id = bcats_d[cat][self.CATPARENTID]
-                if cat_parent_id == '0':
-                    sortedcats.append(cat)
-                    catlist.remove(cat)
-                else:
-                    enumerated_seq = list(enumerate(sortedcats))
-                    for i, s_cat in enumerated_seq:
-                        if cat_parent_id == bcats_d[s_cat][self.CATID]:
-                            # does this subcategory have the same parent as 
-                            # another subcatgory?
-                            if len(sortedcats) > i+1 and \
-                               bcats_d[sortedcats[i+1]][self.CATPARENTID] == cat_parent_id:
-                                # find the top of the category hierarchy
-                                # i is the index of the parent of cat
-                                while bcats_d[sortedcats[i]][self.CATPARENTID] != '0':
-                                    i = i - 1
-                                j = i # mark insertion point into sortedlist
-                                # copy category hierarchy
-                                hierarchycopy = []
-                                while bcats_d[sortedcats[i]][self.CATPARENTID] != cat_parent_id:
-                                    hierarchycopy.insert(0, sortedcats[i])
-                                    i = i + 1
-                                hierarchycopy.insert(0, cat) # add new cat
-                                # insert copy into sorted list
-                                for c in hierarchycopy:
-                                    sortedcats.insert(j, c)
-                                catlist.remove(cat)
-                                break
-                            else:
-                                sortedcats.insert(i+1, cat)
-                                catlist.remove(cat)
-                                break
-                        elif bcats_d[cat][self.CATID] == bcats_d[s_cat][self.CATPARENTID]:
-                            sortedcats.insert(i-1, cat)
-                            catlist.remove(cat)
-                            break
-        return sortedcats
-                    
+    def _buildCatStr(self, catlist):
+        names = set(catlist)
+        cats = []
+        unknown = []
+        for name in catlist:
+            # names are only unique among siblings, so prefer the category
+            # whose parent is also one of the post's categories, and one that
+            # hasn't been picked already for a repeated name
+            candidates = [ c for c in self.blogcats.named(name)
+                                if c not in cats ]
+            for cat in candidates:
+                parent = self.blogcats.get(cat['parentId'])
+                if parent is None or parent['categoryName'] in names:
+                    break
+            else:
+                cat = candidates[0] if candidates else None
+
+            if cat is None:
+                unknown.append(name)
+            else:
+                cats.append(cat)
+
+        parents = set()
+        for cat in cats:
+            parents.update([ c['categoryId'] for c in
+                                 self.blogcats.ancestors(cat['categoryId'])[:-1] ])
+
+        paths = []
+        for cat in cats:
+            if cat['categoryId'] not in parents:
+                path = self.blogcats.path(cat['categoryId'])
+                if path not in paths:
+                    paths.append(path)
+
+        return ', '.join(paths + unknown)
 
 ################################################################################
 """GetComments
@@ -452,6 +542,8 @@ Retrieves the comments for post POSTID.
         return False
 
     def run(self, header, opts):
+        import html2md
+
         comments = header.proxy.getComments(self.postid)
         comments.reverse()
         for comment in comments:
@@ -495,6 +587,9 @@ be edited, for instance to approve a comment held in moderation.
         return False
 
     def run(self, header, opts):
+        from fileprocessor import FileProcessor, FileProcessorError
+        import html2md
+
         comment = header.proxy.getComment(self.commentid)
         commenttext = "COMMENTID: %s\n" % (self.commentid)
         commenttext += "PARENTID: %s\n" % (comment['parent'])
@@ -519,7 +614,7 @@ be edited, for instance to approve a comment held in moderation.
             header_text, commenttext = fp.parsePostFile(fd.name, '')
         except FileProcessorError, err_msg:
             print err_msg
-            sys.exit()
+            sys.exit(1)
         
         header.addParms(header_text, False)
         rval = fp.pushContent(commenttext, header)
@@ -576,6 +671,57 @@ class SetConfigFile(CommandLineOption):
    
         return None
 
+################################################################################
+"""SetRefresh
+
+    Option to ignore the cached blog metadata and fetch it all again.
+"""
+class SetRefresh(CommandLineOption):
+    args = ('--refresh', )
+    kwargs = {
+              'action' : 'store_true',
+              'dest' : 'refresh',
+              'help' : '''
+Ignore the cached information about blogs, like blog IDs and category lists,
+and fetch it from the blogs again.
+'''
+             }
+
+    def check(self, opts):
+        return bool(opts.refresh)
+
+    def run(self, header, opts):
+        BlogProxy.refreshMetadata()
+        # a daemon may still have proxies holding what they fetched earlier
+        dropProxies()
+        return None
+
+################################################################################
+"""SetCacheTTL
+
+    Option to set how long blog metadata is cached for.
+"""
+class SetCacheTTL(CommandLineOption):
+    args = ('--cachettl', )
+    kwargs = {
+              'action' : 'store',
+              'dest' : 'cachettl',
+              'type' : int,
+              'metavar' : 'SECONDS',
+              'help' : '''
+Use cached information about blogs, like blog IDs and category lists, for at
+most SECONDS seconds before fetching it again.  The default is one day.
+'''
+             }
+
+    def check(self, opts):
+        return opts.cachettl is not None
+
+    def run(self, header, opts):
+        BlogProxy.setMetadataTTL(opts.cachettl)
+        dropProxies(opts.cachettl)
+        return None
+
 ################################################################################
 """SetAddCategory
 
@@ -796,6 +942,114 @@ blog.
     def run(self, header, opts):
         return 'runeditor' 
 
+################################################################################
+"""SetBatch
+
+    Option to publish a whole directory of post files at once.
+"""
+class SetBatch(CommandLineOption):
+    args = ('--batch', )
+    kwargs = {
+              'action' : 'store',
+              'dest' : 'batch',
+              'metavar' : 'PATH',
+              'help' : '''
+Publish all of the post files in the directory PATH, or all of the files
+matching PATH if it is a glob pattern.  Files are rendered in parallel and
+several posts are pushed to the blogs at the same time.
+'''
+             }
+
+    def check(self, opts):
+        return False
+
+################################################################################
+"""SetJobs
+
+    Option to set how many posts are pushed to blogs at the same time.
+"""
+class SetJobs(CommandLineOption):
+    args = ('--jobs', )
+    kwargs = {
+              'action' : 'store',
+              'dest' : 'jobs',
+              'type' : int,
+              'default' : 4,
+              'metavar' : 'N',
+              'help' : '''
+Push at most N posts to blogs at the same time when publishing with --batch,
+and at most N posts to blogs on the same host at a time with --parallel.  The
+default is 4.
+'''
+             }
+
+    def check(self, opts):
+        return False
+
+################################################################################
+"""SetParallel
+
+    Option to push a post to all of its blogs at the same time.
+"""
+class SetParallel(CommandLineOption):
+    args = ('--parallel', )
+    kwargs = {
+              'action' : 'store_true',
+              'dest' : 'parallel',
+              'help' : '''
+Push a post to all of its blogs at the same time instead of one blog after
+another.  The post file is updated once all of the blogs are done.
+'''
+             }
+
+    def check(self, opts):
+        return False
+
+################################################################################
+"""SetScript
+
+    Option to run a script of bt commands in one process.
+"""
+class SetScript(CommandLineOption):
+    args = ('--script', )
+    kwargs = {
+              'action' : 'store',
+              'dest' : 'script',
+              'metavar' : 'FILE',
+              'help' : '''
+Run the bt command lines in FILE, one to a line, or from standard input if
+FILE is '-'.  The commands run in one process and share logins, blog
+information and connections.  '|' between commands on a line hands the output
+of one to the next as standard input.  A status line with the exit status is
+printed after each line.
+'''
+             }
+
+    def check(self, opts):
+        return False
+
+################################################################################
+"""StartDaemon
+
+    Option to run blogtool as a daemon that runs the commands of other `bt`
+    invocations.
+"""
+class StartDaemon(CommandLineOption):
+    args = ('--daemon', )
+    kwargs = {
+              'action' : 'store_true',
+              'dest' : 'daemon',
+              'help' : '''
+Keep running and carry out the commands of other bt invocations, which hand
+them over through a socket in the cache directory while the daemon is
+running.  Imports, blog information and connections are kept from one command
+to the next.  Stop the daemon with Ctrl-C or kill.
+'''
+             }
+
+    def check(self, opts):
+        return False
+
 ################################################################################
 """GetVersion
 
@@ -826,6 +1080,8 @@ class OptionProcessor(object):
         self.o_list = []
         self.o_list.append(SetConfigFile())  # should always be first in list
         self.o_list.append(SetBlogname())    # should always be second in list
+        self.o_list.append(SetRefresh())
+        self.o_list.append(SetCacheTTL())
         self.o_list.append(SetAddCategory())
         self.o_list.append(SetNoPublish())
         self.o_list.append(SetPosttime())
@@ -833,6 +1089,11 @@ class OptionProcessor(object):
         self.o_list.append(SetPostComment())
         self.o_list.append(SetCharset())
         self.o_list.append(SetPostType())
+        self.o_list.append(SetBatch())
+        self.o_list.append(SetJobs())
+        self.o_list.append(SetParallel())
+        self.o_list.append(SetScript())
+        self.o_list.append(StartDaemon())
         self.o_list.append(DeletePost())
         self.o_list.append(DeleteComment())
         self.o_list.append(GetRecentTitles())
@@ -840,6 +1101,8 @@ class OptionProcessor(object):
         self.o_list.append(AddCategory())
         self.o_list.append(GetPost())
         self.o_list.append(UploadMediaFile())
+        self.o_list.append(PruneMediaManifest())
+        self.o_list.append(ProbeBlog())
         self.o_list.append(GetComments())
         self.o_list.append(EditComment())
         self.o_list.append(GetVersion())
@@ -849,8 +1112,9 @@ class OptionProcessor(object):
             self.parser.add_argument(*option.args, **option.kwargs)
         self.parser.add_argument('postfile', nargs='*', help= "File or files to post to a blog")
 
-    def parse(self):
-        self.opts = self.parser.parse_args()
+    # ``argv`` is the list of arguments to parse, sys.argv[1:] if not given
+    def parse(self, argv = None):
+        self.opts = self.parser.parse_args(argv)
         return self.opts.postfile
 
     def flags(self):
@@ -862,6 +1126,9 @@ class OptionProcessor(object):
                 'comment'     : self.opts.comment,
                 'charset'     : self.opts.charset,
                 'posttype'    : self.opts.posttype,
+                'batch'       : self.opts.batch,
+                'jobs'        : self.opts.jobs,
+                'parallel'    : self.opts.parallel,
                }
 
     def check(self, header):
@@ -873,9 +1140,9 @@ class OptionProcessor(object):
                         rval = True
                 except AttributeError:
                     print "You must specify a blog using the -b option."
-                    sys.exit()
-                except HeaderError, err:
+                    sys.exit(1)
+                except (HeaderError, HeaderParseError), err:
                     print err
-                    sys.exit()
+                    sys.exit(1)
 
         return rval
@@ -0,0 +1,176 @@
+"""publisher.py
+
+    A library interface for publishing with blogtool from other programs.
+    Nothing is read from the command line or the user's home directory and
+    nothing is printed: results are returned and failures are raised, so a
+    long running program can publish any number of posts with one
+    `Publisher`, keeping the proxies, caches and Markdown converters it has
+    set up from one post to the next.
+
+        publisher = Publisher(config_text)
+        for result in publisher.publish(post_text):
+            if not result.ok:
+                print result.blog, result.error
+"""
+from headerparse import Header, HeaderParseError
+from fileprocessor import FileProcessor, FileProcessorError
+from xmlproxy.proxybase import ProxyError
+
+import batch
+
+################################################################################
+"""PublisherError
+
+    Raised when a post can't be published at all, or a post can't be fetched.
+"""
+class PublisherError(Exception):
+    def __init__(self, msg):
+        self.message = 'Error in Publisher: %s' % msg
+
+    def __str__(self):
+        return self.message
+
+################################################################################
+"""PublishResult
+
+    The outcome of publishing a post to one blog: the name of the ``blog``
+    and either the ``postid`` the blog gave the post or the ``error`` it
+    failed with.  An updated post keeps its post ID, so ``postid`` is None
+    for it.
+"""
+class PublishResult(object):
+
+    def __init__(self, blog, postid = None, error = None):
+        self.blog = blog
+        self.postid = postid
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.error is not None:
+            return '<PublishResult %s: error %s>' % (self.blog, self.error)
+        return '<PublishResult %s: %s>' % (self.blog, self.postid)
+
+################################################################################
+"""PublishResults
+
+    The list of PublishResults from publishing a post, one for each blog.
+    ``text`` is the text of the post with the post IDs the blogs gave it
+    added to its header, the same text the command line tool saves in the
+    .posted file.
+"""
+class PublishResults(list):
+
+    def __init__(self, results, text):
+        list.__init__(self, results)
+        self.text = text
+
+################################################################################
+"""Publisher
+
+    Publishes posts, given as the text of a post file, to the blogs described
+    by ``config``, the text of a config file such as ~/.btrc.  ``config`` can
+    be left out if the posts' headers describe their blogs in full.
+
+    The keyword arguments are the same settings as the command line options
+    for publishing:
+
+        ``publish``      publish the post rather than saving it as a draft
+        ``addpostcats``  add categories that aren't on the blog yet
+        ``posttime``     the time to publish the post at
+        ``allblogs``     publish to every blog in the config
+        ``posttype``     'post' or 'page'
+        ``charset``      the encoding of byte string posts
+        ``parallel``     push to all of a post's blogs at the same time
+        ``jobs``         most pushes to one host at a time with ``parallel``
+"""
+class Publisher(object):
+
+    DEFAULTS = { 'publish'     : True,
+                 'addpostcats' : False,
+                 'posttime'    : None,
+                 'allblogs'    : False,
+                 'posttype'    : None,
+                 'charset'     : None,
+                 'parallel'    : False,
+                 'jobs'        : 4, }
+
+    def __init__(self, config = None, **kwargs):
+        for key in kwargs:
+            if key not in self.DEFAULTS:
+                raise TypeError("Publisher got an unexpected keyword "
+                                "argument '%s'" % key)
+        flags = dict(self.DEFAULTS)
+        flags.update(kwargs)
+        self._fp = FileProcessor(comment = False, batch = None, **flags)
+        self._fp.quiet = True
+
+        self._header = Header()
+        if config:
+            try:
+                self._header.setDefaults(config)
+            except HeaderParseError, err:
+                raise PublisherError(err)
+
+    ############################################################################
+    """publish
+
+        Publishes ``text``, the text of a post file with its header, and
+        returns the PublishResults for the blogs it went to.  A post that
+        fails on some blogs, even for want of a connection, still goes to the
+        others, and the failure is in that blog's result.  Raises
+        PublisherError if the post can't be published anywhere, such as when
+        its header is bad or its text can't be rendered.
+    """
+    def publish(self, text):
+        fp = self._fp
+        try:
+            header_text, post_text = fp.parsePostText(text)
+            header = self._header.clone()
+            header.addParms(header_text, fp.allblogs)
+            rendered = fp.renderContent(post_text)
+        except (FileProcessorError, HeaderParseError), err:
+            raise PublisherError(err)
+
+        if fp.parallel:
+            pushed = batch.pushAll(fp, header, post_text, rendered)
+        else:
+            pushed = []
+            for hdr in header.perBlog():
+                try:
+                    pushed.append((hdr, fp.pushContent(post_text, hdr,
+                                                       rendered), None))
+                except Exception, err:
+                    # a blog that can't be reached fails on its own, the
+                    # same as it does with ``parallel``
+                    pushed.append((hdr, None, err))
+
+        batch.mergePostIDs(header, pushed)
+        return PublishResults([ PublishResult(hdr.name, rval, err)
+                                    for hdr, rval, err in pushed ],
+                              u'%s' % header + u'\n' + post_text)
+
+    ############################################################################
+    """fetch
+
+        Returns post ``postid`` as a data.Post from the blog named ``blog``,
+        or the first blog in the config if no blog is named.
+    """
+    def fetch(self, postid, blog = None):
+        hdrs = self._header.perBlog()
+        if not hdrs:
+            raise PublisherError("no blogs configured")
+
+        for hdr in hdrs:
+            if blog is None or hdr.name == blog:
+                break
+        else:
+            raise PublisherError("blog '%s' not in the config" % blog)
+
+        try:
+            return hdr.proxy.getPost(postid)
+        except ProxyError, err:
+            raise PublisherError(err)
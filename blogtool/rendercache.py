@@ -0,0 +1,131 @@
+"""rendercache.py
+
+    A persistent cache of rendered post text.  Entries are addressed by a hash
+    of the decoded markdown text and the markdown extensions used to render it,
+    so a post body that hasn't changed since the last time it was pushed never
+    needs to be run through markdown again.
+
+    Each entry is a file in the cache directory.  Reading an entry updates its
+    modification time, and when the cache grows beyond its size limit the
+    entries that were used least recently are removed first.
+"""
+from __version__ import __version__
+
+import utils
+
+import hashlib
+import os
+import tempfile
+
+################################################################################
+"""RenderCache
+
+    On disk, size bounded, least recently used cache of rendered XHTML.  All
+    errors accessing the cache are swallowed- a cache that can't be read or
+    written just means the post gets rendered again.
+"""
+class RenderCache(object):
+
+    MAX_BYTES = 32 * 1024 * 1024
+    SUFFIX = '.xhtml'
+    # bump this whenever a change to the rendering code changes its output
+    FORMAT = 3
+
+    def __init__(self, path = None, maxbytes = MAX_BYTES):
+        self._path = path
+        self.maxbytes = maxbytes
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = utils.getCacheDir('render')
+        return self._path
+
+    ############################################################################
+    """key
+
+        Returns the cache key for ``text`` rendered with ``extensions``.  The
+        blogtool version and output format are part of the key so changes to
+        the rendering code don't return stale output.
+    """
+    def key(self, text, extensions):
+        h = hashlib.sha1()
+        h.update('%s:%d' % (__version__, self.FORMAT))
+        h.update('\0')
+        h.update(','.join(sorted(extensions)))
+        h.update('\0')
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    ############################################################################
+    """get
+
+        Returns the XHTML stored under ``key`` or None if there isn't any.
+    """
+    def get(self, key):
+        filename = os.path.join(self.path, key + self.SUFFIX)
+        try:
+            f = open(filename, 'rb')
+            try:
+                xhtml = f.read().decode('utf-8')
+            finally:
+                f.close()
+            # mark the entry as recently used
+            os.utime(filename, None)
+        except (IOError, OSError, UnicodeError):
+            return None
+
+        return xhtml
+
+    ############################################################################
+    """put
+
+        Stores ``xhtml`` under ``key``.  The entry is written to a temporary
+        file and renamed into place so a reader never sees a partial entry.
+    """
+    def put(self, key, xhtml):
+        try:
+            fd, tmpname = tempfile.mkstemp(dir = self.path, suffix = '.tmp')
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(xhtml.encode('utf-8'))
+            finally:
+                f.close()
+            os.rename(tmpname, os.path.join(self.path, key + self.SUFFIX))
+        except (IOError, OSError):
+            return
+
+        self._evict()
+
+    ############################################################################
+    """_evict
+
+        Removes the least recently used entries until the cache fits within
+        ``maxbytes``.
+    """
+    def _evict(self):
+        entries = []
+        total = 0
+        try:
+            for name in os.listdir(self.path):
+                if not name.endswith(self.SUFFIX):
+                    continue
+                filename = os.path.join(self.path, name)
+                st = os.stat(filename)
+                entries.append((st.st_mtime, st.st_size, filename))
+                total += st.st_size
+        except OSError:
+            return
+
+        if total <= self.maxbytes:
+            return
+
+        entries.sort()
+        for mtime, size, filename in entries:
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.maxbytes:
+                break
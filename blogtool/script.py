@@ -0,0 +1,178 @@
+"""script.py
+
+    Runs a script of bt commands, one command line to a line, in a single
+    process, so the commands share proxies, caches and connections instead
+    of each paying for starting up, logging in and fetching the blog's
+    categories.  Lines are split like a shell would split them, without
+    the leading `bt`:
+
+        # blank lines and lines starting with '#' are skipped
+        -b myblog -t 20
+        -b myblog -g 1234 | STDIN
+
+    As in the shell, '|' hands what one command prints to the next as
+    standard input, so a downloaded post can be published again with STDIN.
+    Once a line has run, its line number and exit status are printed on a
+    line of their own:
+
+        === line 3: exit 0
+"""
+import shlex
+import sys
+import traceback
+
+from cStringIO import StringIO
+
+from xmlproxy import dropProxies
+from xmlproxy.proxybase import BlogProxy
+
+import utils
+
+# options that make no sense inside a script
+REFUSED = ('--script', '--daemon')
+
+################################################################################
+"""Capture
+
+    Stands in for sys.stdout while a command's output is being collected for
+    the next command in a pipe.  Text is kept encoded as UTF-8, the way it
+    would arrive through a real pipe.
+"""
+class Capture(object):
+
+    def __init__(self):
+        self._chunks = []
+        self.softspace = 0
+
+    def write(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        self._chunks.append(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self._chunks)
+
+################################################################################
+"""runScript
+
+    Runs the commands in the file ``filename``, or standard input if it is
+    '-', with ``command``, which runs a bt argument list the way `bt` would.
+    Commands never run an editor.  Returns 0 if every command succeeded and
+    1 if any failed.
+"""
+def runScript(command, filename):
+    if filename == '-':
+        f = sys.stdin
+    else:
+        try:
+            f = open(filename, 'r')
+        except IOError:
+            print "Unable to open script file: %s" % filename
+            return 1
+
+    interactive, utils.interactive = utils.interactive, False
+    # the options of one command mustn't change how the next one runs
+    ttl = BlogProxy.metadata.ttl
+    failed = False
+    try:
+        lineno = 0
+        # read a line at a time, so a script piped in is run as it arrives
+        for line in iter(f.readline, ''):
+            lineno += 1
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            BlogProxy.setMetadataTTL(ttl)
+            dropProxies(ttl)
+            # commands only get the process's stdin when it isn't the script
+            status = runLine(command, line, filename != '-')
+            print "=== line %d: exit %d" % (lineno, status)
+            sys.stdout.flush()
+            if status != 0:
+                failed = True
+    finally:
+        utils.interactive = interactive
+        if f is not sys.stdin:
+            f.close()
+
+    if failed:
+        return 1
+    return 0
+
+################################################################################
+"""runLine
+
+    Runs the command or pipe of commands in ``line`` and returns its exit
+    status, which is that of the last command unless an earlier one failed.
+    ``usestdin`` says whether the first command may read the process's
+    standard input.
+"""
+def runLine(command, line, usestdin = True):
+    try:
+        args = shlex.split(line)
+    except ValueError, err:
+        print "Unable to parse script line: %s" % err
+        return 2
+
+    stages = [ [] ]
+    for arg in args:
+        if arg == '|':
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    for argv in stages:
+        refused = [ arg for arg in argv if arg in REFUSED ]
+        if refused:
+            print "%s can't be used in a script." % refused[0]
+            return 2
+
+    stdin = sys.stdin
+    if not usestdin:
+        stdin = StringIO('')
+
+    status = 0
+    for i, argv in enumerate(stages):
+        if i < len(stages) - 1:
+            output = Capture()
+        else:
+            output = sys.stdout
+        rval = _runCommand(command, argv, stdin, output)
+        if rval != 0 or status == 0:
+            status = rval
+        if output is not sys.stdout:
+            stdin = StringIO(output.getvalue())
+
+    return status
+
+# Runs ``argv`` with ``command``, reading from ``stdin`` and writing to
+# ``stdout``, and returns its exit status.
+def _runCommand(command, argv, stdin, stdout):
+    saved = sys.stdin, sys.stdout
+    sys.stdin, sys.stdout = stdin, stdout
+    try:
+        command(argv)
+    except SystemExit, err:
+        if err.code is None:
+            return 0
+        elif isinstance(err.code, int):
+            return err.code
+        print >> sys.stderr, err.code
+        return 1
+    except utils.UtilsError, err:
+        print err
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdin, sys.stdout = saved
+
+    return 0
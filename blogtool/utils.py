@@ -1,4 +1,5 @@
 from xmlproxy.proxybase import ProxyError
+from xmlproxy import cache
 
 from tempfile import NamedTemporaryFile
 
@@ -19,6 +20,17 @@ class UtilsError(Exception):
     def __str__(self):
         return self.message
 
+################################################################################
+"""EditorUnavailable
+
+    Raised by `edit` when there's no terminal to run the editor on.
+"""
+class EditorUnavailable(UtilsError):
+    pass
+
+# cleared by processes, like the daemon, that have no terminal for an editor
+interactive = True
+
 ################################################################################
 """dataStruct
     
@@ -42,6 +54,19 @@ def chkFile(file):
 
     return tmpfile
 
+################################################################################
+"""getCacheDir
+
+    Returns the path of the directory blogtool keeps its caches in, creating it
+    if necessary.  The directory is `blogtool` under $XDG_CACHE_HOME, or under
+    ~/.cache if that isn't set.  The proxies keep their caches there as well,
+    so the work is done by xmlproxy.cache.
+
+    ``subdir``:  optional subdirectory of the cache directory to return
+"""
+def getCacheDir(subdir = ''):
+    return cache.cacheDir(subdir)
+
 ################################################################################
 """edit
 
@@ -51,6 +76,9 @@ def chkFile(file):
     ``fh``:  filehandle of file to edit
 """
 def edit(hdr_string = '', fh = None):
+    if not interactive:
+        raise EditorUnavailable("No terminal to run the editor on.")
+
     editor = os.getenv('EDITOR', 'editor')
     if fh == None:
         fh = NamedTemporaryFile()
@@ -97,8 +125,8 @@ def buildComment(header, comment_text):
     Returns ``None`` is the category is valid, returns a tuple of the category
     name and the category ID of the parent category.
 
-    ``blogcats`` is a dictionary- the main thing we'll be interested in are the
-    categoryName, parentId, categoryId
+    ``blogcats`` is the blog's category index as returned by the proxy's
+    getCategoryIndex method.
 
     ``postcat`` is a string representing the name of a category.  The string can
     contain '.' separating parent categories from subcategories.  In this case
@@ -106,48 +134,62 @@ def buildComment(header, comment_text):
     so forth
 """
 def isBlogCategory(blogcats, postcat):
-    pcatlist = postcat.split('.')
-
-    p_id = '0'
-    for cat in pcatlist:
-        catDict = dict([ (c['categoryName'], (c['categoryId'], c['parentId']))
-                         for c in blogcats if p_id == c['parentId'] ])
-        if cat in catDict:
-            p_id = catDict[cat][0]
-        else:
-            return (cat, p_id)
-
-    return None
+    return blogcats.resolve(postcat)
 
 ###############################################################################
-"""addCategory
+"""addCategories
 
-    Adds a category to a blog.
+    Adds categories to a blog.
 
-    ``c`` is the full, dotted-notation category string that includes the parent
-    categories.
+    ``paths`` are full, dotted-notation category strings that include the
+    parent categories.  Any levels of them that aren't on the blog already are
+    added, parents before children.  All the new categories at the same depth
+    are added together with the proxy's `newCategories`, which lets the proxy
+    add a whole level with a single request, and the IDs of the new categories
+    are fed forward as the parents of the next level.
 
-    ``substart`` is the first potential subcategory that isn't on the blog.
+    Each category is reported as it is added unless ``quiet`` is set.
 
-    ``parentID`` is the parent ID of the subcategory to add.
+    Raises UtilsError if the blog refuses any of the categories.
 """
-def addCategory(proxy, c, substart, parentId):
-    # subcategories are demarked by '.'
-    newcatlist = c.split('.')
-
-    # isBlogCategory returns a tuple containing the first cat/
-    # subcat that is not on the blog.  We cannot assume that the
-    # first entry in the list matches the cat returned in the tuple
-    # so we'll remove categories/subcats that already exist on
-    # the blog
-    while substart != newcatlist[0]:
-        newcatlist.pop(0)
- 
-    for c in newcatlist:
-        print "Adding %s with parent %s" % (c, parentId)
+def addCategories(proxy, paths, quiet = False):
+    try:
+        catindex = proxy.getCategoryIndex()
+    except ProxyError, err:
+        raise UtilsError("In utils.addCategories: %s" % err)
+
+    # each missing category is identified by the ID of the deepest existing
+    # category above it followed by the names of the missing levels down to
+    # it, so the same new category in several paths is only added once
+    levels = []
+    for path in paths:
+        missing = catindex.resolve(path)
+        if missing is None:
+            continue
+        name, parentid = missing
+        # the missing levels are the ones below the existing parent
+        names = path.split('.')[len(catindex.ancestors(parentid)):]
+        key = (parentid,)
+        for depth, name in enumerate(names):
+            key += (name,)
+            if depth == len(levels):
+                levels.append([])
+            if key not in levels[depth]:
+                levels[depth].append(key)
+
+    catids = {}
+    for level in levels:
+        cats = []
+        for key in level:
+            if len(key) == 2:
+                parentid = key[0]
+            else:
+                parentid = catids[key[:-1]]
+            if not quiet:
+                print "Adding %s with parent %s" % (key[-1], parentid)
+            cats.append((key[-1], parentid))
         try:
-            parentId = proxy.newCategory(c, parentId)
+            newids = proxy.newCategories(cats)
         except ProxyError, err:
-            print "Caught in utils.addCategory:"
-            print err
-            sys.exit()
+            raise UtilsError("In utils.addCategories: %s" % err)
+        catids.update(zip(level, newids))
@@ -0,0 +1,157 @@
+"""xhtml.py
+
+    Parsing of post markup into an element tree and serialization of the tree
+    back into XHTML text.  Both publishing and downloading posts go through the
+    same parsing stage.  etree.tostring can't be used for serializing because
+    certain tags, like the iframe tag, don't render properly in xhtml, so
+    blogtool does its own.
+"""
+import re
+
+# the etree module parseFragment uses, imported the first time it's needed
+_etree = None
+
+# matches any '&' that doesn't start an escape sequence the XML parser knows
+STRAY_AMP_RE = re.compile(u'&(?!(?:amp|gt|lt|quot|apos|#\d+|#x[0-9a-fA-F]+);)')
+
+################################################################################
+"""parseFragment
+
+    Parses a fragment of HTML, like a rendered post or a post downloaded from a
+    blog, and returns the root of the resulting tree.  The fragment is wrapped
+    in a ``post`` element, so the root is always a ``post`` element whose
+    children are the top level elements of the fragment.
+
+    The XML parser chokes on unescaped '&' characters, which are common in
+    code listings and URLs with query strings, so these are escaped first in a
+    single pass over the text.
+"""
+def parseFragment(text):
+    text = STRAY_AMP_RE.sub(u'&amp;', text)
+    return _getEtree().fromstring(u'<post>%s</post>' % text)
+
+# Returns lxml's etree, or ElementTree's if lxml isn't installed.
+def _getEtree():
+    global _etree
+    if _etree is None:
+        try:
+            from lxml import etree
+        except ImportError:
+            import xml.etree.cElementTree as etree
+        _etree = etree
+
+    return _etree
+
+################################################################################
+"""XHTMLSerializer
+
+    Serializes the children of a parsed tree into a single XHTML string.
+
+    Output is written into one list that is joined at the end, and the tree is
+    walked with an explicit stack rather than recursively, so long posts with
+    thousands of elements serialize in linear time.  All non-ASCII characters
+    are written as character references, so the result is plain ASCII.
+
+    ``fixup`` is an optional callable that is passed each element before it
+    is serialized, giving the caller a chance to modify it.
+"""
+class XHTMLSerializer(object):
+
+    SELF_CLOSING = frozenset(("area", "base", "basefont", "br", "col", "frame",
+                              "hr", "img", "input", "isindex", "link", "meta",
+                              "param", "embed"))
+
+    _cdata_table = { ord(u'&') : u'&amp;',
+                     ord(u'<') : u'&lt;',
+                     ord(u'>') : u'&gt;', }
+    _attrib_table = dict(_cdata_table)
+    _attrib_table.update({ ord(u'"')  : u'&quot;',
+                           ord(u'\n') : u'&#10;', })
+
+    def __init__(self, fixup = None):
+        self._fixup = fixup
+
+    ############################################################################
+    """serialize
+
+        Returns the serialized children of ``tree``.  The root element itself
+        is just a container and is not part of the output.
+    """
+    def serialize(self, tree):
+        sink = []
+        for element in tree:
+            self._serializeElement(element, sink)
+
+        return ''.join(sink)
+
+    ############################################################################
+    """_serializeElement
+
+        Writes ``element``, its descendants and its tail into ``sink``.
+    """
+    def _serializeElement(self, element, sink):
+        write = sink.append
+        escape = self._escape
+        cdata_table = self._cdata_table
+
+        stack = []
+        e = element
+        while True:
+            if e is not None:
+                # entering an element- write the start tag and text
+                if self._fixup:
+                    self._fixup(e)
+
+                if not isinstance(e.tag, basestring):
+                    # comments- markup isn't recognized inside of them, so
+                    # there is nothing to escape
+                    write('<!--%s-->' % escape(e.text or '', {}))
+                    if e.tail:
+                        write(escape(e.tail, cdata_table))
+                else:
+                    write('<%s' % e.tag)
+                    for name, value in e.attrib.items():
+                        write(' %s="%s"' % (name,
+                                            escape(value, self._attrib_table)))
+
+                    if e.tag in self.SELF_CLOSING:
+                        write('/>')
+                        if e.tail:
+                            write(escape(e.tail, cdata_table))
+                    else:
+                        write('>')
+                        if e.text:
+                            write(escape(e.text, cdata_table))
+                        stack.append((e, iter(e)))
+
+            if not stack:
+                break
+
+            # move on to the next child of the innermost open element, or close
+            # it if there are no children left
+            parent, children = stack[-1]
+            e = next(children, None)
+            if e is None:
+                stack.pop()
+                write('</%s>' % parent.tag)
+                if parent.tail:
+                    write(escape(parent.tail, cdata_table))
+
+    ############################################################################
+    """_escape
+
+        Escapes markup characters using ``table`` and replaces anything outside
+        of ASCII with a character reference.
+    """
+    @staticmethod
+    def _escape(text, table):
+        if isinstance(text, str):
+            # lxml hands back plain ASCII text as a str, which only needs
+            # escaping if it actually contains a markup character
+            for c in table:
+                if chr(c) in text:
+                    break
+            else:
+                return text
+        return unicode(text).translate(table).encode('ascii',
+                                                     'xmlcharrefreplace')
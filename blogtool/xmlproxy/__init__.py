@@ -1,16 +1,90 @@
-import sys
+import threading
+import time
+
+from proxybase import ProxyError
+
+# The proxy module for each blog type.  Each module provides getInst(url,
+# user, password), which returns a new proxy for the blog type.
+BLOGTYPES = {
+              'wp' : 'wp_proxy',
+            }
+
+# getInst of each blog type's module, looked up the first time it's needed
+_factories = {}
+
+# The first proxy made for each (blogtype, url, user, blogname) and when it
+# was made, and the proxies each thread is using.  Proxies can't be shared
+# between threads, so other threads get a clone of the first proxy, which
+# starts out with whatever it has already fetched.
+_proxies = {}
+_created = {}
+_local = threading.local()
+_lock = threading.Lock()
+# bumped when proxies are dropped, so threads stop using their clones
+_generation = 0
+
+################################################################################
+"""getProxyFactory
+
+    Returns the function that creates proxies for ``blogtype``.  Raises
+    ProxyError if the blog type isn't supported.
+"""
+def getProxyFactory(blogtype):
+    factory = _factories.get(blogtype)
+    if factory is None:
+        if blogtype not in BLOGTYPES:
+            raise ProxyError("getProxy",
+                             "Blogtype '%s' not supported." % blogtype)
+        module = __import__(BLOGTYPES[blogtype], globals(), locals(), [], 1)
+        factory = _factories[blogtype] = module.getInst
+
+    return factory
 
 ################################################################################
 """getProxy
 
-    Returns an instance of the appropriate proxy object based on the blog type.
+    Returns the proxy for the blog ``blogname`` of type ``blogtype`` at
+    ``url``, logged in as ``user``.  The proxy is created the first time it is
+    asked for and handed back again after that, so what it has fetched about
+    the blog is kept for as long as the process runs.
+"""
+def getProxy(blogtype, url, user, password, blogname = None):
+    key = (blogtype, url, user, blogname)
+    if getattr(_local, 'generation', None) != _generation:
+        _local.proxies = {}
+        _local.generation = _generation
+    proxies = _local.proxies
+    proxy = proxies.get(key)
+    if proxy is None:
+        factory = getProxyFactory(blogtype)
+        with _lock:
+            first = _proxies.get(key)
+            if first is None:
+                proxy = _proxies[key] = factory(url, user, password)
+                proxy.setBlogname(blogname)
+                _created[key] = time.time()
+            else:
+                proxy = first.clone()
+        proxies[key] = proxy
+
+    return proxy
+
+################################################################################
+"""dropProxies
+
+    Forgets the proxies made more than ``maxage`` seconds ago, or all of them
+    if ``maxage`` isn't given, so the next getProxy for those blogs makes a
+    new one.  This is how a long running process keeps what its proxies have
+    fetched from going stale.  The connections they used stay in the pool.
 """
-def getProxy(blogtype, url, user, password):
-    module_name = "%s_proxy" % blogtype
-    try:
-        module = __import__(module_name, globals(), locals(), [], 1)
-    except ImportError:
-        print "Blogtype '%s' not supported." % blogtype
-        sys.exit()
-
-    return module.getInst(url, user, password)
+def dropProxies(maxage = None):
+    global _generation
+    now = time.time()
+    with _lock:
+        stale = [ key for key in _proxies
+                      if maxage is None or now - _created[key] > maxage ]
+        for key in stale:
+            del _proxies[key]
+            del _created[key]
+        if stale:
+            _generation += 1
@@ -0,0 +1,1008 @@
+"""asyncproxy.py
+
+    Non-blocking counterparts of the blog proxies, for programs that work
+    with a great many blogs, or a great many posts, at the same time.
+
+    Python 2 has no asyncio, so the event loop is asyncore's.  Every request
+    goes out over its own non-blocking socket, marshalled and unmarshalled by
+    xmlrpclib the same way the blocking proxies do it, and all of them are
+    serviced by a single thread.  The proxy methods return a `Future` for
+    their result rather than the result itself.  Calling a future's `result`
+    runs the event loop until that future is done, so a program only needs
+    to collect the results it wants:
+
+        proxy = getAsyncProxy('wp', url, user, password, blogname)
+        futures = [ proxy.publishPost(post) for post in posts ]
+        postids = gather(futures).result()
+
+    The proxy methods are written as generators that yield the futures they
+    are waiting on, with `coroutine` turning them into functions that return
+    a future.  Code using these proxies can be written the same way.
+"""
+import asyncore
+import cStringIO
+import errno
+import mimetools
+import mimetypes
+import os
+import socket
+import ssl
+import sys
+import time
+import traceback
+import types
+import urllib
+import xmlrpclib
+import zlib
+
+from collections import deque
+
+import data
+import proxybase
+import transport
+import wp_proxy
+
+# the sockets the event loop services, kept apart from asyncore's default map
+socket_map = {}
+
+# the requests that have been sent and not yet answered
+_active = set()
+
+# seconds the event loop waits for something to happen before checking for
+# requests that have timed out
+POLL = 0.5
+
+################################################################################
+"""Future
+
+    The result of an operation that may not have finished yet.  Once it has,
+    `result` returns its value or raises the exception it failed with.
+"""
+class Future(object):
+
+    def __init__(self):
+        self._done = False
+        self._value = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    ############################################################################
+    """result
+
+        Returns the result, running the event loop until there is one.
+    """
+    def result(self):
+        if not self._done:
+            run(self)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+    ############################################################################
+    """exception
+
+        Returns the exception the operation failed with, or None if it
+        succeeded, running the event loop until it is done.
+    """
+    def exception(self):
+        if not self._done:
+            run(self)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    ############################################################################
+    """add_done_callback
+
+        Arranges for ``fn`` to be called with the future once it is done.
+    """
+    def add_done_callback(self, fn):
+        if self._done:
+            self._callback(fn)
+        else:
+            self._callbacks.append(fn)
+
+    def set_result(self, value):
+        if not self._done:
+            self._value = value
+            self._finish()
+
+    # ``exc_info`` is either an exception or the tuple sys.exc_info returns
+    def set_exception(self, exc_info):
+        if not self._done:
+            if not isinstance(exc_info, tuple):
+                exc_info = (exc_info.__class__, exc_info, None)
+            self._exc_info = exc_info
+            self._finish()
+
+    def _finish(self):
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._callback(fn)
+
+    def _callback(self, fn):
+        # a callback is run by whatever completed the future, which knows
+        # nothing about the callback's errors
+        try:
+            fn(self)
+        except Exception:
+            traceback.print_exc()
+
+################################################################################
+"""Return
+
+    Raised by a coroutine to finish with the value ``value``.  Generators
+    can't return values in Python 2.
+"""
+class Return(Exception):
+    def __init__(self, value = None):
+        Exception.__init__(self, value)
+        self.value = value
+
+################################################################################
+"""coroutine
+
+    Decorator that turns a generator function into a function returning a
+    Future.  The generator yields futures, or lists of futures, and gets back
+    their results, or has their exceptions raised in it, once they are done.
+    It finishes by raising Return with its result, or by raising an
+    exception, which the future then fails with.
+"""
+def coroutine(func):
+    def wrapper(*args, **kwargs):
+        future = Future()
+        try:
+            gen = func(*args, **kwargs)
+        except Return, ret:
+            future.set_result(ret.value)
+            return future
+        except Exception:
+            future.set_exception(sys.exc_info())
+            return future
+
+        if isinstance(gen, types.GeneratorType):
+            _Task(gen, future).step()
+        else:
+            future.set_result(gen)
+        return future
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+class _Task(object):
+    # drives a coroutine's generator from one future to the next
+    def __init__(self, gen, future):
+        self._gen = gen
+        self._future = future
+
+    def step(self, value = None, exc_info = None):
+        while True:
+            try:
+                if exc_info is not None:
+                    yielded = self._gen.throw(*exc_info)
+                else:
+                    yielded = self._gen.send(value)
+            except StopIteration:
+                self._future.set_result(None)
+                return
+            except Return, ret:
+                self._future.set_result(ret.value)
+                return
+            except Exception:
+                self._future.set_exception(sys.exc_info())
+                return
+
+            if isinstance(yielded, list):
+                yielded = gather(yielded)
+            if not isinstance(yielded, Future):
+                value, exc_info = None, (TypeError, TypeError(
+                                  "coroutine yielded %r, not a future" % yielded),
+                                  None)
+                continue
+            if not yielded.done():
+                yielded.add_done_callback(self._resume)
+                return
+            value, exc_info = yielded._value, yielded._exc_info
+
+    def _resume(self, future):
+        self.step(future._value, future._exc_info)
+
+################################################################################
+"""gather
+
+    Returns a future for the results of all of ``futures``, in the same
+    order.  It fails with the first exception any of them fails with, unless
+    ``return_exceptions`` is set, in which case exceptions are put in the
+    list of results in place of the results they stand for.
+"""
+def gather(futures, return_exceptions = False):
+    futures = list(futures)
+    future = Future()
+    results = [ None ] * len(futures)
+    remaining = [ len(futures) ]
+    if not futures:
+        future.set_result(results)
+        return future
+
+    def _done(i, f):
+        if f._exc_info is not None:
+            if not return_exceptions:
+                future.set_exception(f._exc_info)
+                return
+            results[i] = f._exc_info[1]
+        else:
+            results[i] = f._value
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            future.set_result(results)
+
+    for i, f in enumerate(futures):
+        f.add_done_callback(lambda f, i = i: _done(i, f))
+    return future
+
+################################################################################
+"""run
+
+    Runs the event loop until ``future`` is done.  Raises RuntimeError if
+    there is nothing left that could finish it.
+"""
+def run(future):
+    while not future.done():
+        if not socket_map:
+            raise RuntimeError("nothing left to run, the future can't finish")
+        asyncore.loop(POLL, True, socket_map, 1)
+        now = time.time()
+        for request in [ r for r in _active if r.deadline < now ]:
+            request.fail(socket.timeout('timed out'))
+
+################################################################################
+"""HostSlots
+
+    Limits how many requests are sent to a host at the same time.  Requests
+    past the limit wait in line for one of the others to finish.
+"""
+class HostSlots(object):
+
+    def __init__(self, maxconns):
+        self.maxconns = maxconns
+        self._busy = 0
+        self._waiting = deque()
+
+    def submit(self, start):
+        if self._busy < self.maxconns:
+            self._busy += 1
+            start()
+        else:
+            self._waiting.append(start)
+
+    def release(self):
+        if self._waiting:
+            self._waiting.popleft()()
+        else:
+            self._busy -= 1
+
+# the HostSlots for each (scheme, host)
+_slots = {}
+# the address of each host, looked up once since the lookup blocks
+_addresses = {}
+
+def _resolve(host, port):
+    if (host, port) not in _addresses:
+        _addresses[(host, port)] = socket.getaddrinfo(host, port, 0,
+                                                      socket.SOCK_STREAM)[0]
+    return _addresses[(host, port)]
+
+################################################################################
+"""HTTPRequest
+
+    Sends a single XMLRPC request over a non-blocking socket and sets
+    ``future`` to the unmarshalled response, or to the xmlrpclib.Fault,
+    xmlrpclib.ProtocolError or socket error the request failed with.  Each
+    request uses a connection of its own that is closed when it is done.
+"""
+class HTTPRequest(asyncore.dispatcher):
+
+    CHUNK = 16 * 1024
+
+    def __init__(self, url, body, future, timeout, use_datetime = 0):
+        asyncore.dispatcher.__init__(self, map = socket_map)
+        self._scheme, self._host, self._handler = transport.splitURL(url)
+        self._body = body
+        self._future = future
+        self._timeout = timeout
+        self._use_datetime = use_datetime
+        self.deadline = None
+
+        self._out = ''
+        self._handshaking = False
+        self._want_write = False
+        self._head = ''
+        self._status = None
+        self._decoder = None
+        self._length = None
+        self._received = 0
+
+    ############################################################################
+    """start
+
+        Connects to the server and starts sending the request.
+    """
+    def start(self):
+        try:
+            t = xmlrpclib.Transport()
+            chost, headers, x509 = t.get_host_info(self._host)
+            host, port = urllib.splitport(chost)
+            if port is None:
+                port = self._scheme == 'https' and 443 or 80
+            self._hostname = host
+
+            lines = [ 'POST %s HTTP/1.0' % self._handler,
+                      'Host: %s' % chost,
+                      'User-Agent: %s' % t.user_agent,
+                      'Content-Type: text/xml',
+                      'Accept-Encoding: gzip',
+                      'Content-Length: %d' % len(self._body) ]
+            lines.extend([ '%s: %s' % h for h in headers or [] ])
+            self._out = '\r\n'.join(lines) + '\r\n\r\n' + self._body
+
+            family, socktype, proto, canonname, address = _resolve(host,
+                                                                   int(port))
+            self.create_socket(family, socktype)
+            self.deadline = time.time() + self._timeout
+            _active.add(self)
+            self.connect(address)
+        except Exception:
+            self.fail(sys.exc_info())
+
+    def handle_connect(self):
+        if self._scheme == 'https':
+            context = ssl.create_default_context()
+            self.socket = context.wrap_socket(self.socket,
+                                              server_hostname = self._hostname,
+                                              do_handshake_on_connect = False)
+            self._handshaking = True
+            self._handshake()
+
+    def _handshake(self):
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLWantReadError:
+            self._want_write = False
+        except ssl.SSLWantWriteError:
+            self._want_write = True
+        else:
+            self._handshaking = False
+            self._want_write = False
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        if self.connecting:
+            return True
+        if self._handshaking:
+            return self._want_write
+        return bool(self._out)
+
+    def handle_write(self):
+        if self._handshaking:
+            self._handshake()
+            return
+        try:
+            sent = self.socket.send(self._out[:self.CHUNK])
+        except ssl.SSLWantWriteError:
+            return
+        except socket.error, err:
+            if err.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                return
+            raise
+        self._out = self._out[sent:]
+
+    def handle_read(self):
+        if self._handshaking:
+            self._handshake()
+            return
+        while True:
+            try:
+                data = self.socket.recv(self.CHUNK)
+            except ssl.SSLWantReadError:
+                return
+            except socket.error, err:
+                if err.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                    return
+                raise
+            if not data:
+                self._finish()
+                return
+            self._feed(data)
+            if self._future.done():
+                return
+            # ssl may be holding decrypted data that select knows nothing of
+            if not isinstance(self.socket, ssl.SSLSocket) or \
+               not self.socket.pending():
+                return
+
+    def handle_close(self):
+        self._finish()
+
+    def handle_error(self):
+        self.fail(sys.exc_info())
+
+    ############################################################################
+    """fail
+
+        Gives up on the request, failing its future with ``exc_info``.  The
+        future is failed even if closing the connection goes wrong, since
+        finishing it is what hands the request's slot on to the next one.
+    """
+    def fail(self, exc_info):
+        try:
+            self._close()
+        finally:
+            self._future.set_exception(exc_info)
+
+    def _close(self):
+        _active.discard(self)
+        # a request that failed before it had a socket, like one to a host
+        # that couldn't be looked up, has nothing to close
+        if self.socket is not None:
+            self.close()
+
+    def _feed(self, data):
+        if self._status is None:
+            self._head += data
+            end = self._head.find('\r\n\r\n')
+            if end < 0:
+                return
+            head, data = self._head[:end], self._head[end + 4:]
+            self._head = ''
+            self._parseHead(head)
+
+        self._received += len(data)
+        if self._status == 200 and data:
+            if self._decoder:
+                data = self._decoder.decompress(data)
+            self._parser.feed(data)
+        if self._length is not None and self._received >= self._length:
+            self._finish()
+
+    def _parseHead(self, head):
+        statusline, sep, rest = head.partition('\r\n')
+        parts = statusline.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise xmlrpclib.ResponseError("bad status line: %r" % statusline)
+        self._status = int(parts[1])
+        self._reason = len(parts) > 2 and parts[2] or ''
+        self._msg = mimetools.Message(cStringIO.StringIO(rest + '\r\n\r\n'))
+
+        length = self._msg.getheader('content-length')
+        if length and length.isdigit():
+            self._length = int(length)
+        if self._status == 200:
+            if self._msg.getheader('content-encoding', '') == 'gzip':
+                # the offset tells zlib to expect a gzip header and trailer
+                self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self._parser, self._unmarshaller = \
+                xmlrpclib.getparser(self._use_datetime)
+
+    def _finish(self):
+        if self._future.done():
+            return
+        self._close()
+        if self._status is None:
+            self._future.set_exception(socket.error(errno.ECONNRESET,
+                                       "connection closed without a response"))
+            return
+        if self._status != 200:
+            self._future.set_exception(xmlrpclib.ProtocolError(
+                                           self._host + self._handler,
+                                           self._status, self._reason,
+                                           self._msg))
+            return
+
+        try:
+            if self._decoder:
+                self._parser.feed(self._decoder.flush())
+            self._parser.close()
+            response = self._unmarshaller.close()
+        except Exception:
+            self._future.set_exception(sys.exc_info())
+            return
+        if len(response) == 1:
+            response = response[0]
+        self._future.set_result(response)
+
+class _Method(object):
+    # builds up dotted method names, like xmlrpclib's _Method
+    def __init__(self, proxy, name):
+        self._proxy = proxy
+        self._name = name
+
+    def __getattr__(self, name):
+        return _Method(self._proxy, "%s.%s" % (self._name, name))
+
+    def __call__(self, *args):
+        return self._proxy._call(self._name, args)
+
+################################################################################
+"""AsyncBlogProxy
+
+    Base class for the non-blocking proxies.  Remote methods are called on
+    it the same way as on xmlrpclib.ServerProxy, eg proxy.wp.getPosts(...),
+    but return a Future rather than waiting for the result.  What is learned
+    about a blog is kept in the same caches the blocking proxies use.
+
+    At most ``maxconns`` requests are sent to a host at the same time, and a
+    request is failed with socket.timeout if it takes more than ``timeout``
+    seconds.
+"""
+class AsyncBlogProxy(proxybase.BlogState, object):
+
+    MAXCONNS = 8
+    TIMEOUT = 60
+
+    def __init__(self, url, user, password, maxconns = None, timeout = None):
+        self._initState(url, user, password)
+        self._timeout = timeout or self.TIMEOUT
+        scheme, host, handler = transport.splitURL(url)
+        self._slots = _slots.setdefault((scheme, host),
+                                        HostSlots(maxconns or self.MAXCONNS))
+        # requests for blog metadata already on their way, so that many
+        # operations started at once share one request for it
+        self._fetching = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _Method(self, name)
+
+    # Sends a call to ``methodname`` with ``params`` and returns its future.
+    def _call(self, methodname, params):
+        future = Future()
+        body = xmlrpclib.dumps(tuple(params), methodname)
+        request = HTTPRequest(self._url, body, future, self._timeout)
+        future.add_done_callback(lambda f: self._slots.release())
+        self._slots.submit(request.start)
+        return future
+
+    # Returns the future for fetching ``kind``, made with ``fetch`` unless
+    # there is already one on its way.
+    def _once(self, kind, fetch):
+        if kind not in self._fetching:
+            future = self._fetching[kind] = fetch()
+            future.add_done_callback(lambda f: self._fetching.pop(kind, None))
+        return self._fetching[kind]
+
+    # Tries the ways of doing ``method`` in ``attempts``, a list of (family,
+    # call) tuples where each call returns a future, the same way
+    # BlogProxy._tryAPIs does.
+    @coroutine
+    def _tryAPIs(self, method, attempts):
+        error = None
+        record = True
+        for family, call in self._orderAPIs(method, attempts):
+            try:
+                result = yield call()
+            except xmlrpclib.Fault, error:
+                if not self._methodMissing(error):
+                    record = False
+                continue
+            except xmlrpclib.ProtocolError, error:
+                raise proxybase.ProxyError("%s.%s" % (self.NAME, method), error)
+            if record:
+                self._recordAPI(method, family)
+            raise Return(result)
+
+        raise proxybase.ProxyError("%s.%s" % (self.NAME, method), error)
+
+    # Returns a future for the results of calling ``method`` with each of
+    # ``args``, each of which is either the result or the ProxyError the
+    # call failed with.
+    @coroutine
+    def _each(self, method, args):
+        results = yield gather([ method(arg) for arg in args ],
+                               return_exceptions = True)
+        for result in results:
+            if isinstance(result, Exception) and \
+               not isinstance(result, proxybase.ProxyError):
+                raise result
+        raise Return(results)
+
+    @coroutine
+    def getCategoryIndex(self):
+        if self._catindex is None:
+            cats = yield self.getCategories()
+            if self._catindex is None:
+                self._catindex = data.CategoryIndex(cats)
+        raise Return(self._catindex)
+
+    def getPosts(self, postids):
+        return self._each(self.getPost, postids)
+
+    def deletePosts(self, postids):
+        return self._each(self.deletePost, postids)
+
+    def publishPosts(self, posts):
+        return self._each(self.publishPost, posts)
+
+    def newCategories(self, cats):
+        return gather([ self.newCategory(name, parent)
+                            for name, parent in cats ])
+
+################################################################################
+"""AsyncWordpressProxy
+
+    The non-blocking counterpart of wp_proxy.WordpressProxy, with the same
+    methods, the same fallbacks to the older APIs and the same results, only
+    each returned as a Future.
+"""
+class AsyncWordpressProxy(AsyncBlogProxy):
+
+    NAME = 'wp'
+    API_METHODS = wp_proxy.WordpressProxy.API_METHODS
+
+    @coroutine
+    def getCategories(self):
+        if self._categories is None:
+            self._categories = self._getMetadata('categories')
+
+        if self._categories is None:
+            blogid = yield self._getBlogID()
+
+            @coroutine
+            def _wp():
+                response = yield self.wp.getTerms(blogid,
+                                                  self._username,
+                                                  self._password,
+                                                  'category',
+                                                  {})
+                raise Return([ wp_proxy.categoryFromTerm(cat)
+                                   for cat in response ])
+
+            def _metaWeblog():
+                return self.metaWeblog.getCategories(blogid,
+                                                     self._username,
+                                                     self._password)
+
+            cats = yield self._once('categories', lambda:
+                              self._tryAPIs('getCategories',
+                                            [ ('wp', _wp),
+                                              ('metaWeblog', _metaWeblog) ]))
+            if self._categories is None:
+                self._categories = cats
+                self._setMetadata('categories', cats)
+
+        raise Return(self._categories)
+
+    @coroutine
+    def newCategory(self, newcat, parent, slug = '', desc = ''):
+        blogid = yield self._getBlogID()
+
+        def _wp():
+            return self.wp.newTerm(blogid,
+                                   self._username,
+                                   self._password,
+                                   wp_proxy.termStruct(newcat, parent, slug,
+                                                       desc))
+
+        def _wpCategory():
+            return self.wp.newCategory(blogid,
+                                       self._username,
+                                       self._password,
+                                       { 'name'        : newcat,
+                                         'slug'        : slug,
+                                         'description' : desc,
+                                         'parent_id'   : parent})
+
+        catid = yield self._tryAPIs('newCategory',
+                                    [ ('wp', _wp),
+                                      ('wpCategory', _wpCategory) ])
+        self._addCategory(newcat, catid, parent, desc)
+        raise Return(catid)
+
+    @coroutine
+    def getRecentTitles(self, number):
+        blogid = yield self._getBlogID()
+
+        @coroutine
+        def _wp():
+            response = yield self.wp.getPosts(blogid,
+                                              self._username,
+                                              self._password,
+                                              wp_proxy.recentFilter(number),
+                                              ['post_id', 'post_title',
+                                               'post_date'])
+            raise Return([ wp_proxy.titleFromPost(postmeta)
+                               for postmeta in response ])
+
+        def _mt():
+            return self.mt.getRecentPostTitles(blogid,
+                                               self._username,
+                                               self._password,
+                                               number)
+
+        result = yield self._tryAPIs('getRecentTitles', [ ('wp', _wp),
+                                                          ('mt', _mt) ])
+        raise Return(result)
+
+    @coroutine
+    def publishPost(self, post):
+        blogid = yield self._getBlogID()
+
+        def _wp():
+            return self.wp.newPost(blogid,
+                                   self._username,
+                                   self._password,
+                                   post.wpStruct)
+
+        def _metaWeblog():
+            return self.metaWeblog.newPost(blogid,
+                                           self._username,
+                                           self._password,
+                                           post.metaweblogStruct,
+                                           post.publish)
+
+        postid = yield self._tryAPIs('publishPost',
+                                     [ ('wp', _wp),
+                                       ('metaWeblog', _metaWeblog) ])
+        raise Return(postid)
+
+    @coroutine
+    def editPost(self, postid, post):
+        blogid = yield self._getBlogID()
+
+        @coroutine
+        def _wp():
+            updated = yield self.wp.editPost(blogid,
+                                             self._username,
+                                             self._password,
+                                             postid,
+                                             post.wpStruct)
+            if not updated:
+                raise proxybase.ProxyError("wp.editPost", "post not updated")
+            raise Return(postid)
+
+        @coroutine
+        def _metaWeblog():
+            yield self.metaWeblog.editPost(postid,
+                                           self._username,
+                                           self._password,
+                                           post.metaweblogStruct,
+                                           post.publish)
+            raise Return(postid)
+
+        result = yield self._tryAPIs('editPost', [ ('wp', _wp),
+                                                   ('metaWeblog', _metaWeblog) ])
+        raise Return(result)
+
+    @coroutine
+    def getPost(self, postid):
+        blogid = yield self._getBlogID()
+
+        @coroutine
+        def _wp():
+            response = yield self.wp.getPost(blogid,
+                                             self._username,
+                                             self._password,
+                                             postid,
+                                             wp_proxy.POST_FIELDS)
+            raise Return(data.Post(response, 'wp'))
+
+        @coroutine
+        def _metaWeblog():
+            response = yield self.metaWeblog.getPost(postid,
+                                                     self._username,
+                                                     self._password)
+            raise Return(data.Post(response, 'metaweblog'))
+
+        post = yield self._tryAPIs('getPost', [ ('wp', _wp),
+                                                ('metaWeblog', _metaWeblog) ])
+        raise Return(post)
+
+    @coroutine
+    def deletePost(self, postid):
+        blogid = yield self._getBlogID()
+
+        def _wp():
+            return self.wp.deletePost(blogid,
+                                      self._username,
+                                      self._password,
+                                      postid)
+
+        def _blogger():
+            return self.blogger.deletePost('',
+                                           postid,
+                                           self._username,
+                                           self._password,
+                                           True)
+
+        result = yield self._tryAPIs('deletePost', [ ('wp', _wp),
+                                                     ('blogger', _blogger) ])
+        raise Return(result)
+
+    # Unlike the blocking proxy, files are always read whole, and a file
+    # whose type can't be worked out is an error rather than the end of the
+    # program.
+    @coroutine
+    def upload(self, filename):
+        if not os.path.isfile(filename):
+            if not filename.startswith('/'):
+                filename = '/' + filename
+            filename = os.path.expanduser('~') + filename
+
+        mimetype, encoding = mimetypes.guess_type(filename)
+        if mimetype is None:
+            raise proxybase.ProxyError("wp.upload",
+                            "can't determine MIME type for %s" % filename)
+        try:
+            f = open(filename, 'rb')
+            try:
+                bits = f.read()
+            finally:
+                f.close()
+        except (IOError, OSError), error:
+            raise proxybase.ProxyError("wp.upload", error)
+
+        blogid = yield self._getBlogID()
+        params = (blogid, self._username, self._password,
+                  { 'type' : mimetype,
+                    'name' : os.path.basename(filename),
+                    'bits' : xmlrpclib.Binary(bits) })
+        result = yield self._tryAPIs('upload',
+                          [ ('wp', lambda: self.wp.uploadFile(*params)),
+                            ('metaWeblog',
+                             lambda: self.metaWeblog.newMediaObject(*params)) ])
+        raise Return(result)
+
+    @coroutine
+    def getMediaLibrary(self):
+        blogid = yield self._getBlogID()
+        items = []
+        while True:
+            page = yield self._check("wp.getMediaLibrary",
+                              self.wp.getMediaLibrary(blogid,
+                                            self._username,
+                                            self._password,
+                                            { 'number' : wp_proxy.WordpressProxy.MEDIA_PAGE,
+                                              'offset' : len(items) }))
+            items.extend(page)
+            if len(page) < wp_proxy.WordpressProxy.MEDIA_PAGE:
+                raise Return(items)
+
+    @coroutine
+    def getComments(self, postid):
+        blogid = yield self._getBlogID()
+        count = yield self._getCommentCount(postid)
+        comments = yield self._check("wp.getComments",
+                              self.wp.getComments(blogid,
+                                                  self._username,
+                                                  self._password,
+                                                  { 'post_id' : postid,
+                                                    'status'  : '',
+                                                    'offset'  : 0,
+                                                    'number'  : count['approved'] }))
+        raise Return(comments)
+
+    @coroutine
+    def newComment(self, postid, comment):
+        blogid = yield self._getBlogID()
+        commentid = yield self._check("wp.newComment",
+                               self.wp.newComment(blogid,
+                                                  self._username,
+                                                  self._password,
+                                                  postid,
+                                                  comment))
+        raise Return(commentid)
+
+    @coroutine
+    def deleteComment(self, commentid):
+        blogid = yield self._getBlogID()
+        status = yield self._check("wp.deleteComment",
+                            self.wp.deleteComment(blogid,
+                                                  self._username,
+                                                  self._password,
+                                                  commentid))
+        raise Return(status)
+
+    @coroutine
+    def editComment(self, commentid, comment):
+        blogid = yield self._getBlogID()
+        status = yield self._check("wp.editComment",
+                            self.wp.editComment(blogid,
+                                                self._username,
+                                                self._password,
+                                                commentid,
+                                                comment))
+        raise Return(status)
+
+    @coroutine
+    def getComment(self, commentid):
+        blogid = yield self._getBlogID()
+        comment = yield self._check("wp.getComment",
+                             self.wp.getComment(blogid,
+                                                self._username,
+                                                self._password,
+                                                commentid))
+        raise Return(comment)
+
+    ##################### START PRIVATE METHODS ################################
+    # Waits for ``future`` and turns the XMLRPC errors it fails with into
+    # ProxyErrors for ``method``.
+    @coroutine
+    def _check(self, method, future):
+        try:
+            result = yield future
+        except (xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
+            raise proxybase.ProxyError(method, error)
+        raise Return(result)
+
+    @coroutine
+    def _getBlogID(self):
+        yield self._getUsersBlogs()
+        blogid = self._findBlogID()
+        # the blog may have been added or renamed since its list was cached
+        if blogid is None and self._uncache('blogs', False):
+            self._blogs = None
+            yield self._getUsersBlogs()
+            blogid = self._findBlogID()
+
+        if blogid is not None:
+            raise Return(blogid)
+
+        raise proxybase.ProxyError("wp._getBlogID",
+                                   'bad name: %s' % self._blogname)
+
+    def _findBlogID(self):
+        for blog in self._blogs:
+            if self._blogname == blog['blogName']:
+                return blog['blogid']
+        return None
+
+    @coroutine
+    def _getUsersBlogs(self):
+        if self._blogs is None:
+            self._blogs = self._getMetadata('blogs', False)
+
+        if self._blogs is None:
+            blogs = yield self._once('blogs', lambda:
+                              self._check('wp._getUsersBlogs',
+                                          self.wp.getUsersBlogs(self._username,
+                                                                self._password)))
+            if self._blogs is None:
+                self._blogs = blogs
+                self._setMetadata('blogs', blogs, False)
+
+    @coroutine
+    def _getCommentCount(self, postid):
+        blogid = yield self._getBlogID()
+        count = yield self._check("wp.getCommentCount",
+                           self.wp.getCommentCount(blogid,
+                                                   self._username,
+                                                   self._password,
+                                                   postid))
+        raise Return(count)
+
+# the non-blocking proxy class for each blog type
+ASYNC_BLOGTYPES = {
+                    'wp' : AsyncWordpressProxy,
+                  }
+
+################################################################################
+"""getAsyncProxy
+
+    Returns a non-blocking proxy for the blog ``blogname`` of type
+    ``blogtype`` at ``url``.  Raises ProxyError for a blog type with no
+    non-blocking proxy.
+"""
+def getAsyncProxy(blogtype, url, user, password, blogname = None, **kwargs):
+    if blogtype not in ASYNC_BLOGTYPES:
+        raise proxybase.ProxyError("getAsyncProxy",
+                                   "blogtype '%s' not supported" % blogtype)
+    proxy = ASYNC_BLOGTYPES[blogtype](url, user, password, **kwargs)
+    proxy.setBlogname(blogname)
+    return proxy
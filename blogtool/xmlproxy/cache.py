@@ -0,0 +1,130 @@
+"""cache.py
+
+    Small persistent caches for what the proxies learn about blogs, kept as
+    JSON files in blogtool's cache directory.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+################################################################################
+"""cacheDir
+
+    Returns the path of the directory blogtool keeps its caches in, creating it
+    if necessary.  The directory is `blogtool` under $XDG_CACHE_HOME, or under
+    ~/.cache if that isn't set.
+
+    ``subdir``:  optional subdirectory of the cache directory to return
+"""
+def cacheDir(subdir = ''):
+    base = os.getenv('XDG_CACHE_HOME') or \
+           os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'blogtool', subdir)
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # lost a race with another process or not writable- either way,
+            # the caller will find out when it tries to use the directory
+            pass
+
+    return path
+
+################################################################################
+"""JSONCache
+
+    A dictionary of JSON values kept in ``filename`` in the cache directory.
+    Each entry expires ``ttl`` seconds after it was set.  The file is read the
+    first time the cache is used and rewritten whenever an entry changes.
+    Problems reading or writing the file aren't errors, they just mean the
+    cache is empty or isn't kept.  Safe to use from several threads at once.
+"""
+class JSONCache(object):
+
+    def __init__(self, filename, ttl):
+        self._filename = filename
+        self.ttl = ttl
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @property
+    def filename(self):
+        if not os.path.isabs(self._filename):
+            self._filename = os.path.join(cacheDir(), self._filename)
+        return self._filename
+
+    ############################################################################
+    """get
+
+        Returns the value for ``key``, or ``default`` if there isn't one or it
+        has expired.  ``maxage`` optionally sets a shorter lifetime than the
+        cache's TTL for this lookup.
+    """
+    def get(self, key, default = None, maxage = None):
+        with self._lock:
+            entry = self._load().get(key)
+        if maxage is None or maxage > self.ttl:
+            maxage = self.ttl
+        if entry is None or time.time() - entry['time'] > maxage:
+            return default
+        return entry['value']
+
+    ############################################################################
+    """set
+
+        Sets the value for ``key``.
+    """
+    def set(self, key, value):
+        with self._lock:
+            entries = self._load()
+            entries[key] = { 'time' : time.time(), 'value' : value }
+            self._save(entries)
+
+    ############################################################################
+    """delete
+
+        Removes the entries whose keys start with ``prefix``.
+    """
+    def delete(self, prefix = ''):
+        with self._lock:
+            entries = self._load()
+            for key in [ k for k in entries if k.startswith(prefix) ]:
+                del entries[key]
+            self._save(entries)
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                f = open(self.filename, 'r')
+                try:
+                    self._entries = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, ValueError):
+                self._entries = {}
+            if not isinstance(self._entries, dict):
+                self._entries = {}
+            # drop anything expired so the file doesn't grow forever
+            now = time.time()
+            for key, entry in self._entries.items():
+                try:
+                    if now - entry['time'] > self.ttl:
+                        del self._entries[key]
+                except (TypeError, KeyError):
+                    del self._entries[key]
+
+        return self._entries
+
+    def _save(self, entries):
+        try:
+            fd, tmpname = tempfile.mkstemp(dir = os.path.dirname(self.filename))
+            f = os.fdopen(fd, 'w')
+            try:
+                json.dump(entries, f)
+            finally:
+                f.close()
+            os.rename(tmpname, self.filename)
+        except (IOError, OSError):
+            pass
@@ -297,3 +297,153 @@ class Post(object):
                  'wp'         : wp,
                  'metaweblog' : metaweblog, }[self._type]()
  
+
+################################################################################
+"""CategoryIndex
+
+    Index over a blog's category list, as returned by a proxy's getCategories
+    method.  Categories are looked up by ID and by (parent ID, name), which
+    makes resolving a dotted category path like 'cat.subcat' or the chain of
+    ancestors of a category cost one lookup per level, no matter how many
+    categories the blog has.
+
+    The category structures themselves are the dicts from the category list,
+    with 'categoryId' and 'parentId' as strings.  A parent ID of '0' means the
+    category is a top level category.
+"""
+class CategoryIndex(object):
+
+    ROOT = '0'
+
+    def __init__(self, categories = ()):
+        self._byid = {}
+        self._bypath = {}
+        self._byname = {}
+        self._children = { self.ROOT : [] }
+        for cat in categories:
+            self.add(cat)
+
+    def __len__(self):
+        return len(self._byid)
+
+    def __iter__(self):
+        return iter(self._byid.values())
+
+    ############################################################################
+    """add
+
+        Adds the category structure ``cat`` to the index.
+    """
+    def add(self, cat):
+        catid = str(cat['categoryId'])
+        parentid = str(cat['parentId'])
+        if catid in self._byid:
+            return
+        self._byid[catid] = cat
+        self._bypath[(parentid, cat['categoryName'])] = cat
+        self._byname.setdefault(cat['categoryName'], []).append(cat)
+        self._children.setdefault(parentid, []).append(catid)
+
+    ############################################################################
+    """get
+
+        Returns the category with ID ``catid`` or None.
+    """
+    def get(self, catid):
+        return self._byid.get(str(catid))
+
+    ############################################################################
+    """child
+
+        Returns the category named ``name`` whose parent has ID ``parentid``, or
+        None.
+    """
+    def child(self, parentid, name):
+        return self._bypath.get((str(parentid), name))
+
+    ############################################################################
+    """named
+
+        Returns all of the categories named ``name``.  Category names are only
+        unique among siblings, so there may be several.
+    """
+    def named(self, name):
+        return list(self._byname.get(name, ()))
+
+    ############################################################################
+    """resolve
+
+        Resolves the dotted category path ``path`` one level at a time.
+        Returns None if every level is on the blog, otherwise a tuple of the
+        name of the first level that isn't and the ID of its parent.
+    """
+    def resolve(self, path):
+        parentid = self.ROOT
+        for name in path.split('.'):
+            cat = self.child(parentid, name)
+            if cat is None:
+                return (name, parentid)
+            parentid = str(cat['categoryId'])
+
+        return None
+
+    ############################################################################
+    """ancestors
+
+        Returns the categories from the top level category down to the one with
+        ID ``catid``, inclusive.
+    """
+    def ancestors(self, catid):
+        chain = []
+        cat = self.get(catid)
+        while cat is not None:
+            chain.append(cat)
+            parentid = str(cat['parentId'])
+            if parentid == self.ROOT or len(chain) > len(self._byid):
+                # the length check guards against a corrupted parent loop
+                break
+            cat = self.get(parentid)
+        chain.reverse()
+        return chain
+
+    ############################################################################
+    """path
+
+        Returns the dotted path of the category with ID ``catid``.
+    """
+    def path(self, catid):
+        return '.'.join([ c['categoryName'] for c in self.ancestors(catid) ])
+
+    ############################################################################
+    """children
+
+        Returns the categories whose parent has ID ``parentid``.
+    """
+    def children(self, parentid = ROOT):
+        return [ self._byid[c] for c in self._children.get(str(parentid), []) ]
+
+    ############################################################################
+    """walk
+
+        Generates (depth, category) for every category, depth first, so every
+        category comes right after its parent and siblings are in the order
+        they were added.  Categories whose parent isn't on the blog are treated
+        as top level categories.
+    """
+    def walk(self):
+        orphans = [ c for c in self._children if c != self.ROOT and
+                                                 c not in self._byid ]
+        roots = list(self._children[self.ROOT])
+        for parentid in orphans:
+            roots.extend(self._children[parentid])
+
+        seen = set()
+        stack = [ (0, c) for c in reversed(roots) ]
+        while stack:
+            depth, catid = stack.pop()
+            if catid in seen:
+                continue
+            seen.add(catid)
+            yield depth, self._byid[catid]
+            stack.extend([ (depth + 1, c) for c in
+                                 reversed(self._children.get(catid, [])) ])
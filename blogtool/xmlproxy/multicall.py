@@ -0,0 +1,189 @@
+"""multicall.py
+
+    Batching of XMLRPC calls with system.multicall.  Calls made through a
+    `Batch` are queued rather than sent, and go to the server several at a
+    time in a single system.multicall request.  Each call returns a
+    `CallFuture` that holds its result once the batch has been sent.
+"""
+import xmlrpclib
+
+# what goes around the marshalled calls in a system.multicall request, the
+# same as xmlrpclib.dumps would put there
+MULTICALL_HEAD = ("<?xml version='1.0'?>\n"
+                  "<methodCall>\n"
+                  "<methodName>system.multicall</methodName>\n"
+                  "<params>\n<param>\n<value><array><data>\n")
+MULTICALL_TAIL = ("</data></array></value>\n</param>\n</params>\n"
+                  "</methodCall>\n")
+
+################################################################################
+"""marshalCall
+
+    Returns the call to ``methodname`` with ``params`` marshalled as the
+    <value> that stands for it in a system.multicall request.
+"""
+def marshalCall(methodname, params):
+    m = xmlrpclib.Marshaller('utf-8')
+    out = m.dumps(({ 'methodName' : methodname, 'params' : list(params) }, ))
+    # drop the <params><param> that dumps puts around the value
+    return out[len('<params>\n<param>\n'):-len('</param>\n</params>\n')]
+
+################################################################################
+"""CallFuture
+
+    The result of a call queued in a `Batch`.  `result` returns the value the
+    server returned for the call, or raises the xmlrpclib.Fault or
+    xmlrpclib.ProtocolError it failed with, just as calling the method
+    directly would.
+"""
+class CallFuture(object):
+
+    def __init__(self, batch, methodname):
+        self._batch = batch
+        self.methodname = methodname
+        self._done = False
+        self._value = None
+        self._error = None
+
+    def done(self):
+        return self._done
+
+    ############################################################################
+    """result
+
+        Returns the result of the call, sending the batch first if the call
+        hasn't been sent yet.
+    """
+    def result(self):
+        if not self._done:
+            self._batch.flush()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def _setResult(self, value):
+        self._value = value
+        self._done = True
+
+    def _setError(self, error):
+        self._error = error
+        self._done = True
+
+class _Method(object):
+    # builds up dotted method names, like xmlrpclib's _Method
+    def __init__(self, batch, name):
+        self._batch = batch
+        self._name = name
+
+    def __getattr__(self, name):
+        return _Method(self._batch, "%s.%s" % (self._name, name))
+
+    def __call__(self, *args):
+        return self._batch.queue(self._name, args)
+
+################################################################################
+"""Batch
+
+    Queues XMLRPC calls for ``proxy`` and sends them with system.multicall.
+    Methods are called on a batch the same way as on the proxy itself, eg
+
+        with proxy.batch() as batch:
+            futures = [ batch.wp.deletePost(blogid, user, pw, postid)
+                            for postid in postids ]
+        results = [ f.result() for f in futures ]
+
+    The queue is sent when ``maxcalls`` calls have been queued or the queued
+    calls would make a request of more than ``maxbytes`` bytes, when `flush` is
+    called, or at the end of a ``with`` block.  If the server doesn't support
+    system.multicall, the calls are sent one at a time instead.
+"""
+class Batch(object):
+
+    MAXCALLS = 50
+    MAXBYTES = 512 * 1024
+
+    def __init__(self, proxy, maxcalls = None, maxbytes = None):
+        self._proxy = proxy
+        self.maxcalls = maxcalls or self.MAXCALLS
+        self.maxbytes = maxbytes or self.MAXBYTES
+        self._queue = []
+        self._size = 0
+        self._multicall = True
+
+    def __getattr__(self, name):
+        return _Method(self, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        return False
+
+    ############################################################################
+    """queue
+
+        Queues a call to ``methodname`` with ``params`` and returns its future.
+    """
+    def queue(self, methodname, params):
+        future = CallFuture(self, methodname)
+        # marshalled once here, both to know what it adds to the size of the
+        # request and to go in the request as it is
+        call = marshalCall(methodname, params)
+        if self._queue and (len(self._queue) >= self.maxcalls or
+                            self._size + len(call) > self.maxbytes):
+            self.flush()
+        self._queue.append((methodname, params, future, call))
+        self._size += len(call)
+        return future
+
+    ############################################################################
+    """flush
+
+        Sends all of the queued calls.
+    """
+    def flush(self):
+        calls, self._queue, self._size = self._queue, [], 0
+        if not calls:
+            return
+
+        if self._multicall and len(calls) > 1:
+            request = MULTICALL_HEAD + \
+                      ''.join([ c[3] for c in calls ]) + MULTICALL_TAIL
+            try:
+                results = self._proxy._sendRequest(request)
+            except xmlrpclib.Fault:
+                # no system.multicall on this server, don't try it again
+                self._multicall = False
+            except xmlrpclib.ProtocolError, error:
+                for methodname, params, future, call in calls:
+                    future._setError(error)
+                return
+            else:
+                self._dispatch(calls, results)
+                return
+
+        for methodname, params, future, call in calls:
+            try:
+                future._setResult(getattr(self._proxy, methodname)(*params))
+            except (xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
+                future._setError(error)
+
+    # Hands each call its own result.  A successful call's result comes back
+    # wrapped in a single element list, a failed call's as a fault struct.
+    def _dispatch(self, calls, results):
+        for i, (methodname, params, future, call) in enumerate(calls):
+            if i >= len(results):
+                future._setError(xmlrpclib.Fault(-32700,
+                                     "no result from system.multicall"))
+                continue
+            result = results[i]
+            if isinstance(result, dict):
+                future._setError(xmlrpclib.Fault(result.get('faultCode'),
+                                                 result.get('faultString')))
+            elif isinstance(result, list) and len(result) == 1:
+                future._setResult(result[0])
+            else:
+                future._setError(xmlrpclib.Fault(-32700,
+                                     "unexpected multicall result: %r" % result))
@@ -3,6 +3,13 @@ does not actually contain any functional code- well, other than the exception
 class.'''
 
 import xmlrpclib
+import os
+import time
+
+import transport
+import data
+import multicall
+import cache
 
 ################################################################################
 """ProxyError
@@ -17,23 +24,42 @@ class ProxyError(Exception):
         return self.message
 
 ################################################################################
-"""BlogProxy
+"""BlogState
 
-    Defines a baseclass for blogproxy objects.  It, in turn, uses the
-    xmlrpclib.ServerProxy as a baseclass.
- 
-    The actual objects should implement the following methods in order to work i
-    with blogtool.
+    What a proxy knows about its blog, and the caches shared by all proxies
+    of what has been learned about blogs and their endpoints.  Kept apart
+    from `BlogProxy` so that proxies that don't make their calls through
+    xmlrpclib.ServerProxy can share it.
 """
-class BlogProxy(xmlrpclib.ServerProxy):
-    def __init__(self, url, user, password):
-        # for debugging info related to xmlrpc, add "verbose=True" to the 
-        # __init__ argument list.
-        xmlrpclib.ServerProxy.__init__(self, url)
+class BlogState:
+
+    # prefix of the method names in error messages
+    NAME = 'proxy'
+
+    # fault code for a method the server doesn't have
+    METHOD_NOT_FOUND = -32601
+
+    # Which API family worked for each method on each endpoint, so the ones
+    # that don't work there aren't tried first every time.
+    capabilities = cache.JSONCache('capabilities.json', 7 * 24 * 60 * 60)
+
+    # What has been fetched about each blog, like its ID and categories, so
+    # it isn't fetched again on every run.
+    metadata = cache.JSONCache('metadata.json', 24 * 60 * 60)
+    # anything in the metadata cache from before this time is ignored
+    _refreshed = 0
+
+    def _initState(self, url, user, password):
+        self._url = url
         self._username = user
         self._password = password
+        self._blogname = None
         self._blogs = None
         self._categories = None
+        self._catindex = None
+        # the kinds of metadata that were read from the cache rather than
+        # fetched from the blog
+        self._cached = set()
 
     # this is just the minimal implementation, it's would be better to check the
     # name for validity and raise an exception if it isn't a valid name for the
@@ -41,6 +67,207 @@ class BlogProxy(xmlrpclib.ServerProxy):
     def setBlogname(self, blogname):
         self._blogname = blogname
 
+    # Returns a data.CategoryIndex over the blog's categories.  It is built
+    # once from getCategories and kept up to date as categories are added.
+    def getCategoryIndex(self):
+        if self._catindex is None:
+            self._catindex = data.CategoryIndex(self.getCategories())
+        return self._catindex
+
+    # Forgets the blog's categories if they were read from the cache, so the
+    # next getCategoryIndex fetches them from the blog.  Returns whether they
+    # were forgotten.  A category missing from cached categories may just
+    # have been added to the blog since they were cached.
+    def reloadCategories(self):
+        if not self._uncache('categories'):
+            return False
+        self._categories = None
+        self._catindex = None
+        return True
+
+    # Records a category that was just added to the blog, so the cached
+    # category list and index don't go stale.  Implementations should call
+    # this when newCategory succeeds.
+    def _addCategory(self, name, catid, parentid, desc = ''):
+        cat = { 'categoryName'        : name,
+                'parentId'            : str(parentid),
+                'categoryId'          : str(catid),
+                'categoryDescription' : desc, }
+        if self._categories is not None:
+            self._categories.append(cat)
+        if self._catindex is not None:
+            self._catindex.add(cat)
+        self._dropMetadata('categories')
+
+    # Sets how many seconds fetched blog metadata is kept for.
+    @classmethod
+    def setMetadataTTL(cls, ttl):
+        cls.metadata.ttl = ttl
+
+    # Ignores the metadata cached so far, so everything is fetched again.
+    @classmethod
+    def refreshMetadata(cls):
+        BlogState._refreshed = time.time()
+
+    def _metaKey(self, kind, perblog):
+        if perblog:
+            return u'%s|%s|%s|%s' % (self._url, self._username, self._blogname,
+                                     kind)
+        return u'%s|%s|%s' % (self._url, self._username, kind)
+
+    # Returns the cached ``kind`` of metadata for the blog, or for the user at
+    # the endpoint if not ``perblog``, or None if nothing usable is cached.
+    def _getMetadata(self, kind, perblog = True):
+        maxage = None
+        if self._refreshed:
+            maxage = time.time() - self._refreshed
+        value = self.metadata.get(self._metaKey(kind, perblog), None, maxage)
+        if value is not None:
+            self._cached.add(kind)
+        return value
+
+    def _setMetadata(self, kind, value, perblog = True):
+        self._cached.discard(kind)
+        self.metadata.set(self._metaKey(kind, perblog), value)
+
+    # Drops the ``kind`` of metadata from the cache if that is where it was
+    # read from, so it is fetched from the blog next time.  Returns whether it
+    # was dropped.
+    def _uncache(self, kind, perblog = True):
+        if kind not in self._cached:
+            return False
+        self._cached.discard(kind)
+        self._dropMetadata(kind, perblog)
+        return True
+
+    def _dropMetadata(self, kind, perblog = True):
+        self.metadata.delete(self._metaKey(kind, perblog))
+
+    # Returns the API family recorded as working for ``method`` on this
+    # blog's endpoint, or None if nothing is recorded.
+    def _preferredAPI(self, method):
+        return self.capabilities.get('%s|%s' % (self._url, method))
+
+    # Records ``family`` as the API family that works for ``method`` on this
+    # blog's endpoint.
+    def _recordAPI(self, method, family):
+        if self._preferredAPI(method) != family:
+            self.capabilities.set('%s|%s' % (self._url, method), family)
+
+    # Returns ``attempts``, a list of (family, call) tuples in order of
+    # preference, with the family that last worked for ``method`` on this
+    # blog's endpoint moved to the front.
+    def _orderAPIs(self, method, attempts):
+        preferred = self._preferredAPI(method)
+        return sorted(attempts, key = lambda a: a[0] != preferred)
+
+    # Whether ``fault`` says the method called isn't on the server at all,
+    # rather than that the call itself was refused.
+    def _methodMissing(self, fault):
+        return fault.faultCode == self.METHOD_NOT_FOUND or \
+               'does not exist' in str(fault.faultString)
+
+################################################################################
+"""BlogProxy
+
+    Defines a baseclass for blogproxy objects.  It, in turn, uses the
+    xmlrpclib.ServerProxy as a baseclass.
+ 
+    The actual objects should implement the following methods in order to work i
+    with blogtool.
+"""
+class BlogProxy(BlogState, xmlrpclib.ServerProxy):
+
+    def __init__(self, url, user, password):
+        # for debugging info related to xmlrpc, add "verbose=True" to the 
+        # __init__ argument list.
+        self._transport = transport.getTransport(url)
+        xmlrpclib.ServerProxy.__init__(self, url, self._transport)
+        self._initState(url, user, password)
+        if self._preferredAPI('gzipRequests'):
+            self._transport.enableGzip(
+                lambda: self._recordAPI('gzipRequests', False))
+
+    # A proxy can't be used by more than one thread at a time since the
+    # underlying transport holds a single connection.  This returns a new proxy
+    # for the same blog that shares what has been fetched so far, so it can be
+    # handed to another thread.
+    def clone(self):
+        proxy = self.__class__(self._url, self._username, self._password)
+        proxy._blogname = self._blogname
+        proxy._blogs = self._blogs
+        proxy._categories = self._categories
+        proxy._catindex = self._catindex
+        proxy._cached = set(self._cached)
+        return proxy
+
+    # Tries the ways of doing ``method`` in ``attempts``, a list of (family,
+    # call) tuples in order of preference, until one of them doesn't fault.
+    # The family that last worked on this endpoint is tried first, and the one
+    # that works is recorded, unless one before it faulted for some reason
+    # other than its method being missing- a call refused for its arguments
+    # or permissions says nothing about which API the endpoint has.  Returns
+    # what the working call returned.
+    def _tryAPIs(self, method, attempts):
+        error = None
+        record = True
+        for family, call in self._orderAPIs(method, attempts):
+            try:
+                result = call()
+            except xmlrpclib.Fault, error:
+                if not self._methodMissing(error):
+                    record = False
+                continue
+            except xmlrpclib.ProtocolError, error:
+                raise ProxyError("%s.%s" % (self.NAME, method), error)
+            if record:
+                self._recordAPI(method, family)
+            return result
+
+        raise ProxyError("%s.%s" % (self.NAME, method), error)
+
+    # Returns a multicall.Batch for queuing calls to the blog that are then
+    # sent several at a time with system.multicall.
+    def batch(self, maxcalls = None, maxbytes = None):
+        return multicall.Batch(self, maxcalls, maxbytes)
+
+    # Sends ``request``, a call that has already been marshalled, and returns
+    # its result the same way calling the method through the proxy would.
+    def _sendRequest(self, request):
+        scheme, host, handler = transport.splitURL(self._url)
+        response = self._transport.request(host, handler, request)
+        if len(response) == 1:
+            response = response[0]
+        return response
+
+    # Calls ``methodname`` with ``params`` and generates the items of the
+    # array it returns as they arrive, rather than waiting for the whole
+    # response.  Faults are raised when the response is read, so they come
+    # from the first next() on the generator rather than from this call.
+    def _iterCall(self, methodname, *params):
+        scheme, host, handler = transport.splitURL(self._url)
+        request = xmlrpclib.dumps(params, methodname)
+        return self._transport.iterRequest(host, handler, request)
+
+    # Calls ``methodname`` with ``params``, one of which must be the value
+    # transport.STREAM_MARKER.  It is replaced by the base64 encoded contents of
+    # ``filename``, which is read as the request is sent rather than being
+    # loaded into memory.
+    def _streamFile(self, methodname, params, filename):
+        scheme, host, handler = transport.splitURL(self._url)
+        head, tail = transport.buildStreamEnvelope(methodname, params)
+        f = open(filename, 'rb')
+        try:
+            response = self._transport.streamRequest(host, handler, head, f,
+                                                     os.fstat(f.fileno()).st_size,
+                                                     tail)
+        finally:
+            f.close()
+
+        if len(response) == 1:
+            response = response[0]
+        return response
+
     # The following methods should all be overridden by the blog specific
     # implementation of the api
 
@@ -50,9 +277,20 @@ class BlogProxy(xmlrpclib.ServerProxy):
     def newCategory(self, newcat, parent, slug='', desc=''):
         pass
 
+    # Adds several categories, given as (name, parentid) tuples, and returns
+    # their IDs in the same order.  Implementations that can add them all in
+    # one request should override this.
+    def newCategories(self, cats):
+        return [ self.newCategory(name, parent) for name, parent in cats ]
+
     def getRecentTitles(self, number):
         pass
 
+    # Generates the same items as getRecentTitles, one at a time as they
+    # arrive if the implementation can.
+    def iterRecentTitles(self, number):
+        return iter(self.getRecentTitles(number))
+
     def publishPost(self, post):
         pass
 
@@ -65,9 +303,34 @@ class BlogProxy(xmlrpclib.ServerProxy):
     def deletePost(self, postid):
         pass
 
+    # Deletes several posts and returns a list with, for each post, the result
+    # of deleting it or the ProxyError it failed with.
+    def deletePosts(self, postids):
+        return self._each(self.deletePost, postids)
+
+    # Fetches several posts and returns a list with, for each post, the post
+    # or the ProxyError fetching it failed with.
+    def getPosts(self, postids):
+        return self._each(self.getPost, postids)
+
+    def _each(self, method, args):
+        results = []
+        for arg in args:
+            try:
+                results.append(method(arg))
+            except ProxyError, err:
+                results.append(err)
+        return results
+
     def upload(self, filename):
         pass
 
+    def getMediaLibrary(self):
+        pass
+
+    def probe(self):
+        pass
+
     def getComments(self, postid):
         pass
 
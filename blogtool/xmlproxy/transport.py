@@ -0,0 +1,512 @@
+"""transport.py
+
+    XMLRPC transports used by the blog proxies.  On top of what the standard
+    xmlrpclib transports do, these can send a request whose body is generated
+    while it is being sent, which allows large files to be uploaded without
+    holding the whole encoded file in memory.
+
+    Connections are kept alive between requests in a pool shared by every
+    transport in the process, so all the proxies for blogs on the same host
+    reuse the same few connections rather than each setting up its own.
+
+    Responses are requested gzip compressed and are decompressed as they are
+    read.  Requests can be gzip compressed too, for servers known to accept
+    that.
+"""
+import xmlrpclib
+import base64
+import errno
+import httplib
+import socket
+import threading
+import time
+import urllib
+import zlib
+
+import unmarshal
+
+# Placeholder value marking where the contents of a streamed file go in the
+# parameters of a streamed request.
+STREAM_MARKER = '@@blogtool-stream@@'
+
+# socket errors that mean the server closed the connection before the request
+# got to it, the same ones xmlrpclib retries on
+STALE_ERRNOS = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+
+################################################################################
+"""ConnectionPool
+
+    Idle keep-alive HTTP connections, kept per (scheme, host).  At most
+    ``maxsize`` idle connections are kept for a host, and connections that
+    have been idle for more than ``idle`` seconds are closed rather than
+    reused, since the server has most likely given up on them by then.  The
+    default is kept below the 5 second keep-alive timeout Apache uses out of
+    the box.  Safe to use from several threads at once.
+"""
+class ConnectionPool(object):
+
+    MAXSIZE = 4
+    IDLE = 4
+
+    def __init__(self, maxsize = MAXSIZE, idle = IDLE):
+        self.maxsize = maxsize
+        self.idle = idle
+        self._conns = {}
+        self._lock = threading.Lock()
+
+    ############################################################################
+    """acquire
+
+        Returns an idle connection to ``key`` or None if there isn't one.
+    """
+    def acquire(self, key):
+        stale = []
+        conn = None
+        with self._lock:
+            conns = self._conns.get(key, [])
+            now = time.time()
+            while conns:
+                c, released = conns.pop()
+                if now - released > self.idle:
+                    stale.append(c)
+                else:
+                    conn = c
+                    break
+            # anything older than a stale connection is stale as well
+            stale.extend([ c for c, released in conns
+                                 if now - released > self.idle ])
+            conns[:] = [ (c, r) for c, r in conns if now - r <= self.idle ]
+
+        for c in stale:
+            c.close()
+        return conn
+
+    ############################################################################
+    """release
+
+        Returns ``conn``, a connection to ``key`` that is done with a request,
+        to the pool.
+    """
+    def release(self, key, conn):
+        with self._lock:
+            conns = self._conns.setdefault(key, [])
+            if len(conns) < self.maxsize:
+                conns.append((conn, time.time()))
+                return
+        conn.close()
+
+    ############################################################################
+    """discard
+
+        Closes all of the idle connections to ``key``.
+    """
+    def discard(self, key):
+        with self._lock:
+            conns = self._conns.pop(key, [])
+        for c, released in conns:
+            c.close()
+
+    ############################################################################
+    """clear
+
+        Closes all of the idle connections.
+    """
+    def clear(self):
+        with self._lock:
+            conns, self._conns = self._conns, {}
+        for hostconns in conns.values():
+            for c, released in hostconns:
+                c.close()
+
+# the pool shared by all of the transports
+pool = ConnectionPool()
+
+################################################################################
+"""configurePool
+
+    Sets the most idle connections kept per host and how many seconds an idle
+    connection is kept for.
+"""
+def configurePool(maxsize = None, idle = None):
+    if maxsize is not None:
+        pool.maxsize = maxsize
+    if idle is not None:
+        pool.idle = idle
+
+################################################################################
+"""PooledMixin
+
+    Makes an xmlrpclib transport take its connections from the shared pool and
+    put them back when a request is done, instead of keeping one connection
+    of its own.
+
+    If a request fails on a pooled connection in a way that means the server
+    had closed it, the other idle connections to the host are most likely
+    closed as well, so they are all dropped and the request is sent again on
+    a fresh connection.  A connection whose request failed with an error
+    status is closed rather than pooled, since the body of the error response
+    may not have been read.
+"""
+class PooledMixin:
+
+    # whether the connection make_connection last returned came from the pool
+    _reused = False
+
+    def make_connection(self, host):
+        chost, extra_headers, x509 = self.get_host_info(host)
+        conn = pool.acquire((self.SCHEME, chost))
+        if conn is None:
+            self._reused = False
+            self._connection = (None, None)
+            return self._base.make_connection(self, host)
+
+        self._reused = True
+        self._extra_headers = extra_headers
+        self._connection = host, conn
+        return conn
+
+    def single_request(self, host, handler, request_body, verbose = 0):
+        return self._pooledRequest(host, lambda: self._base.single_request(
+                                       self, host, handler, request_body,
+                                       verbose))
+
+    def streamRequest(self, host, handler, head, fileobj, size, tail,
+                      verbose = 0):
+        start = fileobj.tell()
+        def _send():
+            fileobj.seek(start)
+            return StreamingMixin.streamRequest(self, host, handler, head,
+                                                fileobj, size, tail, verbose)
+
+        return self._pooledRequest(host, _send)
+
+    # Makes a request with ``send`` and hands its connection back to the pool
+    # afterwards, sending it again on a fresh connection if the pooled one
+    # had gone stale.
+    def _pooledRequest(self, host, send):
+        try:
+            try:
+                return send()
+            except (socket.error, httplib.BadStatusLine), err:
+                if not self._isStale(err):
+                    raise
+            pool.discard((self.SCHEME, self.get_host_info(host)[0]))
+            return send()
+        except xmlrpclib.ProtocolError:
+            self.close()
+            raise
+        finally:
+            self._release()
+
+    # Whether ``err`` from the last request means its connection came from
+    # the pool and had been closed by the server.
+    def _isStale(self, err):
+        return self._reused and _closedByServer(err)
+
+    # Hands the connection used by the last request back to the pool.  If the
+    # request failed, xmlrpclib has already closed it and there is nothing to
+    # hand back.
+    def _release(self):
+        host, conn = self._connection
+        if conn is not None:
+            self._connection = (None, None)
+            pool.release((self.SCHEME, self.get_host_info(host)[0]), conn)
+
+################################################################################
+"""GzipMixin
+
+    Decompresses gzip compressed responses a chunk at a time as they are fed
+    to the parser, rather than reading the whole compressed response into
+    memory first the way xmlrpclib does.
+
+    Requests larger than GZIP_THRESHOLD are compressed once `enableGzip` has
+    been called.  Servers that can't handle a compressed request generally
+    can't parse it, so if one is refused with an XML parse error or a 400,
+    411 or 415 status, compression is turned off again, ``rejected`` is
+    called, and the request is sent again uncompressed.  Those failures mean
+    the request was never carried out, so sending it again is safe.
+
+    `iterRequest` reads a response the same way but parses it with
+    unmarshal.ItemParser, handing back the items of an array as they arrive.
+"""
+class GzipMixin:
+
+    GZIP_THRESHOLD = 1024
+    CHUNK = 16 * 1024
+
+    # fault code for a request the server couldn't parse
+    PARSE_ERROR = -32700
+    REJECTED_STATUS = (400, 411, 415)
+
+    _gzip_rejected = None
+
+    ############################################################################
+    """enableGzip
+
+        Turns on compression of requests.  ``rejected`` is an optional
+        callable that is called if the server turns out not to accept
+        compressed requests.
+    """
+    def enableGzip(self, rejected = None):
+        self.encode_threshold = self.GZIP_THRESHOLD
+        self._gzip_rejected = rejected
+
+    def request(self, host, handler, request_body, verbose = 0):
+        if self.encode_threshold is None or \
+           len(request_body) <= self.encode_threshold:
+            return self._base.request(self, host, handler, request_body,
+                                      verbose)
+
+        try:
+            return self._base.request(self, host, handler, request_body,
+                                      verbose)
+        except xmlrpclib.ProtocolError, err:
+            if err.errcode not in self.REJECTED_STATUS:
+                raise
+        except xmlrpclib.Fault, fault:
+            if fault.faultCode != self.PARSE_ERROR:
+                raise
+
+        self.encode_threshold = None
+        if self._gzip_rejected:
+            self._gzip_rejected()
+        return self._base.request(self, host, handler, request_body, verbose)
+
+    def parse_response(self, response):
+        if not hasattr(response, 'getheader') or \
+           response.getheader("Content-Encoding", "") != "gzip":
+            return self._base.parse_response(self, response)
+
+        p, u = self.getparser()
+        for data in self._readBody(response):
+            if self.verbose:
+                print "body:", repr(data)
+            p.feed(data)
+        p.close()
+
+        return u.close()
+
+    # Generates the body of ``response`` a chunk at a time, decompressed if
+    # it is gzip compressed.
+    def _readBody(self, response):
+        if response.getheader("Content-Encoding", "") == "gzip":
+            # the offset tells zlib to expect a gzip header and trailer
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            decoder = None
+
+        try:
+            while True:
+                data = response.read(self.CHUNK)
+                if not data:
+                    break
+                if decoder:
+                    data = decoder.decompress(data)
+                yield data
+            if decoder:
+                yield decoder.flush()
+        except zlib.error, err:
+            raise ValueError("invalid gzip response data: %s" % err)
+
+    ############################################################################
+    """iterRequest
+
+        Sends an XMLRPC request and generates the items of the array it
+        returns one at a time as they are read from the connection, so a huge
+        response never has to be held in memory.  A response that isn't an
+        array generates its value as the one and only item.
+    """
+    def iterRequest(self, host, handler, request_body, verbose = 0):
+        h, response = self._iterResponse(host, handler, request_body, verbose)
+
+        finished = False
+        try:
+            if response.status != 200:
+                # without a length, the body can't be read to the end to make
+                # the connection reusable, so it is closed instead
+                if response.getheader("content-length", 0):
+                    response.read()
+                    finished = True
+                raise xmlrpclib.ProtocolError(host + handler,
+                                              response.status,
+                                              response.reason,
+                                              response.msg)
+
+            parser = unmarshal.ItemParser(self._use_datetime)
+            for data in self._readBody(response):
+                for item in parser.feed(data):
+                    yield item
+            for item in parser.close():
+                yield item
+            finished = True
+        finally:
+            if finished:
+                pool.release((self.SCHEME, self.get_host_info(host)[0]), h)
+            else:
+                # given up on part way through, or failed- either way the
+                # rest of the response is still waiting on the connection
+                h.close()
+
+    # Sends the request for `iterRequest` and returns the connection and the
+    # response once it has started to arrive.  If the connection turns out
+    # to have been closed by the server, the request is sent once more on a
+    # fresh one.
+    def _iterResponse(self, host, handler, request_body, verbose):
+        retry = True
+        while True:
+            h = self.make_connection(host)
+            # the connection is the generator's until it is done with it, so
+            # other requests mustn't pick it up from the transport meanwhile
+            self._connection = (None, None)
+            if verbose:
+                h.set_debuglevel(1)
+
+            # requests for items are small, so they are never compressed
+            threshold, self.encode_threshold = self.encode_threshold, None
+            try:
+                self.send_request(h, handler, request_body)
+                self.send_host(h, host)
+                self.send_user_agent(h)
+                self.send_content(h, request_body)
+                return h, h.getresponse(buffering = True)
+            except (socket.error, httplib.BadStatusLine), err:
+                h.close()
+                if not retry or not _closedByServer(err):
+                    raise
+                if self._reused:
+                    pool.discard((self.SCHEME, self.get_host_info(host)[0]))
+                retry = False
+            except:
+                h.close()
+                raise
+            finally:
+                self.encode_threshold = threshold
+
+# Whether ``err`` from sending a request means the server had closed the
+# connection.
+def _closedByServer(err):
+    if isinstance(err, socket.error):
+        return err.errno in STALE_ERRNOS
+    return isinstance(err, httplib.BadStatusLine)
+
+################################################################################
+"""StreamingMixin
+
+    Adds `streamRequest` to an xmlrpclib transport.
+"""
+class StreamingMixin:
+
+    # Bytes of the file read at a time.  A multiple of 3 so that each chunk
+    # encodes to base64 without padding.
+    CHUNK = 57 * 1024
+
+    ############################################################################
+    """streamRequest
+
+        Sends an XMLRPC request made up of ``head``, the base64 encoded
+        contents of ``fileobj`` and ``tail``, and returns the parsed response.
+        ``size`` is the size of the file, which is needed up front to compute
+        the Content-Length of the request.  The file is encoded and sent a
+        chunk at a time, so memory use doesn't depend on the file size.
+    """
+    def streamRequest(self, host, handler, head, fileobj, size, tail,
+                      verbose = 0):
+        length = len(head) + 4 * ((size + 2) // 3) + len(tail)
+
+        h = self.make_connection(host)
+        if verbose:
+            h.set_debuglevel(1)
+
+        try:
+            self.send_request(h, handler, '')
+            self.send_host(h, host)
+            self.send_user_agent(h)
+            h.putheader("Content-Type", "text/xml")
+            h.putheader("Content-Length", str(length))
+            h.endheaders()
+
+            h.send(head)
+            rest = ''
+            while True:
+                data = fileobj.read(self.CHUNK)
+                if not data:
+                    break
+                # a short read would leave padding in the middle of the
+                # encoded data, so carry any odd bytes over to the next chunk
+                data = rest + data
+                cut = len(data) - len(data) % 3
+                h.send(base64.b64encode(data[:cut]))
+                rest = data[cut:]
+            if rest:
+                h.send(base64.b64encode(rest))
+            h.send(tail)
+
+            response = h.getresponse(buffering = True)
+            if response.status == 200:
+                self.verbose = verbose
+                return self.parse_response(response)
+        except xmlrpclib.Fault:
+            raise
+        except Exception:
+            # as in xmlrpclib, unexpected errors leave the connection in a
+            # strange state, so clear it
+            self.close()
+            raise
+
+        # discard any response data and raise exception
+        if response.getheader("content-length", 0):
+            response.read()
+        raise xmlrpclib.ProtocolError(host + handler,
+                                      response.status,
+                                      response.reason,
+                                      response.msg)
+
+class PooledTransport(GzipMixin, PooledMixin, StreamingMixin,
+                      xmlrpclib.Transport):
+    SCHEME = 'http'
+    _base = xmlrpclib.Transport
+
+class SafePooledTransport(GzipMixin, PooledMixin, StreamingMixin,
+                          xmlrpclib.SafeTransport):
+    SCHEME = 'https'
+    _base = xmlrpclib.SafeTransport
+
+################################################################################
+"""splitURL
+
+    Splits an XMLRPC url into its scheme, host and handler the same way
+    xmlrpclib.ServerProxy does.
+"""
+def splitURL(url):
+    scheme, uri = urllib.splittype(url)
+    host, handler = urllib.splithost(uri)
+    if not handler:
+        handler = "/RPC2"
+
+    return scheme, host, handler
+
+################################################################################
+"""getTransport
+
+    Returns a transport suitable for ``url``.
+"""
+def getTransport(url):
+    scheme, host, handler = splitURL(url)
+    if scheme == 'https':
+        return SafePooledTransport()
+
+    return PooledTransport()
+
+################################################################################
+"""buildStreamEnvelope
+
+    Marshals an XMLRPC call to ``methodname`` with ``params`` and splits it at
+    the single parameter value equal to STREAM_MARKER.  Returns the XML before
+    and after that value, with the value turned into a base64 element so the
+    encoded file contents can be sent between the two.
+"""
+def buildStreamEnvelope(methodname, params):
+    request = xmlrpclib.dumps(tuple(params), methodname)
+    head, tail = request.split('<string>%s</string>' % STREAM_MARKER)
+
+    return head + '<base64>', '</base64>' + tail
@@ -0,0 +1,122 @@
+"""unmarshal.py
+
+    An incremental parser for XMLRPC responses whose value is an array.
+    xmlrpclib builds the whole response before handing it back, so a response
+    with many thousands of items is held in memory all at once, both as XML
+    and as Python objects.  `ItemParser` instead hands back each item of the
+    array as soon as it has been parsed, so the caller can deal with it and
+    let it go.
+"""
+import xmlrpclib
+
+from xml.parsers import expat
+
+# path to the response's value
+VALUE_PATH = ['methodResponse', 'params', 'param', 'value']
+# path to the items of an array returned as the response's value
+ITEM_PATH = VALUE_PATH + ['array', 'data', 'value']
+# path to a fault
+FAULT_PATH = ['methodResponse', 'fault']
+
+################################################################################
+"""ItemParser
+
+    Parses an XMLRPC response fed to it a chunk at a time.  `feed` returns the
+    items of the response's array that were completed by the chunk.  If the
+    response's value isn't an array, the whole value is returned as a single
+    item once it is complete.  A fault response raises xmlrpclib.Fault.
+
+    Each item is unmarshalled by its own xmlrpclib.Unmarshaller, wrapped in a
+    params element, so items come out exactly as xmlrpclib would have
+    returned them.
+"""
+class ItemParser(object):
+
+    def __init__(self, use_datetime = 0):
+        self._use_datetime = use_datetime
+        self._path = []
+        self._items = []
+        # the unmarshaller for the value being parsed, the depth of the
+        # element it started at, and whether it is the whole response value
+        self._target = None
+        self._depth = None
+        self._whole = False
+        self._array = False
+
+        self._parser = expat.ParserCreate(None, None)
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._data
+        self._parser.buffer_text = 1
+        self._parser.returns_unicode = 0
+
+    ############################################################################
+    """feed
+
+        Parses ``data`` and returns the list of items it completed.
+    """
+    def feed(self, data):
+        self._parser.Parse(data, 0)
+        return self._takeItems()
+
+    ############################################################################
+    """close
+
+        Finishes parsing and returns any remaining items.
+    """
+    def close(self):
+        self._parser.Parse('', 1)
+        if self._target is not None:
+            raise xmlrpclib.ResponseError("incomplete XMLRPC response")
+        return self._takeItems()
+
+    def _takeItems(self):
+        items, self._items = self._items, []
+        return items
+
+    def _newTarget(self, depth, whole = False):
+        self._target = xmlrpclib.Unmarshaller(self._use_datetime)
+        self._depth = depth
+        self._whole = whole
+
+    def _start(self, tag, attrs):
+        self._path.append(tag)
+        depth = len(self._path)
+        if self._target is not None:
+            if self._whole and tag == 'array' and depth == self._depth + 1:
+                # the response is an array, so parse it an item at a time
+                # instead of as a whole
+                self._target = None
+                self._array = True
+                return
+        elif self._array and self._path == ITEM_PATH:
+            self._newTarget(depth)
+            self._target.start('params', {})
+        elif self._path == VALUE_PATH:
+            self._newTarget(depth, True)
+            self._target.start('params', {})
+        elif self._path == FAULT_PATH:
+            self._newTarget(depth)
+        else:
+            return
+
+        self._target.start(tag, attrs)
+
+    def _data(self, text):
+        if self._target is not None:
+            self._target.data(text)
+
+    def _end(self, tag):
+        depth = len(self._path)
+        self._path.pop()
+        if self._target is None:
+            return
+
+        self._target.end(tag)
+        if depth == self._depth:
+            target, self._target = self._target, None
+            if tag == 'fault':
+                # raises the fault
+                target.close()
+            target.end('params')
+            self._items.append(target.close()[0])
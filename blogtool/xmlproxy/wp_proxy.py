@@ -1,7 +1,14 @@
 import proxybase
+import transport
 import xmlrpclib
+import httplib
+import itertools
 import mimetypes
 import os
+import socket
+import time
+
+from xml.parsers import expat
 
 import data
 
@@ -14,6 +21,70 @@ def getInst(url, user, password):
    wp = WordpressProxy(url, user, password)
    return wp
 
+# fields asked for when fetching a post
+POST_FIELDS = ['postid', 'post_title', 'post_content', 'post_excerpt', 'terms']
+
+# what reading a response as it arrives can fail with, besides faults: the
+# connection failing, and a bad or broken off response (a bad gzip stream is
+# a ValueError)
+STREAM_ERRORS = (xmlrpclib.Error, socket.error, httplib.HTTPException,
+                 expat.ExpatError, ValueError)
+
+################################################################################
+"""termStruct
+
+    Returns the struct wp.newTerm takes to add the category ``name`` under
+    the category ``parent``.
+"""
+def termStruct(name, parent, slug = '', desc = ''):
+    term = { 'name'        : name,
+             'taxonomy'    : 'category',
+             'slug'        : slug,
+             'description' : desc}
+    # it appears that if parent is 0, the call won't work to add the
+    # category, but will work if parent is not present.
+    if int(parent) != 0:
+        term['parent'] = int(parent)
+    return term
+
+################################################################################
+"""recentFilter
+
+    Returns the filter wp.getPosts takes to list the ``number`` most recently
+    published posts.
+"""
+def recentFilter(number):
+    return { 'post_type'   : 'post',      # or 'page', 'attachment'
+             'post_status' : 'publish',   # or 'draft', 'private, 'pending'
+             'number'      : number,
+             'offset'      : 0,           # offset by # posts
+             'orderby'     : '',          # appears to have no effect
+             'order'       : '',          # appears to have no effect
+           }
+
+################################################################################
+"""categoryFromTerm
+
+    Converts a category term from wp.getTerms into the struct
+    metaWeblog.getCategories returns, which is what the rest of blogtool uses.
+"""
+def categoryFromTerm(cat):
+    return { 'categoryName'        : cat['name'],
+             'parentId'            : cat['parent'],
+             'categoryId'          : cat['term_id'],
+             'categoryDescription' : cat['description'],}
+
+################################################################################
+"""titleFromPost
+
+    Converts a post from wp.getPosts into the struct mt.getRecentPostTitles
+    returns.
+"""
+def titleFromPost(postmeta):
+    return { 'postid'      : postmeta['post_id'],
+             'title'       : postmeta['post_title'],
+             'dateCreated' : postmeta['post_date'] }
+
 ################################################################################
 """WordpressProxy
 
@@ -25,40 +96,60 @@ def getInst(url, user, password):
 """
 class WordpressProxy(proxybase.BlogProxy):
 
+    NAME = 'wp'
+
+    # number of media items requested at a time by getMediaLibrary
+    MEDIA_PAGE = 100
+    # files larger than this are streamed when uploaded
+    STREAM_THRESHOLD = 4 * 1024 * 1024
+
+    # the XMLRPC method each API family uses for the proxy's methods, in the
+    # order they are tried
+    API_METHODS = { 'getCategories'   : [ ('wp', 'wp.getTerms'),
+                                          ('metaWeblog', 'metaWeblog.getCategories') ],
+                    'newCategory'     : [ ('wp', 'wp.newTerm'),
+                                          ('wpCategory', 'wp.newCategory') ],
+                    'getRecentTitles' : [ ('wp', 'wp.getPosts'),
+                                          ('mt', 'mt.getRecentPostTitles') ],
+                    'publishPost'     : [ ('wp', 'wp.newPost'),
+                                          ('metaWeblog', 'metaWeblog.newPost') ],
+                    'editPost'        : [ ('wp', 'wp.editPost'),
+                                          ('metaWeblog', 'metaWeblog.editPost') ],
+                    'getPost'         : [ ('wp', 'wp.getPost'),
+                                          ('metaWeblog', 'metaWeblog.getPost') ],
+                    'deletePost'      : [ ('wp', 'wp.deletePost'),
+                                          ('blogger', 'blogger.deletePost') ],
+                    'upload'          : [ ('wp', 'wp.uploadFile'),
+                                          ('metaWeblog', 'metaWeblog.newMediaObject') ], }
+
     ############################################################################ 
     """getCategories
     """
     def getCategories(self):
+        if self._categories == None:
+            self._categories = self._getMetadata('categories')
 
-        def _tryMethods(blogid):
-            try:
+        if self._categories == None:
+            blogid = self._getBlogID()
+
+            def _wp():
                 response = self.wp.getTerms(blogid, 
                                             self._username,
                                             self._password,
                                             'category',
                                             {})
-            except xmlrpclib.Fault:
-                pass
-            except xmlrpclib.ProtocolError, error:
-                raise proxybase.ProxyError("wp.getCategories", error)
-            else:
-                return [ { 'categoryName'        : cat['name'],
-                           'parentId'            : cat['parent'],
-                           'categoryId'          : cat['term_id'],
-                           'categoryDescription' : cat['description'],} for cat in response ]
+                return [ categoryFromTerm(cat) for cat in response ]
 
             # fallback to old method
-            try:
+            def _metaWeblog():
                 return self.metaWeblog.getCategories(blogid,
                                                      self._username,
                                                      self._password)
-            except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
-                raise proxybase.ProxyError("wp.getCategories", error)
 
-        ########################################################################
-        # getCategories starts here...
-        if self._categories == None:
-            self._categories = _tryMethods(self._getBlogID)
+            self._categories = self._tryAPIs('getCategories',
+                                             [ ('wp', _wp),
+                                               ('metaWeblog', _metaWeblog) ])
+            self._setMetadata('categories', self._categories)
 
         return self._categories
 
@@ -69,26 +160,14 @@ class WordpressProxy(proxybase.BlogProxy):
         blogid = self._getBlogID()
 
         # start by trying newer Wordpress API call
-        term = { 'name'        : newcat,
-                 'taxonomy'    : 'category',
-                 'slug'        : slug,
-                 'description' : desc}
-        # it appears that if parent is 0, the call won't work to add the
-        # category, but will work if parent is not present.
-        if int(parent) != 0:
-            term['parent'] = int(parent)
-        try:
+        def _wp():
             return self.wp.newTerm(blogid, 
                                    self._username,
                                    self._password,
-                                   term)
-        except xmlrpclib.Fault:
-            pass
-        except xmlrpclib.ProtocolError, error:
-            raise proxybase.ProxyError("wp.newCategory", error)
- 
+                                   termStruct(newcat, parent, slug, desc))
+
         # fallback to old call
-        try:
+        def _wpCategory():
             return self.wp.newCategory(blogid,
                                        self._username,
                                        self._password,
@@ -96,8 +175,46 @@ class WordpressProxy(proxybase.BlogProxy):
                                          'slug'        : slug,
                                          'description' : desc,
                                          'parent_id'   : parent})
-        except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
-            raise proxybase.ProxyError("wp.newCategory", error)
+
+        catid = self._tryAPIs('newCategory', [ ('wp', _wp),
+                                               ('wpCategory', _wpCategory) ])
+        self._addCategory(newcat, catid, parent, desc)
+        return catid
+
+    ############################################################################ 
+    """newCategories
+
+        Adds the categories in ``cats``, a list of (name, parentid) tuples,
+        as one batch.  Any category the server rejects as part of the batch is
+        retried on its own with `newCategory`, which falls back to the older
+        API.
+    """
+    def newCategories(self, cats):
+        if self._preferredAPI('newCategory') not in (None, 'wp'):
+            return proxybase.BlogProxy.newCategories(self, cats)
+
+        blogid = self._getBlogID()
+        with self.batch() as batch:
+            futures = []
+            for name, parent in cats:
+                futures.append(batch.wp.newTerm(blogid,
+                                                self._username,
+                                                self._password,
+                                                termStruct(name, parent)))
+
+        catids = []
+        for (name, parent), future in zip(cats, futures):
+            try:
+                catid = future.result()
+            except xmlrpclib.Fault:
+                catids.append(self.newCategory(name, parent))
+            except xmlrpclib.ProtocolError, error:
+                raise proxybase.ProxyError("wp.newCategories", error)
+            else:
+                self._addCategory(name, catid, parent)
+                catids.append(catid)
+
+        return catids
 
     ############################################################################ 
     """getRecentTitles
@@ -106,36 +223,61 @@ class WordpressProxy(proxybase.BlogProxy):
         blogid = self._getBlogID()
 
         # First, try the Wordpress XMLRPC API calls
-        try:
+        def _wp():
             response = self.wp.getPosts(blogid,
                                         self._username,
                                         self._password,
-                                        { # filter parameter
-                                          'post_type'   : 'post',      # or 'page', 'attachment'
-                                          'post_status' : 'publish',   # or 'draft', 'private, 'pending'
-                                          'number'      : number,
-                                          'offset'      : 0,           # offset by # posts
-                                          'orderby'     : '',          # appears to have no effect
-                                          'order'       : '',          # appears to have no effect
-                                        },
+                                        recentFilter(number),
                                         ['post_id', 'post_title', 'post_date'])
-        except xmlrpclib.Fault:
-            pass
-        except xmlrpclib.ProtocolError, error:
-            raise proxybase.ProxyError("wp.getRecentTitles", error)
-        else:
-            return [{'postid'      : postmeta['post_id'],
-                     'title'       : postmeta['post_title'],
-                     'dateCreated' : postmeta['post_date']} for postmeta in response ]
+            return [ titleFromPost(postmeta) for postmeta in response ]
 
         # The Wordpress XMLRPC API is not available, try the old MT API
-        try:
+        def _mt():
             return self.mt.getRecentPostTitles(blogid,
                                                self._username,
                                                self._password,
                                                number)
-        except (xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
-            raise proxybase.ProxyError("wp.getRecentTitles", error)
+
+        return self._tryAPIs('getRecentTitles', [ ('wp', _wp), ('mt', _mt) ])
+
+    ############################################################################ 
+    """iterRecentTitles
+
+        Generates the same items as `getRecentTitles`, but with the Wordpress
+        API each one is handed back as soon as it has arrived, so listing a
+        huge number of posts doesn't need memory for all of them at once.
+    """
+    def iterRecentTitles(self, number):
+        if self._preferredAPI('getRecentTitles') not in (None, 'wp'):
+            for postmeta in self.getRecentTitles(number):
+                yield postmeta
+            return
+
+        blogid = self._getBlogID()
+        response = self._iterCall('wp.getPosts',
+                                  blogid,
+                                  self._username,
+                                  self._password,
+                                  recentFilter(number),
+                                  ['post_id', 'post_title', 'post_date'])
+        try:
+            first = next(response, None)
+        except xmlrpclib.Fault:
+            # no Wordpress API, getRecentTitles knows what to do instead
+            for postmeta in self.getRecentTitles(number):
+                yield postmeta
+            return
+        except STREAM_ERRORS, error:
+            raise proxybase.ProxyError("wp.iterRecentTitles", error)
+
+        self._recordAPI('getRecentTitles', 'wp')
+        if first is None:
+            return
+        try:
+            for postmeta in itertools.chain([ first ], response):
+                yield titleFromPost(postmeta)
+        except STREAM_ERRORS, error:
+            raise proxybase.ProxyError("wp.iterRecentTitles", error)
 
     ############################################################################ 
     """publishPost
@@ -143,31 +285,30 @@ class WordpressProxy(proxybase.BlogProxy):
     def publishPost(self, post):
         blogid = self._getBlogID()
 
-        try:
+        def _wp():
             return self.wp.newPost(blogid,
                                    self._username,
                                    self._password,
                                    post.wpStruct)
-        except xmlrpclib.Fault:
-            pass
-        except xmlrpclib.ProtocolError, error:
-            raise proxybase.ProxyError("wp.publishPost", error)
 
-        try:
+        def _metaWeblog():
             return self.metaWeblog.newPost(blogid,
                                            self._username,
                                            self._password,
                                            post.metaweblogStruct,
                                            post.publish)
-        except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
-            raise proxybase.ProxyError("wp.publishPost", error)
+
+        return self._tryAPIs('publishPost', [ ('wp', _wp),
+                                              ('metaWeblog', _metaWeblog) ])
 
     ############################################################################ 
     """editPost
     """
     def editPost(self, postid, post):
-        try:
-            if self.wp.editPost(self._getBlogID(),
+        blogid = self._getBlogID()
+
+        def _wp():
+            if self.wp.editPost(blogid,
                                 self._username,
                                 self._password,
                                 postid,
@@ -175,79 +316,130 @@ class WordpressProxy(proxybase.BlogProxy):
                 return postid
             # error updating post
             raise proxybase.ProxyError("wp.editPost", "post not updated")
-        except xmlrpclib.Fault as err:
-            pass
-        except xmlrpclib.ProtocolError, error:
-            raise proxybase.ProxyError("wp.editPost", error)
 
-        try:
+        def _metaWeblog():
             self.metaWeblog.editPost(postid,
                                      self._username,
                                      self._password,
                                      post.metaweblogStruct,
                                      post.publish)
-        except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
-            raise proxybase.ProxyError("wp.editPost", error)
+            return postid
 
-        return postid
+        return self._tryAPIs('editPost', [ ('wp', _wp),
+                                           ('metaWeblog', _metaWeblog) ])
 
     ############################################################################ 
     """getPost
     """
     def getPost(self, postid):
         blogid = self._getBlogID()
-        try:
+
+        def _wp():
             response = self.wp.getPost(blogid, 
                                        self._username, 
                                        self._password,
                                        postid,
-                                       ['postid', 
-                                        'post_title', 
-                                        'post_content',
-                                        'post_excerpt', 
-                                        'terms'])
-        except xmlrpclib.Fault:
-            pass
-        except xmlrpclib.ProtocolError, error:
-            raise proxybase.ProxyError("wp.getPost", error)
-        else:
+                                       POST_FIELDS)
             return data.Post(response, 'wp')
 
         # fallback to older XMLRPC method
-        try:
+        def _metaWeblog():
             response = self.metaWeblog.getPost(postid, 
                                                self._username, 
                                                self._password)
-        except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
-            raise proxybase.ProxyError("wp.getPost", error)
-        else:
             return data.Post(response, 'metaweblog')
 
+        return self._tryAPIs('getPost', [ ('wp', _wp),
+                                          ('metaWeblog', _metaWeblog) ])
+
     ############################################################################ 
     """deletePost
     """
     def deletePost(self, postid):
         blogid = self._getBlogID()
+
         # try the newer Wordpress XMLRPC API first...
-        try:
+        def _wp():
             return self.wp.deletePost(blogid,
                                       self._username,
                                       self._password,
                                       postid)
-        except xmlrpclib.Fault:
-            pass
-        except xmlrpclib.ProtocolError, error:
-            raise proxybase.ProxyError("wp.deletePost", error)
 
         # if Wordpress API failed, try older XMLRPC API call
-        try:
+        def _blogger():
             return self.blogger.deletePost('',
                                            postid, 
                                            self._username,
                                            self._password,
                                            True)
-        except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
-            raise proxybase.ProxyError("wp.deletePost", error)
+
+        return self._tryAPIs('deletePost', [ ('wp', _wp),
+                                             ('blogger', _blogger) ])
+
+    ############################################################################ 
+    """getPosts
+
+        Fetches the posts in ``postids`` in batches.  Returns a list with the
+        post, or the ProxyError fetching it failed with, for each post ID.
+    """
+    def getPosts(self, postids):
+        if self._preferredAPI('getPost') not in (None, 'wp'):
+            return proxybase.BlogProxy.getPosts(self, postids)
+
+        blogid = self._getBlogID()
+        with self.batch() as batch:
+            futures = [ batch.wp.getPost(blogid,
+                                         self._username,
+                                         self._password,
+                                         postid,
+                                         POST_FIELDS) for postid in postids ]
+
+        posts = []
+        for postid, future in zip(postids, futures):
+            try:
+                posts.append(data.Post(future.result(), 'wp'))
+            except xmlrpclib.Fault:
+                # getPost tries the older API
+                try:
+                    posts.append(self.getPost(postid))
+                except proxybase.ProxyError, err:
+                    posts.append(err)
+            except xmlrpclib.ProtocolError, error:
+                posts.append(proxybase.ProxyError("wp.getPosts", error))
+
+        return posts
+
+    ############################################################################ 
+    """deletePosts
+
+        Deletes the posts in ``postids`` in batches.  Returns a list with the
+        result, or the ProxyError deleting it failed with, for each post ID.
+    """
+    def deletePosts(self, postids):
+        if self._preferredAPI('deletePost') not in (None, 'wp'):
+            return proxybase.BlogProxy.deletePosts(self, postids)
+
+        blogid = self._getBlogID()
+        with self.batch() as batch:
+            futures = [ batch.wp.deletePost(blogid,
+                                            self._username,
+                                            self._password,
+                                            postid) for postid in postids ]
+
+        results = []
+        for postid, future in zip(postids, futures):
+            try:
+                results.append(future.result())
+            except xmlrpclib.Fault:
+                # deletePost tries the older API
+                try:
+                    results.append(self.deletePost(postid))
+                except proxybase.ProxyError, err:
+                    results.append(err)
+            except xmlrpclib.ProtocolError, error:
+                results.append(proxybase.ProxyError("wp.deletePosts", error))
+
+        return results
 
     ############################################################################ 
     """upload
@@ -258,27 +450,25 @@ class WordpressProxy(proxybase.BlogProxy):
         """_tryMethods
             Helper function to maintain compatibility with older version of 
             Wordpress.  Tries the newest methods first and then older ones if
-            the newer fail.
+            the newer fail.  ``call`` is the function that makes the XMLRPC
+            call, given the method name and parameters.
         """
-        def _tryMethods(blogid, mediaStruct):
-            # try newer Wordpress API first...
-            try:
-                return self.wp.uploadFile(blogid,
-                                          self._username,
-                                          self._password,
-                                          mediaStruct )
-            except xmlrpclib.Fault:
-                pass
-            except xmlrpclib.ProtocolError, error:
-                raise proxybase.ProxyError("wp.upload", error)
+        def _tryMethods(blogid, mediaStruct, call):
+            params = (blogid, self._username, self._password, mediaStruct)
+            return self._tryAPIs('upload',
+                     [ ('wp', lambda: call('wp.uploadFile', params)),
+                       ('metaWeblog',
+                        lambda: call('metaWeblog.newMediaObject', params)) ])
 
-            # fall back to older XMLRPC API call
+        #######################################################################
+        """_streamCall
+            Sends the file contents as they are read rather than loading the
+            whole file, for files too large to comfortably hold in memory.
+        """
+        def _streamCall(methodname, params):
             try:
-                return self.metaWeblog.newMediaObject(blogid,
-                                                      self._username,
-                                                      self._password,
-                                                      mediaStruct )
-            except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
+                return self._streamFile(methodname, params, filename)
+            except IOError, error:
                 raise proxybase.ProxyError("wp.upload", error)
 
         #######################################################################
@@ -290,21 +480,52 @@ class WordpressProxy(proxybase.BlogProxy):
                 filename = '/' + filename
             filename = os.path.expanduser('~') + filename
 
+        mediaStruct = {}
+        mediaStruct['type'], encoding = mimetypes.guess_type(filename)
+        if mediaStruct['type'] == None:
+            raise proxybase.ProxyError("wp.upload",
+                            "can't determine MIME type for %s" % filename)
+        mediaStruct['name'] = os.path.basename(filename)
+
         try:
+            if os.path.getsize(filename) > self.STREAM_THRESHOLD:
+                mediaStruct['bits'] = transport.STREAM_MARKER
+                return _tryMethods(self._getBlogID(), mediaStruct, _streamCall)
+
             f = open(filename, 'rb')
             mediaData = f.read()
             f.close()
-        except IOError, error:
+        except (IOError, OSError), error:
             raise proxybase.ProxyError("wp.upload", error)
 
-        mediaStruct = {}
-        mediaStruct['type'], encoding = mimetypes.guess_type(filename)
-        if mediaStruct['type'] == None:
-            print "Can't determine MIME type for %s" % filename
-            sys.exit()
-        mediaStruct['name'] = os.path.basename(filename)
         mediaStruct['bits'] = xmlrpclib.Binary(mediaData)
-        return _tryMethods(self._getBlogID(), mediaStruct)
+        return _tryMethods(self._getBlogID(),
+                           mediaStruct,
+                           lambda methodname, params:
+                                      getattr(self, methodname)(*params))
+
+    ############################################################################ 
+    """getMediaLibrary
+
+        Returns the list of all the media items on the blog, fetched a page at
+        a time.
+    """
+    def getMediaLibrary(self):
+        blogid = self._getBlogID()
+        items = []
+        while True:
+            try:
+                page = self.wp.getMediaLibrary(blogid,
+                                               self._username,
+                                               self._password,
+                                               { 'number' : self.MEDIA_PAGE,
+                                                 'offset' : len(items) })
+            except(xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
+                raise proxybase.ProxyError("wp.getMediaLibrary", error)
+
+            items.extend(page)
+            if len(page) < self.MEDIA_PAGE:
+                return items
 
     ############################################################################ 
     """getComments
@@ -390,32 +611,146 @@ class WordpressProxy(proxybase.BlogProxy):
 
         return status
 
+    ############################################################################ 
+    """probe
+
+        Finds out which API family the blog supports for each of the proxy's
+        methods from system.listMethods, records them, and times a few
+        read-only calls.  Returns a list of dicts with the 'method', the API
+        'family' used for it, the 'seconds' the call took and the 'error' it
+        failed with, if any.
+    """
+    def probe(self):
+        def _time(method, call):
+            start = time.time()
+            try:
+                call()
+            except proxybase.ProxyError, err:
+                error = str(err)
+            else:
+                error = None
+            return { 'method'  : method,
+                     'family'  : self._preferredAPI(method),
+                     'seconds' : time.time() - start,
+                     'error'   : error }
+
+        results = []
+        start = time.time()
+        try:
+            supported = set(self.system.listMethods())
+        except xmlrpclib.Fault, error:
+            supported = None
+        except xmlrpclib.ProtocolError, error:
+            raise proxybase.ProxyError("wp.probe", error)
+        results.append({ 'method'  : 'system.listMethods',
+                         'family'  : None,
+                         'seconds' : time.time() - start,
+                         'error'   : supported is None and str(error) or None })
+
+        if supported is not None:
+            for method, families in sorted(self.API_METHODS.items()):
+                for family, methodname in families:
+                    if methodname in supported:
+                        self._recordAPI(method, family)
+                        break
+
+        # time the calls themselves, not the metadata cache
+        self.refreshMetadata()
+        self._blogs = None
+        results.append(_time('getUsersBlogs', self._getUsersBlogs))
+        self._categories = None
+        results.append(_time('getCategories', self.getCategories))
+        results.append(_time('getRecentTitles',
+                             lambda: self.getRecentTitles(1)))
+
+        results.append(self._probeGzip())
+
+        for method in sorted(self.API_METHODS):
+            if method not in ('getCategories', 'getRecentTitles'):
+                results.append({ 'method'  : method,
+                                 'family'  : self._preferredAPI(method),
+                                 'seconds' : None,
+                                 'error'   : None })
+        return results
+
     ##################### START PRIVATE METHODS ################################
+    ############################################################################ 
+    """_probeGzip
+
+        Finds out whether the blog accepts gzip compressed requests by sending
+        one, and records the result.
+    """
+    def _probeGzip(self):
+        # a plain xmlrpclib transport, since blogtool's would quietly resend
+        # the request uncompressed if it is refused
+        if self._url.startswith('https'):
+            t = xmlrpclib.SafeTransport()
+        else:
+            t = xmlrpclib.Transport()
+        t.encode_threshold = 0
+        proxy = xmlrpclib.ServerProxy(self._url, t)
+        start = time.time()
+        try:
+            proxy.wp.getUsersBlogs(self._username, self._password)
+        except STREAM_ERRORS:
+            # servers and firewalls that can't take a compressed request
+            # may drop the connection or answer with garbage instead of
+            # faulting
+            accepted = False
+        else:
+            accepted = True
+        self._recordAPI('gzipRequests', accepted)
+        if accepted:
+            self._transport.enableGzip(
+                lambda: self._recordAPI('gzipRequests', False))
+
+        return { 'method'  : 'gzip requests',
+                 'family'  : accepted and 'accepted' or 'refused',
+                 'seconds' : time.time() - start,
+                 'error'   : None }
+
     ############################################################################ 
     """_getBlogID
     """
     def _getBlogID(self):
         self._getUsersBlogs()
+        blogid = self._findBlogID()
+        # the blog may have been added or renamed since its list was cached
+        if blogid is None and self._uncache('blogs', False):
+            self._blogs = None
+            self._getUsersBlogs()
+            blogid = self._findBlogID()
 
-        for blog in self._blogs:
-            if self._blogname == blog['blogName']:
-                return blog['blogid']
+        if blogid is not None:
+            return blogid
 
         raise proxybase.ProxyError("wp._getBlogID", 
                                    'bad name: %s' % self._blogname)
 
+    # Returns the ID of the blog named ``_blogname`` in ``_blogs``, or None if
+    # there isn't one.
+    def _findBlogID(self):
+        for blog in self._blogs:
+            if self._blogname == blog['blogName']:
+                return blog['blogid']
+        return None
+
     ############################################################################ 
     """_getUsersBlogs
     """
     def _getUsersBlogs(self):
         # a little trick to avoid repeatedly calling the xmlrpc method
         # it may not be necessary, we'll figure that out later
+        if self._blogs == None:
+            self._blogs = self._getMetadata('blogs', False)
+
         if self._blogs == None:
             try:
                 self._blogs = self.wp.getUsersBlogs(self._username, 
                                                     self._password)
             except (xmlrpclib.Fault, xmlrpclib.ProtocolError), error:
                 raise proxybase.ProxyError('wp._getUsersBlogs', error)
+            self._setMetadata('blogs', self._blogs, False)
 
     ############################################################################ 
     """_getCommentCount
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""gzipbench.py
+
+    Measures the bytes sent over the wire for typical blogtool calls against
+    a local stand-in XMLRPC server, first with a plain xmlrpclib transport and
+    then with blogtool's transport with gzip compression of requests and
+    responses.  Run from the top of the source tree:
+
+        python test/gzipbench.py
+"""
+import os
+import sys
+import threading
+import xmlrpclib
+
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'blogtool'))
+
+from xmlproxy import transport
+
+PARAGRAPH = '''<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do
+eiusmod tempor incididunt ut labore et dolore magna aliqua.  Ut enim ad minim
+veniam, quis nostrud <a href="http://example.com/">exercitation</a> ullamco
+laboris nisi ut aliquip ex ea commodo consequat.</p>
+'''
+
+################################################################################
+"""CountingFile
+
+    Wraps a socket file and counts the bytes that go through it.
+"""
+class CountingFile(object):
+
+    def __init__(self, f, counter, key):
+        self._f = f
+        self._counter = counter
+        self._key = key
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self._counter[self._key] += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._f.readline(*args)
+        self._counter[self._key] += len(data)
+        return data
+
+    def write(self, data):
+        self._counter[self._key] += len(data)
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+counter = { 'up' : 0, 'down' : 0 }
+
+class CountingHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/xmlrpc.php',)
+
+    def setup(self):
+        SimpleXMLRPCRequestHandler.setup(self)
+        self.rfile = CountingFile(self.rfile, counter, 'up')
+        self.wfile = CountingFile(self.wfile, counter, 'down')
+
+def getPosts(blogid, user, password, filter, fields):
+    return [ { 'post_id'      : str(i),
+               'post_title'   : 'Post number %d' % i,
+               'post_content' : PARAGRAPH * 5 } for i in range(filter['number']) ]
+
+def getComments(blogid, user, password, filter):
+    return [ { 'comment_id' : str(i),
+               'content'    : PARAGRAPH,
+               'author'     : 'Commenter %d' % i, } for i in range(filter['number']) ]
+
+def newPost(blogid, user, password, post):
+    return '1'
+
+def uploadFile(blogid, user, password, media):
+    return { 'url' : 'http://example.com/a.png', 'file' : 'a.png' }
+
+def startServer():
+    server = SimpleXMLRPCServer(('127.0.0.1', 0), CountingHandler,
+                                logRequests = False)
+    server.register_function(getPosts, 'wp.getPosts')
+    server.register_function(getComments, 'wp.getComments')
+    server.register_function(newPost, 'wp.newPost')
+    server.register_function(uploadFile, 'wp.uploadFile')
+    t = threading.Thread(target = server.serve_forever)
+    t.daemon = True
+    t.start()
+    return server
+
+def run(proxy):
+    # an image with large flat areas, as screenshots tend to have
+    image = ('\x89PNG' + '\x00' * 4000 + '\xff\xee\xdd' * 2000) * 20
+    calls = [ ('getPosts (200)',
+               lambda: proxy.wp.getPosts(1, 'u', 'p', { 'number' : 200 }, [])),
+              ('getComments (100)',
+               lambda: proxy.wp.getComments(1, 'u', 'p', { 'number' : 100 })),
+              ('newPost',
+               lambda: proxy.wp.newPost(1, 'u', 'p',
+                                        { 'post_content' : PARAGRAPH * 40 })),
+              ('uploadFile',
+               lambda: proxy.wp.uploadFile(1, 'u', 'p',
+                                           { 'bits' : xmlrpclib.Binary(image) })) ]
+    results = []
+    for name, call in calls:
+        counter['up'] = counter['down'] = 0
+        call()
+        results.append((name, counter['up'], counter['down']))
+    return results
+
+if __name__ == '__main__':
+    server = startServer()
+    url = 'http://127.0.0.1:%d/xmlrpc.php' % server.server_address[1]
+
+    plain = xmlrpclib.Transport()
+    plain.accept_gzip_encoding = False
+    before = run(xmlrpclib.ServerProxy(url, plain))
+
+    gzipped = transport.getTransport(url)
+    gzipped.enableGzip()
+    after = run(xmlrpclib.ServerProxy(url, gzipped))
+
+    print "%-18s %12s %12s %12s %12s" % ('CALL', 'UP BEFORE', 'UP AFTER',
+                                         'DOWN BEFORE', 'DOWN AFTER')
+    for (name, up, down), (name, gzup, gzdown) in zip(before, after):
+        print "%-18s %12d %12d %12d %12d" % (name, up, gzup, down, gzdown)
+    server.shutdown()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""importbench.py
+
+    Measures the cold start of blogtool commands: how long a fresh process
+    takes to run each one against a local stand-in XMLRPC server, and what
+    it spends importing.  Python 2 has no `-X importtime`, so the child
+    process times its own imports with an __import__ hook and prints a
+    breakdown in the same format.  Run from the top of the source tree:
+
+        python test/importbench.py [-v] [--tree DIR] [--runs N]
+
+    ``--tree`` points at another checkout's top directory, so the numbers
+    can be compared with an older version:
+
+        git worktree add /tmp/bt-old HEAD~1
+        python test/importbench.py --tree /tmp/bt-old
+"""
+import compileall
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xmlrpclib
+
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+TOP = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# the commands measured, as the arguments given to bt
+COMMANDS = [ ('--version', ['--version']),
+             ('-t 10',     ['-t', '10']),
+             ('-C',        ['-C']),
+             ('publish',   ['post.txt']), ]
+
+# modules whose presence says what a command dragged in
+WATCHED = [ 'markdown', 'lxml.etree', 'multiprocessing', 'html2md',
+            'fileprocessor', 'argparse' ]
+
+CONFIG = '''BLOGTYPE: wp
+BLOG: {
+    NAME: Bench
+    XMLRPC: http://127.0.0.1:%d/xmlrpc.php
+    USERNAME: bench
+    PASSWORD: bench
+}
+'''
+
+POST = '''TITLE: Import bench
+CATEGORIES: Uncategorized
+
+Some *markdown* text with a [link](http://example.com/).
+'''
+
+################################################################################
+"""StubBlog
+
+    Answers the handful of Wordpress calls the measured commands make.
+"""
+class StubBlog(object):
+
+    def _dispatch(self, method, params):
+        now = xmlrpclib.DateTime(time.gmtime())
+        if method == 'wp.getUsersBlogs':
+            return [ { 'blogid' : '1', 'blogName' : 'Bench', 'isAdmin' : True,
+                       'url' : 'http://127.0.0.1/', 'xmlrpc' : '' } ]
+        if method == 'wp.getPosts':
+            return [ { 'post_id' : str(i), 'post_title' : 'Post %d' % i,
+                       'post_date' : now } for i in range(10) ]
+        if method == 'wp.getTerms':
+            return [ { 'term_id' : '1', 'name' : 'Uncategorized',
+                       'parent' : '0', 'description' : '' } ]
+        if method == 'wp.newPost':
+            return '42'
+        raise xmlrpclib.Fault(-32601, 'unsupported method %s' % method)
+
+class QuietHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/xmlrpc.php',)
+
+    def log_message(self, *args):
+        pass
+
+################################################################################
+"""child
+
+    Runs in the measured process: installs the import timer, runs bt with
+    ``args`` from the checkout at ``tree`` and writes the import records and
+    the time taken as JSON to ``outfile``.
+"""
+def child(tree, outfile, args):
+    import __builtin__
+
+    real_import = __builtin__.__import__
+    records = []
+    stack = []
+
+    def timed_import(name, globs = None, locs = None, fromlist = None,
+                     level = -1):
+        before = len(sys.modules)
+        stack.append(0.0)
+        start = time.time()
+        try:
+            return real_import(name, globs, locs, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if len(sys.modules) != before:
+                # name the module the way sys.modules does, so implicit
+                # relative imports show up with their package
+                package = (globs or {}).get('__package__') or \
+                          (globs or {}).get('__name__', '').rpartition('.')[0]
+                if level != 0 and package and \
+                   sys.modules.get(package + '.' + name) is not None:
+                    name = package + '.' + name
+                records.append((name, elapsed - children, elapsed,
+                                len(stack)))
+
+    sys.path.insert(0, tree)
+    start = time.time()
+    __builtin__.__import__ = timed_import
+    try:
+        from blogtool.__main__ import main
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            main(args)
+        except SystemExit:
+            pass
+        finally:
+            sys.stdout = stdout
+    finally:
+        __builtin__.__import__ = real_import
+    total = time.time() - start
+
+    loaded = [ m for m in WATCHED if sys.modules.get(m) is not None or
+               sys.modules.get('blogtool.' + m) is not None ]
+    f = open(outfile, 'w')
+    json.dump({ 'records' : records, 'total' : total, 'loaded' : loaded }, f)
+    f.close()
+
+################################################################################
+"""measure
+
+    Runs bt ``args`` in a fresh interpreter ``runs`` times and returns the
+    median wall clock time of the whole process along with the import
+    records of the median run.
+"""
+def measure(tree, workdir, args, runs):
+    results = []
+    outfile = os.path.join(workdir, 'result.json')
+    env = dict(os.environ)
+    env['HOME'] = workdir
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    for i in range(runs):
+        # start every run from an empty cache directory, as on a cold start
+        env['XDG_CACHE_HOME'] = tempfile.mkdtemp(dir = workdir)
+        start = time.time()
+        subprocess.check_call([ sys.executable, os.path.abspath(__file__),
+                                '--child', tree, outfile ] + args,
+                              cwd = workdir, env = env)
+        wall = time.time() - start
+        f = open(outfile)
+        result = json.load(f)
+        f.close()
+        result['wall'] = wall
+        results.append(result)
+        shutil.rmtree(env['XDG_CACHE_HOME'])
+
+    results.sort(key = lambda r: r['wall'])
+    return results[len(results) // 2]
+
+################################################################################
+"""printImportTime
+
+    Prints the import records in the `-X importtime` format.
+"""
+def printImportTime(records):
+    print "import time: self [us] | cumulative | imported package"
+    for name, own, cumulative, depth in records:
+        print "import time: %9d | %10d | %s%s" % (own * 1e6, cumulative * 1e6,
+                                                   '  ' * depth, name)
+
+def main():
+    verbose = '-v' in sys.argv
+    runs = 5
+    tree = TOP
+    if '--tree' in sys.argv:
+        tree = sys.argv[sys.argv.index('--tree') + 1]
+    if '--runs' in sys.argv:
+        runs = int(sys.argv[sys.argv.index('--runs') + 1])
+    tree = os.path.abspath(tree)
+    # measure loading the byte code, not compiling it
+    compileall.compile_dir(os.path.join(tree, 'blogtool'), quiet = True)
+
+    server = SimpleXMLRPCServer(('127.0.0.1', 0), requestHandler = QuietHandler,
+                                logRequests = False)
+    server.register_instance(StubBlog())
+    thread = threading.Thread(target = server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        f = open(os.path.join(workdir, '.btrc'), 'w')
+        f.write(CONFIG % server.server_address[1])
+        f.close()
+
+        print "cold start of %s, median of %d runs" % (tree, runs)
+        print
+        print "%-10s %9s %9s %8s  %s" % ('command', 'wall ms', 'import ms',
+                                         'modules', 'heavy modules loaded')
+        for label, args in COMMANDS:
+            f = open(os.path.join(workdir, 'post.txt'), 'w')
+            f.write(POST)
+            f.close()
+
+            result = measure(tree, workdir, args, runs)
+            imports = sum([ r[1] for r in result['records'] ])
+            print "%-10s %9.1f %9.1f %8d  %s" % (label, result['wall'] * 1000,
+                                                 imports * 1000,
+                                                 len(result['records']),
+                                                 ', '.join(result['loaded']))
+            if verbose:
+                printImportTime(result['records'])
+                print
+    finally:
+        shutil.rmtree(workdir)
+        server.shutdown()
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3], sys.argv[4:])
+    else:
+        main()
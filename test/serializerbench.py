@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""serializerbench.py
+
+    Compares the XHTMLSerializer against the recursive string concatenating
+    serializer it replaced, on generated documents of roughly 1 KB, 100 KB and
+    5 MB.  Run from the top of the source tree:
+
+        python test/serializerbench.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'blogtool'))
+
+from lxml import etree
+from xhtml import XHTMLSerializer
+
+PARAGRAPH = u'''<p>Some <em>emphasized</em> text &amp; a <a href="http://example.com/?a=1&amp;b=2">link</a>
+with \u201cquotes\u201d, <code>code</code> and <strong>strong text</strong>.</p>
+<ul><li>one</li><li>two <img src="http://example.com/a.jpg" alt="a"/></li></ul>
+'''
+
+################################################################################
+"""oldSerialize
+
+    The serializer as it was before XHTMLSerializer.
+"""
+def oldSerialize(tree):
+    def _escape(text, attrib=False):
+        c_replace = dict([( "&", "&amp;"),
+                          ( "<", "&lt;"),
+                          ( ">", "&gt;"),
+                          ( u'\u2019', "&#8217;"),
+                          ( u'\u201c', "&#8220;"),
+                          ( u'\u201d', "&#8221;"),
+                        ])
+        for c in c_replace.keys():
+            if c in text:
+                text = text.replace(c, c_replace[c])
+        if attrib:
+            attrib_replace = dict([("\"", "&quot;"),
+                                   ("\n", "&#10;"),
+                                 ])
+            for c in attrib_replace.keys():
+                if c in text:
+                    text = text.replace(c, attrib_replace[c])
+        return text
+
+    def _serialize(e):
+        e_str = '<%s' % (e.tag)
+        for a in e.attrib.keys():
+            e_str += ' %s=\"%s\"' %(a, _escape(e.attrib[a], True))
+        if e.tag in XHTMLSerializer.SELF_CLOSING:
+            e_str += "/>"
+        else:
+            e_str += '>'
+            if e.text:
+                e_str += _escape(e.text)
+            for child in e:
+                e_str += _serialize(child)
+            e_str += "</%s>" % (e.tag)
+        if e.tail:
+            e_str += _escape(e.tail)
+        return e_str
+
+    xhtml = ''
+    for element in tree:
+        xhtml += _serialize(element)
+    return xhtml
+
+def bench(func, tree, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func(tree)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+if __name__ == '__main__':
+    serializer = XHTMLSerializer()
+    print "%-8s %12s %12s %8s" % ('SIZE', 'OLD (s)', 'NEW (s)', 'SPEEDUP')
+    for label, size, repeat in [('1 KB', 1024, 200),
+                                ('100 KB', 100 * 1024, 10),
+                                ('5 MB', 5 * 1024 * 1024, 1)]:
+        text = PARAGRAPH * (size / len(PARAGRAPH) + 1)
+        tree = etree.XML(u'<post>%s</post>' % text)
+        old = bench(oldSerialize, tree, repeat)
+        new = bench(serializer.serialize, tree, repeat)
+        print "%-8s %12.5f %12.5f %7.1fx" % (label, old, new, old / new)
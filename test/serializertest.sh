@@ -16,8 +16,8 @@ if [ $# -eq 0 ]
 fi
 bt -b "$blog" -t $testlen > ./recent
 postids=(`./parserecent`)
+# download and republish every post in one bt process
 for postid in "${postids[@]}"
 do
-    echo $postid
-    bt -b "$blog" -g $postid | bt STDIN
-done
+    echo "-b \"$blog\" -g $postid | STDIN"
+done | bt --script -